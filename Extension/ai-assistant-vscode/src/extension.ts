@@ -24,28 +24,28 @@ export function activate(context: vscode.ExtensionContext) {
                     const response = await fetch(BACKEND_URL, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ session_id: 'vscode', question: message.text })
+                        body: JSON.stringify({ session_id: 'vscode', question: message.text, stream: true })
                     });
 
                     // Check if response is ok
-                    if (!response.ok) {
+                    if (!response.ok || !response.body) {
                         const errorText = await response.text();
                         throw new Error(`Backend error (${response.status}): ${errorText}`);
                     }
 
-                    const data = (await response.json()) as { response?: string; error?: string };
+                    // Render tokens as the backend relays them (NDJSON, one chunk per line)
+                    panel.webview.postMessage({ command: 'startResponse' });
+                    const aiResponse = await readTokenStream(response.body, token => {
+                        panel.webview.postMessage({ command: 'appendToken', token });
+                    });
 
-                    // Check if response field exists
-                    if (!data.response) {
-                        const errorMsg = data.error || 'No response from AI model';
-                        throw new Error(`AI model error: ${errorMsg}`);
+                    // Check if the model produced anything
+                    if (!aiResponse) {
+                        throw new Error('AI model error: No response from AI model');
                     }
 
-                    // Send AI response back to Webview
-                    panel.webview.postMessage({ command: 'showResponse', userQuery: message.text, aiResponse: data.response });
-
                     // Save to globalState
-                    previousChats.push({ user: message.text, ai: data.response });
+                    previousChats.push({ user: message.text, ai: aiResponse });
                     context.globalState.update('chatHistory', previousChats);
 
                 } catch (err) {
@@ -59,6 +59,43 @@ export function activate(context: vscode.ExtensionContext) {
     context.subscriptions.push(disposable);
 }
 
+// Reads an NDJSON token stream from the backend, calling onToken for each chunk,
+// and resolves with the full response text once the final chunk arrives.
+async function readTokenStream(body: ReadableStream<Uint8Array>, onToken: (token: string) => void): Promise<string> {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let fullText = '';
+
+    const handleLine = (line: string) => {
+        if (!line.trim()) {
+            return;
+        }
+        const chunk = JSON.parse(line) as { response?: string; error?: string };
+        if (chunk.error) {
+            throw new Error(`AI model error: ${chunk.error}`);
+        }
+        if (chunk.response) {
+            fullText += chunk.response;
+            onToken(chunk.response);
+        }
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop() ?? '';
+        lines.forEach(handleLine);
+    }
+    handleLine(buffered + decoder.decode());
+
+    return fullText;
+}
+
 function getWebviewContent(previousChats: { user: string; ai: string }[]) {
     // Build the initial chat history HTML
     let chatHistoryHtml = '';
@@ -91,12 +128,24 @@ function getWebviewContent(previousChats: { user: string; ai: string }[]) {
                 vscode.postMessage({ command: 'sendQuery', text: query });
             }
 
+            // Span that streamed tokens are appended to
+            let currentResponse = null;
+
             // Listen for messages from extension.ts
             window.addEventListener('message', event => {
                 const message = event.data;
                 if (message.command === 'showResponse') {
                     chatDiv.innerHTML += \`<p><b>AI:</b> \${message.aiResponse}</p>\`;
                     chatDiv.scrollTop = chatDiv.scrollHeight;
+                } else if (message.command === 'startResponse') {
+                    const paragraph = document.createElement('p');
+                    paragraph.innerHTML = '<b>AI:</b> ';
+                    currentResponse = document.createElement('span');
+                    paragraph.appendChild(currentResponse);
+                    chatDiv.appendChild(paragraph);
+                } else if (message.command === 'appendToken' && currentResponse) {
+                    currentResponse.textContent += message.token;
+                    chatDiv.scrollTop = chatDiv.scrollHeight;
                 }
             });
         </script>
@@ -0,0 +1,218 @@
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from .config import get_config
+from .metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "background": 1}
+
+QUEUE_DEPTH = gauge(
+    "ollama_queue_depth",
+    "Generations waiting for an Ollama slot",
+    ["model", "priority"]
+)
+IN_FLIGHT = gauge(
+    "ollama_in_flight",
+    "Generations currently running against Ollama",
+    ["model"]
+)
+QUEUE_WAIT = histogram(
+    "ollama_queue_wait_seconds",
+    "Time a generation waited for an Ollama slot",
+    ["model", "priority"]
+)
+REJECTED = counter(
+    "ollama_admission_rejected_total",
+    "Generations rejected by admission control",
+    ["model", "reason"]
+)
+
+
+class AdmissionRejected(Exception):
+    """A generation was not admitted; the caller should retry after retry_after seconds"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ModelGate:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.queued = 0
+        # Moving average of how long a generation holds its slot, for Retry-After
+        self.avg_hold = 1.0
+
+
+class AdmissionController:
+    """
+    Limits concurrent generations per model, queueing the overflow
+
+    Up to max_in_flight generations per model run at once. Further requests wait
+    in a bounded priority queue (interactive before background, FIFO within a
+    lane) for at most queue_timeout seconds. A full queue is rejected at once
+    with 429 and a timed-out wait with 503, both with a Retry-After estimate.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        model_limits: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            max_in_flight: Default concurrent generations per model
+            max_queue: Maximum waiting requests per model
+            queue_timeout: Seconds a request may wait for a slot
+            model_limits: Per-model overrides of max_in_flight
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.model_limits = model_limits or {}
+        self._gates: Dict[str, _ModelGate] = {}
+        self._sequence = itertools.count()
+
+    def _gate(self, model: str) -> _ModelGate:
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = _ModelGate(self.model_limits.get(model, self.max_in_flight))
+            self._gates[model] = gate
+        return gate
+
+    def _retry_after(self, gate: _ModelGate) -> int:
+        """Seconds until the current queue is expected to drain"""
+        return max(1, math.ceil(gate.avg_hold * (gate.queued + 1) / gate.limit))
+
+    def _reject(self, model: str, gate: _ModelGate, status_code: int, reason: str):
+        REJECTED.inc(model=model, reason=reason)
+        raise AdmissionRejected(status_code, reason, self._retry_after(gate))
+
+    async def acquire(self, model: str, priority: str = "interactive") -> float:
+        """
+        Wait for a generation slot for model; pair with release()
+
+        Returns:
+            The admission time, to pass to release()
+
+        Raises:
+            AdmissionRejected: The queue is full (429) or the wait timed out (503)
+        """
+        gate = self._gate(model)
+        started = time.monotonic()
+
+        if gate.in_flight < gate.limit and not gate.queued:
+            gate.in_flight += 1
+            IN_FLIGHT.set(gate.in_flight, model=model)
+            QUEUE_WAIT.observe(0, model=model, priority=priority)
+            return started
+
+        if gate.queued >= self.max_queue:
+            self._reject(model, gate, 429, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.waiters, (PRIORITIES.get(priority, 0), next(self._sequence), waiter))
+        gate.queued += 1
+        QUEUE_DEPTH.inc(model=model, priority=priority)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as the wait ended; pass it on
+                self._hand_over(model, gate)
+            if isinstance(e, asyncio.TimeoutError):
+                logger.warning(f"Admission wait timed out for model {model} after {self.queue_timeout}s")
+                self._reject(model, gate, 503, "queue_timeout")
+            raise
+        finally:
+            gate.queued -= 1
+            QUEUE_DEPTH.dec(model=model, priority=priority)
+            QUEUE_WAIT.observe(time.monotonic() - started, model=model, priority=priority)
+
+        return time.monotonic()
+
+    def release(self, model: str, admitted_at: Optional[float] = None):
+        """
+        Give a slot back, handing it to the next waiter if there is one
+
+        Args:
+            model: Model the slot was acquired for
+            admitted_at: Value returned by acquire(), used to estimate Retry-After
+        """
+        gate = self._gate(model)
+        if admitted_at is not None:
+            gate.avg_hold = 0.8 * gate.avg_hold + 0.2 * (time.monotonic() - admitted_at)
+        self._hand_over(model, gate)
+
+    def _hand_over(self, model: str, gate: _ModelGate):
+        while gate.waiters:
+            _, _, waiter = heapq.heappop(gate.waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        gate.in_flight -= 1
+        IN_FLIGHT.set(gate.in_flight, model=model)
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: str = "interactive"):
+        """Hold a generation slot for the duration of the block"""
+        admitted_at = await self.acquire(model, priority)
+        try:
+            yield
+        finally:
+            self.release(model, admitted_at)
+
+    def stats(self) -> dict:
+        """Per-model in-flight and queued counts"""
+        return {
+            model: {"in_flight": gate.in_flight, "queued": gate.queued, "limit": gate.limit}
+            for model, gate in self._gates.items()
+        }
+
+
+def _parse_model_limits(value: str) -> Dict[str, int]:
+    """Parse 'model=limit,model=limit' into a dict"""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, limit = item.rsplit("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """
+    Create the admission controller from configuration
+
+    Returns:
+        The controller, or None when ADMISSION_ENABLED is off
+    """
+    config = get_config()
+    if not config.admission_enabled:
+        return None
+
+    logger.info(
+        f"Admission control: max_in_flight={config.admission_max_in_flight}, "
+        f"max_queue={config.admission_max_queue}, queue_timeout={config.admission_queue_timeout}s"
+    )
+    return AdmissionController(
+        config.admission_max_in_flight,
+        config.admission_max_queue,
+        config.admission_queue_timeout,
+        _parse_model_limits(config.admission_model_limits)
+    )
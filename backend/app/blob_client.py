@@ -1,20 +1,75 @@
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    HttpResponseError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError, ResourceNotModifiedError
+)
+from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, ContentSettings
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
-import json
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Iterator, AsyncIterator
 import logging
 
+from .codecs import BlobCodec, create_blob_codec
 from .config import get_config
+from .storage import DEFAULT_BULK_CONCURRENCY, BulkResult, StorageBackend, VersionedJson, instrument_storage_operations
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of sub-requests in one Blob batch request
+BATCH_DELETE_LIMIT = 256
 
+
+def _match_conditions(if_match: Optional[str], if_none_match: Optional[str]) -> Dict[str, Any]:
+    """SDK keyword arguments for If-Match / If-None-Match headers"""
+    if if_match:
+        return {"etag": if_match, "match_condition": MatchConditions.IfNotModified}
+    if if_none_match == "*":
+        return {"match_condition": MatchConditions.IfMissing}
+    if if_none_match:
+        return {"etag": if_none_match, "match_condition": MatchConditions.IfModified}
+    return {}
+
+
+def _batch_status_error(path: str, status_code: int) -> Optional[Exception]:
+    """Map a batch sub-response status to an error; 404 is the usual no-op delete"""
+    if status_code in (200, 202, 404):
+        if status_code == 404:
+            logger.warning(f"Blob not found for deletion: {path}")
+        return None
+    return HttpResponseError(f"Batch delete of {path} failed with status {status_code}")
+
+
+@instrument_storage_operations
 class BlobStorageClient:
     """Wrapper class for Azure Blob Storage client"""
     
-    def __init__(self):
-        """Initialize Blob Storage client with configuration from Key Vault or environment"""
+    def __init__(
+        self,
+        container_client: Optional[ContainerClient] = None,
+        max_concurrency: Optional[int] = None,
+        codec: Optional[BlobCodec] = None
+    ):
+        """
+        Initialize Blob Storage client with configuration from Key Vault or environment
+
+        Args:
+            container_client: Pre-built container client (e.g. an Azurite or in-memory
+                stand-in). When given, configuration is not read.
+            max_concurrency: Default concurrency limit for bulk operations
+            codec: Serialization/compression for upload_json (defaults to BLOB_SERIALIZER
+                and BLOB_COMPRESSION, or plain JSON with a pre-built container client)
+        """
+        if container_client is not None:
+            self.blob_service_client = None
+            self.container_client = container_client
+            self.max_concurrency = max_concurrency or DEFAULT_BULK_CONCURRENCY
+            self.codec = codec or BlobCodec()
+            return
+
         config = get_config()
+        self.max_concurrency = max_concurrency or config.blob_max_concurrency
+        self.codec = codec or create_blob_codec()
         self.connection_string = config.blob_connection_string
         self.container_name = config.blob_container_name
         
@@ -44,19 +99,43 @@ class BlobStorageClient:
             logger.error(f"Error initializing container: {str(e)}")
             raise
     
-    def upload_json(self, blob_path: str, data: Dict[str, Any]) -> None:
+    def upload_json(
+        self,
+        blob_path: str,
+        data: Dict[str, Any],
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[str]:
         """
         Upload JSON data to a blob
         
         Args:
             blob_path: Path to the blob (e.g., 'sessions/session-id.json')
             data: Dictionary to be stored as JSON
+            if_match: Only overwrite the blob if it still has this ETag
+            if_none_match: '*' to only create the blob if it does not exist yet
+            
+        Returns:
+            The ETag of the uploaded blob
+            
+        Raises:
+            ResourceModifiedError, ResourceExistsError: The condition was not met
         """
         try:
             blob_client = self.container_client.get_blob_client(blob_path)
-            json_data = json.dumps(data, default=str)  # default=str handles datetime serialization
-            blob_client.upload_blob(json_data, overwrite=True)
+            body, metadata = self.codec.encode(data)
+            result = blob_client.upload_blob(
+                body,
+                overwrite=True,
+                metadata=metadata,
+                content_settings=ContentSettings(content_type=self.codec.content_type),
+                **_match_conditions(if_match, if_none_match)
+            )
             logger.info(f"Uploaded blob: {blob_path}")
+            return (result or {}).get("etag")
+        except (ResourceModifiedError, ResourceExistsError):
+            logger.info(f"Conditional upload of {blob_path} did not match, not uploaded")
+            raise
         except Exception as e:
             logger.error(f"Error uploading blob {blob_path}: {str(e)}")
             raise
@@ -73,36 +152,124 @@ class BlobStorageClient:
         """
         try:
             blob_client = self.container_client.get_blob_client(blob_path)
+            downloader = blob_client.download_blob()
+            data = self.codec.decode(downloader.readall(), downloader.properties.metadata)
+            logger.info(f"Downloaded blob: {blob_path}")
+            return data
+            
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading blob {blob_path}: {str(e)}")
+            raise
+    
+    def download_json_versioned(self, blob_path: str, if_none_match: Optional[str] = None) -> VersionedJson:
+        """
+        Download JSON data from a blob together with its ETag
+        
+        Args:
+            blob_path: Path to the blob
+            if_none_match: ETag of a cached copy; when the blob still has it, the
+                service answers 304 and nothing is transferred
+            
+        Returns:
+            The data and ETag (data None if the blob doesn't exist), or modified=False
+            when the blob still matches if_none_match
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            if if_none_match:
+                downloader = blob_client.download_blob(etag=if_none_match, match_condition=MatchConditions.IfModified)
+            else:
+                downloader = blob_client.download_blob()
+            data = self.codec.decode(downloader.readall(), downloader.properties.metadata)
+            logger.info(f"Downloaded blob: {blob_path}")
+            return VersionedJson(data, downloader.properties.etag)
+        except ResourceNotModifiedError:
+            return VersionedJson(None, if_none_match, modified=False)
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return VersionedJson(None)
+        except Exception as e:
+            logger.error(f"Error downloading blob {blob_path}: {str(e)}")
+            raise
+    
+    def append_text(self, blob_path: str, text: str) -> int:
+        """
+        Append a block of text to an append blob, creating the blob if needed
+        
+        Args:
+            blob_path: Path to the append blob
+            text: Text to append (one block)
+            
+        Returns:
+            Size of the blob in bytes after the append
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            data = text.encode("utf-8")
+            
+            try:
+                result = blob_client.append_block(data)
+            except ResourceNotFoundError:
+                # Only if still missing: re-creating an existing append blob empties it
+                try:
+                    blob_client.create_append_blob(**_match_conditions(None, "*"))
+                except (ResourceExistsError, ResourceModifiedError):
+                    pass  # another writer created it first
+                result = blob_client.append_block(data)
             
-            if not blob_client.exists():
-                logger.warning(f"Blob not found: {blob_path}")
-                return None
+            logger.info(f"Appended {len(data)} bytes to blob: {blob_path}")
+            return int(result["blob_append_offset"]) + len(data)
+            
+        except Exception as e:
+            logger.error(f"Error appending to blob {blob_path}: {str(e)}")
+            raise
+    
+    def download_text(self, blob_path: str) -> Optional[str]:
+        """
+        Download a blob as text
+        
+        Args:
+            blob_path: Path to the blob
             
+        Returns:
+            Blob content decoded as UTF-8, or None if blob doesn't exist
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
             blob_data = blob_client.download_blob().readall()
-            data = json.loads(blob_data)
             logger.info(f"Downloaded blob: {blob_path}")
-            return data
+            return blob_data.decode("utf-8")
             
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return None
         except Exception as e:
             logger.error(f"Error downloading blob {blob_path}: {str(e)}")
             raise
     
-    def delete_blob(self, blob_path: str) -> None:
+    def delete_blob(self, blob_path: str, if_match: Optional[str] = None) -> None:
         """
-        Delete a blob
+        Delete a blob; a missing blob is a no-op
         
         Args:
             blob_path: Path to the blob
+            if_match: Only delete the blob if it still has this ETag
+            
+        Raises:
+            ResourceModifiedError: The blob has changed since if_match was read
         """
         try:
             blob_client = self.container_client.get_blob_client(blob_path)
-            
-            if blob_client.exists():
-                blob_client.delete_blob()
-                logger.info(f"Deleted blob: {blob_path}")
-            else:
-                logger.warning(f"Blob not found for deletion: {blob_path}")
-                
+            blob_client.delete_blob(**_match_conditions(if_match, None))
+            logger.info(f"Deleted blob: {blob_path}")
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found for deletion: {blob_path}")
+        except ResourceModifiedError:
+            logger.info(f"Conditional delete of {blob_path} did not match, not deleted")
+            raise
         except Exception as e:
             logger.error(f"Error deleting blob {blob_path}: {str(e)}")
             raise
@@ -127,6 +294,78 @@ class BlobStorageClient:
             logger.error(f"Error listing blobs with prefix {prefix}: {str(e)}")
             raise
     
+    def iter_blob_names(self, prefix: str = "", page_size: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield blob paths with a given prefix in name order, one listing page at a time
+        
+        Unlike list_blobs, the caller can stop early and only the pages read so
+        far are requested.
+        
+        Args:
+            prefix: Prefix to filter blobs
+            page_size: Names requested per listing call (service default: 5000)
+        """
+        try:
+            for blob in self.container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size):
+                yield blob.name
+        except Exception as e:
+            logger.error(f"Error listing blobs with prefix {prefix}: {str(e)}")
+            raise
+    
+    def download_many(self, blob_paths: List[str], concurrency: Optional[int] = None,
+                      as_text: bool = False) -> List[BulkResult]:
+        """
+        Download many JSON (or text) blobs concurrently
+        
+        Args:
+            blob_paths: Paths of the blobs to download
+            concurrency: Maximum requests in flight (defaults to max_concurrency)
+            as_text: Return the decoded text instead of parsed JSON
+            
+        Returns:
+            One BulkResult per path, in input order; data is None for missing blobs
+        """
+        download = self.download_text if as_text else self.download_json
+        return self._run_bulk(blob_paths, download, concurrency)
+    
+    def delete_many(self, blob_paths: List[str], concurrency: Optional[int] = None) -> List[BulkResult]:
+        """
+        Delete many blobs, using the Blob batch API where the account supports it
+        
+        Args:
+            blob_paths: Paths of the blobs to delete; missing blobs are a no-op
+            concurrency: Maximum requests in flight when falling back to single deletes
+            
+        Returns:
+            One BulkResult per path, in input order
+        """
+        try:
+            results = []
+            for start in range(0, len(blob_paths), BATCH_DELETE_LIMIT):
+                chunk = blob_paths[start:start + BATCH_DELETE_LIMIT]
+                responses = self.container_client.delete_blobs(*chunk, raise_on_any_failure=False)
+                for path, response in zip(chunk, responses):
+                    results.append(BulkResult(path, error=_batch_status_error(path, response.status_code)))
+            logger.info(f"Batch deleted {len(blob_paths)} blobs")
+            return results
+        except HttpResponseError as e:
+            logger.warning(f"Batch delete unavailable, deleting blobs individually: {str(e)}")
+            return self._run_bulk(blob_paths, self.delete_blob, concurrency)
+    
+    def _run_bulk(self, blob_paths: List[str], operation: Callable[[str], Any],
+                  concurrency: Optional[int]) -> List[BulkResult]:
+        """Run operation over blob_paths on a bounded thread pool, collecting per-item errors"""
+        def run(path: str) -> BulkResult:
+            try:
+                return BulkResult(path, data=operation(path))
+            except Exception as e:
+                return BulkResult(path, error=e)
+        
+        if not blob_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=concurrency or self.max_concurrency) as executor:
+            return list(executor.map(run, blob_paths))
+    
     def blob_exists(self, blob_path: str) -> bool:
         """
         Check if a blob exists
@@ -145,6 +384,330 @@ class BlobStorageClient:
             return False
 
 
+class AsyncBlobStorageClient(StorageBackend):
+    """Async wrapper for Azure Blob Storage, built on the azure.storage.blob.aio client"""
+    
+    def __init__(self, container_client=None, max_concurrency: Optional[int] = None, codec: Optional[BlobCodec] = None):
+        """
+        Create the async client. Call initialize() before first use.
+
+        Args:
+            container_client: Pre-built async container client (e.g. an Azurite or
+                in-memory stand-in). When given, configuration is not read.
+            max_concurrency: Default concurrency limit for bulk operations
+            codec: Serialization/compression for upload_json (defaults to BLOB_SERIALIZER
+                and BLOB_COMPRESSION, or plain JSON with a pre-built container client)
+        """
+        if container_client is not None:
+            self.blob_service_client = None
+            self.container_name = getattr(container_client, "container_name", None)
+            self.container_client = container_client
+            self.max_concurrency = max_concurrency or DEFAULT_BULK_CONCURRENCY
+            self.codec = codec or BlobCodec()
+            return
+
+        config = get_config()
+        self.max_concurrency = max_concurrency or config.blob_max_concurrency
+        self.codec = codec or create_blob_codec()
+        self.connection_string = config.blob_connection_string
+        self.container_name = config.blob_container_name
+        
+        if not self.connection_string:
+            raise ValueError("Blob connection string not found in configuration")
+        
+        self.blob_service_client = AsyncBlobServiceClient.from_connection_string(self.connection_string)
+        self.container_client = self.blob_service_client.get_container_client(self.container_name)
+    
+    async def initialize(self):
+        """Create container if it doesn't exist"""
+        try:
+            if not await self.container_client.exists():
+                await self.container_client.create_container()
+                logger.info(f"Container '{self.container_name}' created")
+            else:
+                logger.info(f"Container '{self.container_name}' already exists")
+                
+        except Exception as e:
+            logger.error(f"Error initializing container: {str(e)}")
+            raise
+    
+    async def close(self):
+        """Close the underlying HTTP sessions"""
+        if self.blob_service_client is not None:
+            await self.blob_service_client.close()
+    
+    async def upload_json(
+        self,
+        blob_path: str,
+        data: Dict[str, Any],
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Upload JSON data to a blob
+        
+        Args:
+            blob_path: Path to the blob (e.g., 'sessions/session-id.json')
+            data: Dictionary to be stored as JSON
+            if_match: Only overwrite the blob if it still has this ETag
+            if_none_match: '*' to only create the blob if it does not exist yet
+            
+        Returns:
+            The ETag of the uploaded blob
+            
+        Raises:
+            ResourceModifiedError, ResourceExistsError: The condition was not met
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            body, metadata = self.codec.encode(data)
+            result = await blob_client.upload_blob(
+                body,
+                overwrite=True,
+                metadata=metadata,
+                content_settings=ContentSettings(content_type=self.codec.content_type),
+                **_match_conditions(if_match, if_none_match)
+            )
+            logger.info(f"Uploaded blob: {blob_path}")
+            return (result or {}).get("etag")
+        except (ResourceModifiedError, ResourceExistsError):
+            logger.info(f"Conditional upload of {blob_path} did not match, not uploaded")
+            raise
+        except Exception as e:
+            logger.error(f"Error uploading blob {blob_path}: {str(e)}")
+            raise
+    
+    async def download_json(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Download JSON data from a blob
+        
+        Args:
+            blob_path: Path to the blob
+            
+        Returns:
+            Dictionary containing the JSON data, or None if blob doesn't exist
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            downloader = await blob_client.download_blob()
+            data = self.codec.decode(await downloader.readall(), downloader.properties.metadata)
+            logger.info(f"Downloaded blob: {blob_path}")
+            return data
+            
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading blob {blob_path}: {str(e)}")
+            raise
+    
+    async def download_json_versioned(self, blob_path: str, if_none_match: Optional[str] = None) -> VersionedJson:
+        """
+        Download JSON data from a blob together with its ETag
+        
+        Args:
+            blob_path: Path to the blob
+            if_none_match: ETag of a cached copy; when the blob still has it, the
+                service answers 304 and nothing is transferred
+            
+        Returns:
+            The data and ETag (data None if the blob doesn't exist), or modified=False
+            when the blob still matches if_none_match
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            if if_none_match:
+                downloader = await blob_client.download_blob(etag=if_none_match, match_condition=MatchConditions.IfModified)
+            else:
+                downloader = await blob_client.download_blob()
+            data = self.codec.decode(await downloader.readall(), downloader.properties.metadata)
+            logger.info(f"Downloaded blob: {blob_path}")
+            return VersionedJson(data, downloader.properties.etag)
+        except ResourceNotModifiedError:
+            return VersionedJson(None, if_none_match, modified=False)
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return VersionedJson(None)
+        except Exception as e:
+            logger.error(f"Error downloading blob {blob_path}: {str(e)}")
+            raise
+    
+    async def append_text(self, blob_path: str, text: str) -> int:
+        """
+        Append a block of text to an append blob, creating the blob if needed
+        
+        Args:
+            blob_path: Path to the append blob
+            text: Text to append (one block)
+            
+        Returns:
+            Size of the blob in bytes after the append
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            data = text.encode("utf-8")
+            
+            try:
+                result = await blob_client.append_block(data)
+            except ResourceNotFoundError:
+                # Only if still missing: re-creating an existing append blob empties it
+                try:
+                    await blob_client.create_append_blob(**_match_conditions(None, "*"))
+                except (ResourceExistsError, ResourceModifiedError):
+                    pass  # another writer created it first
+                result = await blob_client.append_block(data)
+            
+            logger.info(f"Appended {len(data)} bytes to blob: {blob_path}")
+            return int(result["blob_append_offset"]) + len(data)
+            
+        except Exception as e:
+            logger.error(f"Error appending to blob {blob_path}: {str(e)}")
+            raise
+    
+    async def download_text(self, blob_path: str) -> Optional[str]:
+        """
+        Download a blob as text
+        
+        Args:
+            blob_path: Path to the blob
+            
+        Returns:
+            Blob content decoded as UTF-8, or None if blob doesn't exist
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            downloader = await blob_client.download_blob()
+            blob_data = await downloader.readall()
+            logger.info(f"Downloaded blob: {blob_path}")
+            return blob_data.decode("utf-8")
+            
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found: {blob_path}")
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading blob {blob_path}: {str(e)}")
+            raise
+    
+    async def delete_blob(self, blob_path: str, if_match: Optional[str] = None) -> None:
+        """
+        Delete a blob; a missing blob is a no-op
+        
+        Args:
+            blob_path: Path to the blob
+            if_match: Only delete the blob if it still has this ETag
+            
+        Raises:
+            ResourceModifiedError: The blob has changed since if_match was read
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            await blob_client.delete_blob(**_match_conditions(if_match, None))
+            logger.info(f"Deleted blob: {blob_path}")
+        except ResourceNotFoundError:
+            logger.warning(f"Blob not found for deletion: {blob_path}")
+        except ResourceModifiedError:
+            logger.info(f"Conditional delete of {blob_path} did not match, not deleted")
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting blob {blob_path}: {str(e)}")
+            raise
+    
+    async def list_blobs(self, prefix: str = "") -> List[str]:
+        """
+        List all blobs with a given prefix
+        
+        Args:
+            prefix: Prefix to filter blobs (e.g., 'messages/session-id/')
+            
+        Returns:
+            List of blob paths
+        """
+        try:
+            blob_paths = [blob.name async for blob in self.container_client.list_blobs(name_starts_with=prefix)]
+            logger.info(f"Listed {len(blob_paths)} blobs with prefix: {prefix}")
+            return blob_paths
+            
+        except Exception as e:
+            logger.error(f"Error listing blobs with prefix {prefix}: {str(e)}")
+            raise
+    
+    async def iter_blob_names(self, prefix: str = "", page_size: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Yield blob paths with a given prefix in name order, one listing page at a time
+        
+        Unlike list_blobs, the caller can stop early and only the pages read so
+        far are requested.
+        
+        Args:
+            prefix: Prefix to filter blobs
+            page_size: Names requested per listing call (service default: 5000)
+        """
+        try:
+            async for blob in self.container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size):
+                yield blob.name
+        except Exception as e:
+            logger.error(f"Error listing blobs with prefix {prefix}: {str(e)}")
+            raise
+    
+    async def download_many(self, blob_paths: List[str], concurrency: Optional[int] = None,
+                            as_text: bool = False) -> List[BulkResult]:
+        """
+        Download many JSON (or text) blobs concurrently
+        
+        Args:
+            blob_paths: Paths of the blobs to download
+            concurrency: Maximum requests in flight (defaults to max_concurrency)
+            as_text: Return the decoded text instead of parsed JSON
+            
+        Returns:
+            One BulkResult per path, in input order; data is None for missing blobs
+        """
+        download = self.download_text if as_text else self.download_json
+        return await self._run_bulk(blob_paths, download, concurrency)
+    
+    async def delete_many(self, blob_paths: List[str], concurrency: Optional[int] = None) -> List[BulkResult]:
+        """
+        Delete many blobs, using the Blob batch API where the account supports it
+        
+        Args:
+            blob_paths: Paths of the blobs to delete; missing blobs are a no-op
+            concurrency: Maximum requests in flight when falling back to single deletes
+            
+        Returns:
+            One BulkResult per path, in input order
+        """
+        try:
+            results = []
+            for start in range(0, len(blob_paths), BATCH_DELETE_LIMIT):
+                chunk = blob_paths[start:start + BATCH_DELETE_LIMIT]
+                responses = await self.container_client.delete_blobs(*chunk, raise_on_any_failure=False)
+                statuses = [response.status_code async for response in responses]
+                for path, status_code in zip(chunk, statuses):
+                    results.append(BulkResult(path, error=_batch_status_error(path, status_code)))
+            logger.info(f"Batch deleted {len(blob_paths)} blobs")
+            return results
+        except HttpResponseError as e:
+            logger.warning(f"Batch delete unavailable, deleting blobs individually: {str(e)}")
+            return await self._run_bulk(blob_paths, self.delete_blob, concurrency)
+    
+    async def blob_exists(self, blob_path: str) -> bool:
+        """
+        Check if a blob exists
+        
+        Args:
+            blob_path: Path to the blob
+            
+        Returns:
+            True if blob exists, False otherwise
+        """
+        try:
+            blob_client = self.container_client.get_blob_client(blob_path)
+            return await blob_client.exists()
+        except Exception as e:
+            logger.error(f"Error checking blob existence {blob_path}: {str(e)}")
+            return False
+
+
 # Singleton instance
 _blob_client: Optional[BlobStorageClient] = None
 
@@ -155,3 +718,16 @@ def get_blob_client() -> BlobStorageClient:
     if _blob_client is None:
         _blob_client = BlobStorageClient()
     return _blob_client
+
+
+_async_blob_client: Optional[AsyncBlobStorageClient] = None
+
+
+async def get_async_blob_client() -> AsyncBlobStorageClient:
+    """Get or create the async Blob Storage client singleton"""
+    global _async_blob_client
+    if _async_blob_client is None:
+        client = AsyncBlobStorageClient()
+        await client.initialize()
+        _async_blob_client = client
+    return _async_blob_client
@@ -0,0 +1,155 @@
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+import gzip
+import json
+import logging
+
+from .config import get_config
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: compact binary serialization
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: better/faster compression than gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Blob metadata keys recording how a blob was written. Blobs without them are
+# plain UTF-8 JSON, which is what every blob written before codecs existed is.
+CODEC_METADATA_KEY = "codec"
+ENCODING_METADATA_KEY = "encoding"
+
+CONTENT_TYPES = {"json": "application/json", "msgpack": "application/msgpack"}
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, default=str).encode("utf-8")
+
+
+def _orjson_dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=str)
+
+
+def _msgpack_dumps(data: Any) -> bytes:
+    return msgpack.packb(data, default=str, use_bin_type=True)
+
+
+def _msgpack_loads(body: bytes) -> Any:
+    return msgpack.unpackb(body, raw=False)
+
+
+def _zstd_compress(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+def _zstd_decompress(body: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(body)
+
+
+def _gzip_compress(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6)
+
+
+# serializer -> (wire format recorded in metadata, encoder, module it needs)
+SERIALIZERS: Dict[str, Tuple[str, Callable[[Any], bytes], Any]] = {
+    "json": ("json", _json_dumps, json),
+    "orjson": ("json", _orjson_dumps, orjson),
+    "msgpack": ("msgpack", _msgpack_dumps, msgpack),
+}
+
+# compression -> (compress, decompress, module it needs)
+COMPRESSIONS: Dict[str, Tuple[Optional[Callable[[bytes], bytes]], Optional[Callable[[bytes], bytes]], Any]] = {
+    "identity": (None, None, True),
+    "gzip": (_gzip_compress, gzip.decompress, gzip),
+    "zstd": (_zstd_compress, _zstd_decompress, zstandard),
+}
+
+
+def _loads(wire_format: str) -> Callable[[bytes], Any]:
+    """Fastest available decoder for a wire format"""
+    if wire_format == "json":
+        return orjson.loads if orjson is not None else json.loads
+    if wire_format == "msgpack" and msgpack is not None:
+        return _msgpack_loads
+    raise ValueError(f"Cannot decode blobs written with codec '{wire_format}' (is the package installed?)")
+
+
+class BlobCodec:
+    """
+    Serialization and optional compression of the JSON documents kept in blobs
+
+    Writes use the configured serializer (json, orjson or msgpack) and compress
+    bodies of at least min_compress_bytes (gzip or zstd). The wire format and
+    compression are recorded in the blob's metadata, and reads decode each blob
+    by its own metadata, so blobs written with any codec (including plain JSON
+    from before codecs existed) stay readable after the setting changes. They
+    are kept in x-ms-meta-* rather than Content-Encoding so that no HTTP layer
+    decompresses the body on the way.
+    """
+
+    def __init__(self, serializer: str = "json", compression: str = "identity", min_compress_bytes: int = 1024):
+        """
+        Args:
+            serializer: 'json', 'orjson' or 'msgpack'
+            compression: 'identity', 'gzip' or 'zstd'
+            min_compress_bytes: Smaller bodies are stored uncompressed
+
+        Raises:
+            ValueError: Unknown codec, or its optional package is not installed
+        """
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown blob serializer '{serializer}', expected one of: {', '.join(SERIALIZERS)}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown blob compression '{compression}', expected one of: {', '.join(COMPRESSIONS)}")
+        if SERIALIZERS[serializer][2] is None or COMPRESSIONS[compression][2] is None:
+            raise ValueError(f"Blob codec '{serializer}+{compression}' needs a package that is not installed")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.min_compress_bytes = min_compress_bytes
+        self.wire_format, self._dumps, _ = SERIALIZERS[serializer]
+        self._compress = COMPRESSIONS[compression][0]
+
+    @property
+    def name(self) -> str:
+        return f"{self.serializer}+{self.compression}"
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.wire_format]
+
+    def encode(self, data: Any) -> Tuple[bytes, Dict[str, str]]:
+        """Serialize (and possibly compress) data; returns the body and the blob metadata to store with it"""
+        body = self._dumps(data)
+        encoding = "identity"
+        if self._compress is not None and len(body) >= self.min_compress_bytes:
+            body = self._compress(body)
+            encoding = self.compression
+        return body, {CODEC_METADATA_KEY: self.wire_format, ENCODING_METADATA_KEY: encoding}
+
+    def decode(self, body: bytes, metadata: Optional[Mapping[str, str]] = None) -> Any:
+        """Decode a blob body according to the metadata it was stored with"""
+        metadata = metadata or {}
+        encoding = metadata.get(ENCODING_METADATA_KEY, "identity")
+        if encoding != "identity":
+            decompress = COMPRESSIONS.get(encoding, (None, None, None))[1]
+            if decompress is None or COMPRESSIONS[encoding][2] is None:
+                raise ValueError(f"Cannot decode blobs compressed with '{encoding}' (is the package installed?)")
+            body = decompress(body)
+        return _loads(metadata.get(CODEC_METADATA_KEY, "json"))(body)
+
+
+def create_blob_codec() -> BlobCodec:
+    """Create the blob codec from configuration"""
+    config = get_config()
+    codec = BlobCodec(config.blob_serializer, config.blob_compression, config.blob_compress_min_bytes)
+    logger.info(f"Blob codec: {codec.name} (compressing bodies >= {codec.min_compress_bytes} bytes)")
+    return codec
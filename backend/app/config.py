@@ -1,15 +1,26 @@
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
+from concurrent.futures import ThreadPoolExecutor
 import os
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Key Vault secret name -> Config attribute
+KEY_VAULT_SECRETS = {
+    "blob-connection-string": "blob_connection_string",
+    "blob-container-name": "blob_container_name",
+    "ollama-url": "ollama_url",
+}
+
 class Config:
     """Configuration class that retrieves secrets from Azure Key Vault or environment variables"""
     
     def __init__(self):
         self.key_vault_name = os.getenv("KEY_VAULT_NAME")
+        self._init_settings()
         
         if self.key_vault_name:
             # Use Key Vault
@@ -20,24 +31,144 @@ class Config:
             logger.warning("KEY_VAULT_NAME not set, using environment variables for configuration")
             self._init_from_env()
     
+    def _init_settings(self):
+        """Initialize non-secret tuning settings from environment variables"""
+        # Storage backend: 'azure' (Blob Storage), 'filesystem' (files under
+        # STORAGE_PATH) or 'sqlite' (database file SQLITE_PATH)
+        self.storage_backend = os.getenv("STORAGE_BACKEND", "azure").lower()
+        self.storage_path = os.getenv("STORAGE_PATH", "./data")
+        self.sqlite_path = os.getenv("SQLITE_PATH", "./data/storage.db")
+        # Codec for JSON documents written to Blob Storage: serializer json, orjson or
+        # msgpack, compression identity, gzip or zstd for bodies of at least
+        # BLOB_COMPRESS_MIN_BYTES; reads follow each blob's own metadata
+        self.blob_serializer = os.getenv("BLOB_SERIALIZER", "json").lower()
+        self.blob_compression = os.getenv("BLOB_COMPRESSION", "identity").lower()
+        self.blob_compress_min_bytes = int(os.getenv("BLOB_COMPRESS_MIN_BYTES", "1024"))
+        # Size at which a session's message log rolls over to a new segment blob
+        self.message_segment_max_bytes = int(os.getenv("MESSAGE_SEGMENT_MAX_BYTES", str(1024 * 1024)))
+        # Requests in flight for bulk blob downloads/deletes
+        self.blob_max_concurrency = int(os.getenv("BLOB_MAX_CONCURRENCY", "16"))
+        # In-process cache of session and metadata objects; entries older than the
+        # TTL are revalidated with a conditional (ETag) GET
+        self.object_cache_max_entries = int(os.getenv("OBJECT_CACHE_MAX_ENTRIES", "4096"))
+        self.object_cache_ttl = float(os.getenv("OBJECT_CACHE_TTL", "30"))
+        # Deferred, per-session coalesced last_active/metadata field writes (message
+        # counters are always written at once)
+        self.write_behind_enabled = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+        self.write_behind_flush_interval = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2"))
+        self.write_behind_max_pending = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "1000"))
+        # Per-session cache of the newest messages, used to build conversation context
+        self.message_tail_size = int(os.getenv("MESSAGE_TAIL_SIZE", "32"))
+        self.message_tail_sessions = int(os.getenv("MESSAGE_TAIL_SESSIONS", "1024"))
+        self.message_tail_ttl = float(os.getenv("MESSAGE_TAIL_TTL", "300"))
+        
+        # Ollama connection pool and timeouts
+        self.ollama_max_connections = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+        self.ollama_max_keepalive_connections = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.ollama_keepalive_expiry = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+        self.ollama_connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        self.ollama_read_timeout = float(os.getenv("OLLAMA_READ_TIMEOUT", os.getenv("OLLAMA_TIMEOUT", "60")))
+        self.ollama_http2 = os.getenv("OLLAMA_HTTP2", "false").lower() == "true"
+        
+        # Ollama replicas to balance across: a static list, or a headless service resolved via DNS
+        self.ollama_urls = os.getenv("OLLAMA_URLS", "")  # e.g. "http://ollama-0:11434,http://ollama-1:11434"
+        self.ollama_discovery_url = os.getenv("OLLAMA_DISCOVERY_URL")  # e.g. "http://ollama-headless:11434"
+        self.ollama_refresh_interval = float(os.getenv("OLLAMA_REFRESH_INTERVAL", "10"))
+        self.ollama_eject_after = int(os.getenv("OLLAMA_EJECT_AFTER", "3"))
+        self.ollama_eject_seconds = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+        
+        # Response cache for identical /query prompts (opt-in)
+        self.response_cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+        self.response_cache_backend = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory" or "blob"
+        self.response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        # Entries kept per pod (memory) or in total (blob); the oldest are evicted beyond it
+        self.response_cache_max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+        
+        # Conversation history sent with each /query
+        self.context_enabled = os.getenv("CONTEXT_ENABLED", "true").lower() == "true"
+        self.context_max_turns = int(os.getenv("CONTEXT_MAX_TURNS", "8"))
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2048"))
+        # Reuse Ollama's returned `context` token array instead of re-sending history text
+        self.context_reuse_ollama = os.getenv("CONTEXT_REUSE_OLLAMA", "false").lower() == "true"
+        
+        # Share one upstream generation between concurrent identical /query requests
+        # (of the same priority, so an interactive one never waits in a background lane)
+        self.single_flight_enabled = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+        
+        # Admission control: concurrent generations per model and the wait queue behind them
+        self.admission_enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.admission_max_in_flight = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+        self.admission_model_limits = os.getenv("ADMISSION_MODEL_LIMITS", "")  # e.g. "qwen2.5:7b=1,qwen2.5:1.5b=4"
+        self.admission_max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.admission_queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+        
+        # POST /query/batch: questions per request and generations run at once per batch
+        self.batch_max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "64"))
+        self.batch_max_parallel = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+        
+        # Asynchronous generation jobs (/jobs): worker tasks per replica (independent of
+        # request concurrency), queued jobs accepted, and the read timeout of their Ollama
+        # streams (long generations are what jobs are for, so it is far above OLLAMA_READ_TIMEOUT)
+        self.job_workers = int(os.getenv("JOB_WORKERS", "2"))
+        self.job_max_queued = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+        self.job_read_timeout = float(os.getenv("JOB_READ_TIMEOUT", "600"))
+        # Seconds between checkpoints of a running job's output (which also renew its lease),
+        # and since the last one after which another replica may take the job over
+        self.job_checkpoint_interval = float(os.getenv("JOB_CHECKPOINT_INTERVAL", "2"))
+        self.job_lease_seconds = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+        self.job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        # Seconds between scans for orphaned jobs, how long finished jobs are kept, and
+        # the longest a GET /jobs/{id}?wait= long-poll is held
+        self.job_recovery_interval = float(os.getenv("JOB_RECOVERY_INTERVAL", "30"))
+        self.job_retention_seconds = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+        self.job_max_wait = float(os.getenv("JOB_MAX_WAIT", "30"))
+        
+        # Background persistence of /query messages: attempts per write, backoff between
+        # them, and the local spill file replayed once storage is reachable again
+        self.outbox_path = os.getenv("OUTBOX_PATH", "./data/outbox.jsonl")
+        self.outbox_attempts = int(os.getenv("OUTBOX_ATTEMPTS", "3"))
+        self.outbox_retry_initial_delay = float(os.getenv("OUTBOX_RETRY_INITIAL_DELAY", "0.5"))
+        self.outbox_retry_max_delay = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "5"))
+        self.outbox_replay_interval = float(os.getenv("OUTBOX_REPLAY_INTERVAL", "30"))
+        # Seconds a query waits for its session's previous writes before reading history,
+        # and seconds shutdown waits for writes still running before spilling them
+        self.outbox_settle_timeout = float(os.getenv("OUTBOX_SETTLE_TIMEOUT", "2"))
+        self.outbox_drain_timeout = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
+        
+        # Startup: attempts at reading Key Vault before falling back to the environment,
+        # and the backoff between retries of failed startup steps (storage, config)
+        self.key_vault_attempts = int(os.getenv("KEY_VAULT_ATTEMPTS", "3"))
+        self.startup_retry_initial_delay = float(os.getenv("STARTUP_RETRY_INITIAL_DELAY", "0.5"))
+        self.startup_retry_max_delay = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "15"))
+        # Seconds each /ready dependency check may take
+        self.ready_check_timeout = float(os.getenv("READY_CHECK_TIMEOUT", "2"))
+    
     def _init_key_vault(self):
-        """Initialize Key Vault client and retrieve secrets"""
-        try:
-            credential = DefaultAzureCredential()
-            vault_url = f"https://{self.key_vault_name}.vault.azure.net"
-            client = SecretClient(vault_url=vault_url, credential=credential)
-            
-            # Retrieve secrets
-            logger.info("Retrieving secrets from Key Vault...")
-            self.blob_connection_string = client.get_secret("blob-connection-string").value
-            self.blob_container_name = client.get_secret("blob-container-name").value
-            self.ollama_url = client.get_secret("ollama-url").value
-            
-            logger.info(f"Successfully retrieved secrets from Key Vault: {self.key_vault_name}")
-        except Exception as e:
-            logger.error(f"Failed to retrieve secrets from Key Vault: {e}")
-            logger.warning("Falling back to environment variables")
-            self._init_from_env()
+        """Initialize Key Vault client and retrieve secrets (in parallel, with retries)"""
+        delay = self.startup_retry_initial_delay
+        for attempt in range(1, self.key_vault_attempts + 1):
+            try:
+                credential = DefaultAzureCredential()
+                vault_url = f"https://{self.key_vault_name}.vault.azure.net"
+                client = SecretClient(vault_url=vault_url, credential=credential)
+                
+                # Retrieve secrets
+                logger.info("Retrieving secrets from Key Vault...")
+                with ThreadPoolExecutor(max_workers=len(KEY_VAULT_SECRETS)) as executor:
+                    values = executor.map(lambda name: client.get_secret(name).value, KEY_VAULT_SECRETS)
+                    for attribute, value in zip(KEY_VAULT_SECRETS.values(), values):
+                        setattr(self, attribute, value)
+                
+                logger.info(f"Successfully retrieved secrets from Key Vault: {self.key_vault_name}")
+                return
+            except Exception as e:
+                logger.error(f"Failed to retrieve secrets from Key Vault (attempt {attempt}/{self.key_vault_attempts}): {e}")
+                if attempt < self.key_vault_attempts:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.startup_retry_max_delay)
+        
+        logger.warning("Falling back to environment variables")
+        self._init_from_env()
     
     def _init_from_env(self):
         """Initialize configuration from environment variables"""
@@ -45,18 +176,26 @@ class Config:
         self.blob_container_name = os.getenv("BLOB_CONTAINER_NAME", "ai-assistant-data")
         self.ollama_url = os.getenv("OLLAMA_URL", "http://ollama-service:11434")
         
-        if not self.blob_connection_string:
+        if not self.blob_connection_string and self.storage_backend == "azure":
             logger.error("BLOB_CONNECTION_STRING not found in environment variables")
             raise ValueError("BLOB_CONNECTION_STRING must be set in environment or Key Vault")
 
 
 # Singleton instance
 _config = None
+_config_lock = threading.Lock()
 
 
 def get_config() -> Config:
-    """Get or create the configuration singleton"""
+    """
+    Get or create the configuration singleton
+    
+    The first call may read Key Vault; the API makes it from a worker thread during
+    startup, and every later call (from any thread) returns the cached instance.
+    """
     global _config
     if _config is None:
-        _config = Config()
+        with _config_lock:
+            if _config is None:
+                _config = Config()
     return _config
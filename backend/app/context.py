@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional
+import logging
+import math
+
+from .config import get_config
+from .models import ChatMessage
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_SPEAKERS = {"user": "User", "model": "Assistant", "system": "System"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text and code)"""
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message: ChatMessage) -> int:
+    """Tokens a message takes up in the prompt; model answers carry Ollama's exact eval_count"""
+    if message.role == "model" and message.tokens_used:
+        return message.tokens_used
+    return estimate_tokens(message.message_text)
+
+
+def select_window(messages: List[ChatMessage], token_budget: int) -> List[ChatMessage]:
+    """
+    The newest messages that fit in token_budget, oldest first
+
+    The window never starts with a model answer whose question was cut off.
+    """
+    window = []
+    used = 0
+    for message in reversed(messages):
+        used += message_tokens(message)
+        if used > token_budget:
+            break
+        window.append(message)
+    window.reverse()
+
+    while window and window[0].role == "model":
+        window.pop(0)
+    return window
+
+
+def format_prompt(history: List[ChatMessage], question: str) -> str:
+    """Render the history and the new question as a plain-text transcript"""
+    if not history:
+        return question
+
+    lines = [f"{_SPEAKERS.get(m.role, m.role)}: {m.message_text}" for m in history]
+    lines.append(f"User: {question}")
+    lines.append("Assistant:")
+    return "\n\n".join(lines)
+
+
+class ContextBuilder:
+    """
+    Assembles the conversation history sent to Ollama with each query
+
+    History comes from the database service's per-session tail cache, so building
+    it costs O(max_turns) rather than a read of the whole session. The newest
+    messages that fit in token_budget are rendered into the prompt.
+
+    With reuse_ollama_context, the `context` token array Ollama returns for an
+    answer is remembered and sent with the session's next question instead, so
+    Ollama does not re-tokenize the history. It is only used while the answer is
+    still the session's newest message and the array fits in the token budget;
+    otherwise the prompt is rebuilt from the windowed history.
+    """
+
+    def __init__(
+        self,
+        db_service,
+        max_turns: int,
+        token_budget: int,
+        reuse_ollama_context: bool = False,
+        max_sessions: int = 1024,
+        ttl: Optional[float] = None
+    ):
+        """
+        Args:
+            db_service: AsyncDatabaseService to read history from (None disables history)
+            max_turns: Question/answer pairs of history to consider
+            token_budget: Maximum tokens of history plus question
+            reuse_ollama_context: Send Ollama's returned context array when possible
+            max_sessions: Sessions whose context array is remembered
+            ttl: Seconds a remembered context array stays valid
+        """
+        self.db_service = db_service
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.reuse_ollama_context = reuse_ollama_context
+        # (session_id, model) -> (message_id of the answer, context token array)
+        self.ollama_contexts = TTLCache(max_sessions, ttl=ttl)
+
+    async def build(self, session_id: str, model: str, question: str) -> Dict[str, Any]:
+        """
+        Payload fields ("prompt" and optionally "context") for a new question
+
+        Failing to read history never fails the query; the bare question is sent.
+        """
+        if self.db_service is None or self.max_turns <= 0:
+            return {"prompt": question}
+
+        try:
+            history = await self.db_service.get_recent_messages(session_id, self.max_turns * 2)
+        except Exception as e:
+            logger.error(f"Error reading conversation history for session {session_id}: {e}")
+            return {"prompt": question}
+
+        budget = self.token_budget - estimate_tokens(question)
+        if self.reuse_ollama_context and history:
+            remembered = self.ollama_contexts.get((session_id, model))
+            if remembered and remembered[0] == history[-1].message_id and len(remembered[1]) <= budget:
+                return {"prompt": question, "context": remembered[1]}
+
+        return {"prompt": format_prompt(select_window(history, budget), question)}
+
+    def remember(
+        self,
+        session_id: str,
+        model: str,
+        message: Optional[ChatMessage],
+        context: Optional[List[int]]
+    ):
+        """Record the context array Ollama returned with the saved answer message"""
+        if self.reuse_ollama_context and message is not None and context:
+            self.ollama_contexts.set((session_id, model), (message.message_id, context))
+
+
+def create_context_builder(db_service) -> ContextBuilder:
+    """Create the context builder from configuration"""
+    config = get_config()
+    return ContextBuilder(
+        db_service if config.context_enabled else None,
+        config.context_max_turns,
+        config.context_token_budget,
+        reuse_ollama_context=config.context_reuse_ollama,
+        max_sessions=config.message_tail_sessions,
+        ttl=config.message_tail_ttl
+    )
@@ -1,70 +1,226 @@
-from typing import Optional, List
-from datetime import datetime
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional, List, Tuple
+from datetime import datetime, timezone
+import asyncio
+import functools
+import inspect
+import json
 import logging
+import random
+import time
+import weakref
 
-from .blob_client import get_blob_client
-from .models import UserSession, ChatMessage, SessionMetadata
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+from .config import get_config
+from .storage import BulkResult, StorageBackend, create_storage_backend, get_storage_backend
+from .models import (
+    UserSession, ChatMessage, SessionMetadata, LATEST_CURSOR, CHAT_MESSAGES, USER_SESSIONS,
+    message_cursor, parse_message_lines
+)
+from .ttl_cache import TTLCache
+from .write_behind import WriteBehindBuffer
 
 logger = logging.getLogger(__name__)
 
+# Recency index entries: session-index/{SESSION_INDEX_MAX - epoch millis}-{session_id}.json
+SESSION_INDEX_PREFIX = "session-index/"
+SESSION_INDEX_MAX = 10 ** 13 - 1
 
-class DatabaseService:
-    """Service layer for database operations"""
+# Attempts at a conditional (If-Match) metadata or manifest update before giving up
+METADATA_UPDATE_ATTEMPTS = 5
+MANIFEST_UPDATE_ATTEMPTS = 5
+
+
+def _raise_first_error(results: List[BulkResult]):
+    """Raise the first per-item error of a bulk storage operation, if any"""
+    for result in results:
+        if not result.ok:
+            raise result.error
+
+
+@dataclass
+class MetadataUpdate:
+    """A change to a session's metadata: fields to set and deltas to its counters"""
+    fields: dict = field(default_factory=dict)
+    message_delta: int = 0
+    tokens_delta: int = 0
+    recount: bool = False  # Recount messages and tokens from the log (after a delete)
+    
+    @property
+    def changes_counters(self) -> bool:
+        return bool(self.message_delta or self.tokens_delta or self.recount)
+    
+    def merge(self, newer: "MetadataUpdate") -> "MetadataUpdate":
+        """Combine with a later update: later field values win, deltas add up"""
+        return MetadataUpdate(
+            fields={**self.fields, **newer.fields},
+            message_delta=self.message_delta + newer.message_delta,
+            tokens_delta=self.tokens_delta + newer.tokens_delta,
+            recount=self.recount or newer.recount
+        )
+    
+    def apply(self, metadata: SessionMetadata) -> SessionMetadata:
+        """Return a copy of metadata with the update applied"""
+        metadata = metadata.model_copy(update=self.fields, deep=True)
+        if self.recount:
+            metadata.message_count = metadata.tokens_total = None
+        elif metadata.message_count is not None:
+            metadata.message_count += self.message_delta
+            metadata.tokens_total = (metadata.tokens_total or 0) + self.tokens_delta
+        return metadata
+
+
+class AsyncDatabaseService:
+    """Service layer for database operations (non-blocking, used by the API handlers)"""
+    
+    def __init__(self, client: StorageBackend, segment_max_bytes: Optional[int] = None):
+        config = get_config()
+        self.client = client
+        self.segment_max_bytes = segment_max_bytes or config.message_segment_max_bytes
+        
+        # Newest messages of recently active sessions, kept current as messages are
+        # appended so conversation context does not need a storage read per turn
+        self.tail_size = config.message_tail_size
+        self.message_tails = TTLCache(config.message_tail_sessions, ttl=config.message_tail_ttl)
+        
+        # Sessions and metadata by blob path, as (object, etag, validated_at). Entries
+        # younger than object_cache_ttl are served as is; older ones are revalidated
+        # with a conditional GET, which costs no transfer when the blob is unchanged.
+        self.object_cache = TTLCache(config.object_cache_max_entries)
+        self.object_cache_ttl = config.object_cache_ttl
+        self.object_cache_lookups = Counter()
+        
+        # Serializes this process's metadata writes per session, so they don't
+        # conflict with each other (entries go away with their last user)
+        self._metadata_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        
+        # last_active and metadata updates are deferred and coalesced per session
+        self.metadata_writes = None
+        if config.write_behind_enabled:
+            self.metadata_writes = WriteBehindBuffer(
+                self._write_metadata,
+                flush_interval=config.write_behind_flush_interval,
+                max_pending=config.write_behind_max_pending,
+                concurrency=config.blob_max_concurrency,
+                merge=MetadataUpdate.merge
+            )
+    
+    async def close(self):
+        """Flush deferred metadata writes and release the underlying storage client"""
+        if self.metadata_writes is not None:
+            await self.metadata_writes.close()
+        await self.client.close()
+    
+    # ==================== Object Cache ====================
+    
+    async def _get_cached(self, blob_path: str, model_class):
+        """Read a session or metadata object through the object cache"""
+        obj, _ = await self._get_versioned(blob_path, model_class)
+        return obj
     
-    def __init__(self):
-        self.client = get_blob_client()
+    async def _get_versioned(self, blob_path: str, model_class, revalidate: bool = False):
+        """
+        Read an object and its ETag through the object cache
+        
+        Args:
+            revalidate: Check with storage even if the cached entry is fresh
+        
+        Returns:
+            A copy of the object (None if the blob doesn't exist) and its ETag
+        """
+        entry = self.object_cache.peek(blob_path)
+        if entry is not None and not revalidate and time.monotonic() - entry[2] < self.object_cache_ttl:
+            self.object_cache.get(blob_path)
+            self.object_cache_lookups["hit"] += 1
+            return entry[0].model_copy(deep=True), entry[1]
+        
+        result = await self.client.download_json_versioned(blob_path, if_none_match=entry[1] if entry else None)
+        if not result.modified:
+            self.object_cache_lookups["not_modified"] += 1
+            self.object_cache.set(blob_path, (entry[0], entry[1], time.monotonic()))
+            return entry[0].model_copy(deep=True), entry[1]
+        
+        self.object_cache_lookups["miss"] += 1
+        if result.data is None:
+            self.object_cache.pop(blob_path)
+            return None, None
+        
+        obj = model_class(**result.data)
+        self.object_cache.set(blob_path, (obj, result.etag, time.monotonic()))
+        return obj.model_copy(deep=True), result.etag
+    
+    async def _put_cached(self, blob_path: str, obj, **conditions):
+        """
+        Write a session or metadata object and keep the object cache in step
+        
+        conditions (if_match / if_none_match) are passed to upload_json; a write
+        that fails its condition drops the cache entry.
+        """
+        try:
+            etag = await self.client.upload_json(blob_path, obj.model_dump(), **conditions)
+        except (ResourceModifiedError, ResourceExistsError):
+            self.object_cache.pop(blob_path)
+            raise
+        self.object_cache.set(blob_path, (obj.model_copy(deep=True), etag, time.monotonic()))
+    
+    def object_cache_stats(self) -> dict:
+        """Object cache lookups by result (hit, not_modified, miss) and evictions"""
+        return {**self.object_cache_lookups, "evictions": self.object_cache.evictions}
     
     # ==================== Session Operations ====================
     
-    def create_session(self, user_id: Optional[str] = None, device_info: Optional[dict] = None) -> UserSession:
+    async def create_session(self, user_id: Optional[str] = None, device_info: Optional[dict] = None) -> UserSession:
         """Create a new user session"""
         session = UserSession(
             user_id=user_id,
             device_info=device_info
         )
         
-        # Convert to dict
-        session_dict = session.model_dump()
-        
         # Upload to blob storage
         blob_path = f"sessions/{session.session_id}.json"
-        self.client.upload_json(blob_path, session_dict)
+        await self._put_cached(blob_path, session)
+        
+        # Start the message counters at zero; sessions without them have to be
+        # recounted from the log, which can race with concurrent saves
+        metadata = SessionMetadata(session_id=session.session_id, message_count=0, tokens_total=0)
+        await self._put_cached(f"metadata/{session.session_id}.json", metadata, if_none_match="*")
+        await self._index_session(session.session_id, session.updated_at)
         logger.info(f"Created session: {session.session_id}")
         
         return session
     
-    def get_session(self, session_id: str) -> Optional[UserSession]:
+    async def get_session(self, session_id: str) -> Optional[UserSession]:
         """Retrieve a session by ID"""
         blob_path = f"sessions/{session_id}.json"
-        item = self.client.download_json(blob_path)
-        if item:
-            return UserSession(**item)
-        return None
+        return await self._get_cached(blob_path, UserSession)
     
-    def update_session(self, session_id: str, **kwargs) -> Optional[UserSession]:
+    async def update_session(self, session_id: str, **kwargs) -> Optional[UserSession]:
         """Update session information"""
-        session = self.get_session(session_id)
+        session = await self.get_session(session_id)
         if not session:
             logger.warning(f"Session {session_id} not found for update")
             return None
         
         # Update fields
+        previous_update = session.updated_at
         session.updated_at = datetime.utcnow()
         for key, value in kwargs.items():
             if hasattr(session, key):
                 setattr(session, key, value)
         
         # Upload updated session to blob storage
-        session_dict = session.model_dump()
         blob_path = f"sessions/{session.session_id}.json"
-        self.client.upload_json(blob_path, session_dict)
+        await self._put_cached(blob_path, session)
+        await self._index_session(session_id, session.updated_at, previous_update)
         logger.info(f"Updated session: {session_id}")
         
         return session
     
     # ==================== Message Operations ====================
     
-    def save_message(
+    async def save_message(
         self,
         session_id: str,
         role: str,
@@ -81,153 +237,780 @@ class DatabaseService:
             model_version=model_version
         )
         
-        # Convert to dict
-        message_dict = message.model_dump()
+        await self.save_messages(session_id, [message])
+        return message
+    
+    async def save_messages(self, session_id: str, messages: List[ChatMessage], skip_logged: bool = False):
+        """
+        Append already-built messages to the session's log and count them in its metadata
         
-        # Upload to blob storage
-        blob_path = f"messages/{session_id}/{message.message_id}.json"
-        self.client.upload_json(blob_path, message_dict)
-        logger.info(f"Saved message: {message.message_id} for session: {session_id}")
+        skip_logged leaves out (and does not count) messages that are in the log
+        already, for retrying a save that may have partly succeeded.
+        """
+        appended = await self.append_messages(session_id, messages, skip_logged)
+        await self.count_messages(
+            session_id,
+            len(appended),
+            sum(message.tokens_used or 0 for message in appended)
+        )
+        for message in appended:
+            logger.info(f"Saved message: {message.message_id} for session: {session_id}")
+    
+    async def append_messages(
+        self,
+        session_id: str,
+        messages: List[ChatMessage],
+        skip_logged: bool = False
+    ) -> List[ChatMessage]:
+        """
+        Append already-built messages to the session's log, without counting them
         
-        return message
+        Args:
+            skip_logged: Leave out messages already in the log (or deleted from
+                it), so retrying an append that may have landed does not
+                duplicate them; costs a read of the log's newest segment
+        
+        Returns:
+            The messages appended
+        """
+        return await self._append_messages(session_id, messages, skip_logged)
+    
+    async def count_messages(self, session_id: str, message_count: int, tokens_total: int = 0):
+        """Add appended messages to the session's message and token counters"""
+        if message_count or tokens_total:
+            await self._update_metadata(session_id, MetadataUpdate(
+                message_delta=message_count,
+                tokens_delta=tokens_total
+            ))
     
-    def get_messages(
+    async def get_messages(
         self,
         session_id: str,
         limit: Optional[int] = None,
         offset: int = 0
     ) -> List[ChatMessage]:
-        """Retrieve messages for a session"""
-        # List all message blobs for this session
-        prefix = f"messages/{session_id}/"
-        blob_paths = self.client.list_blobs(prefix)
+        """Retrieve messages for a session, oldest first"""
+        manifest = await self._load_manifest(session_id)
         
-        # Download all messages
-        messages = []
-        for blob_path in blob_paths:
-            item = self.client.download_json(blob_path)
-            if item:
-                messages.append(ChatMessage(**item))
-        
-        # Sort by timestamp
-        messages.sort(key=lambda m: m.timestamp)
-        
-        # Apply pagination
-        if limit:
-            messages = messages[offset:offset + limit]
+        if not manifest or manifest.get("legacy"):
+            # Legacy blobs are not time-ordered, so the whole session has to be read
+            messages = await self._read_messages(session_id, manifest)
+            if limit:
+                messages = messages[offset:offset + limit]
+        else:
+            # Read segments only until the requested page is covered
+            wanted = offset + limit if limit else None
+            messages = await self._scan_forward(session_id, manifest, 0, wanted)
+            if limit:
+                messages = messages[offset:wanted]
         
         logger.info(f"Retrieved {len(messages)} messages for session: {session_id}")
         return messages
     
-    def get_message_count(self, session_id: str) -> int:
-        """Get total message count for a session"""
-        prefix = f"messages/{session_id}/"
-        blob_paths = self.client.list_blobs(prefix)
-        return len(blob_paths)
+    async def get_messages_page(
+        self,
+        session_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[ChatMessage], Optional[str]]:
+        """
+        Retrieve one page of messages relative to a cursor, oldest first
+        
+        Only the log segments that can hold the page are downloaded, so the cost
+        is constant per page rather than linear in the session's history.
+        
+        Args:
+            session_id: Session to read
+            limit: Maximum number of messages to return
+            before: Return the newest messages older than this cursor
+            after: Return the oldest messages newer than this cursor (used when
+                before is not given)
+            
+        Returns:
+            The page and the cursor to pass as the same parameter to continue in
+            the same direction, or None when there are no more messages
+        """
+        manifest = await self._load_manifest(session_id)
+        
+        if not manifest or manifest.get("legacy"):
+            messages = await self._read_messages(session_id, manifest)
+            if before:
+                messages = [m for m in messages if message_cursor(m) < before]
+            if after:
+                messages = [m for m in messages if message_cursor(m) > after]
+            candidates = messages[-(limit + 1):] if before else messages[:limit + 1]
+        elif before:
+            candidates = await self._scan_backward(session_id, manifest, before, after, limit + 1)
+        else:
+            start = self._segment_index_for(manifest, after)
+            candidates = await self._scan_forward(session_id, manifest, start, limit + 1, after)
+        
+        has_more = len(candidates) > limit
+        if before:
+            page = candidates[-limit:] if has_more else candidates
+            next_cursor = message_cursor(page[0]) if has_more else None
+        else:
+            page = candidates[:limit]
+            next_cursor = message_cursor(page[-1]) if has_more else None
+        
+        logger.info(f"Retrieved page of {len(page)} messages for session: {session_id}")
+        return page, next_cursor
+    
+    async def get_recent_messages(self, session_id: str, count: int) -> List[ChatMessage]:
+        """
+        Retrieve a session's newest messages, oldest first
+        
+        Served from the per-session tail cache; a miss reads one page from the end
+        of the log. The tail holds at most tail_size messages, so count is capped
+        at that. Messages appended by another replica show up once the tail expires.
+        """
+        tail = self.message_tails.get(session_id)
+        if tail is None:
+            page, _ = await self.get_messages_page(session_id, self.tail_size, before=LATEST_CURSOR)
+            tail = deque(page, maxlen=self.tail_size)
+            self.message_tails.set(session_id, tail)
+        
+        return list(tail)[-count:] if count > 0 else []
     
-    def delete_message(self, message_id: str, session_id: str):
+    async def get_message_count(self, session_id: str) -> int:
+        """
+        Get total message count for a session
+        
+        Served from the counter in the session's metadata; only sessions whose
+        counter is not known yet are counted by reading the log.
+        """
+        metadata = await self.get_metadata(session_id)
+        if metadata and metadata.message_count is not None:
+            return metadata.message_count
+        
+        messages = await self._read_messages(session_id)
+        return len(messages)
+    
+    async def delete_message(self, message_id: str, session_id: str):
         """Delete a specific message"""
-        blob_path = f"messages/{session_id}/{message_id}.json"
-        self.client.delete_blob(blob_path)
+        manifest = await self._load_manifest(session_id)
+        
+        if manifest:
+            # The log is append-only, so deletions are recorded in the manifest
+            def mark_deleted(latest: dict) -> bool:
+                if message_id in latest.get("deleted", []):
+                    return False
+                latest["deleted"] = latest.get("deleted", []) + [message_id]
+                return True
+            
+            manifest = await self._update_manifest(session_id, mark_deleted)
+        
+        if not manifest or manifest.get("legacy"):
+            blob_path = f"messages/{session_id}/{message_id}.json"
+            await self.client.delete_blob(blob_path)
+        
+        self.message_tails.pop(session_id)
+        
+        # The deleted message's token count is not known here, so recount
+        await self._update_metadata(session_id, MetadataUpdate(recount=True))
         logger.info(f"Deleted message: {message_id}")
     
+    # ==================== Message Log ====================
+    #
+    # A session's messages are JSON Lines records in append blobs under
+    # message-log/{session_id}/. Once a segment reaches message_segment_max_bytes
+    # the log rolls over to a new segment. manifest.json lists the segments in
+    # order together with the cursor of the last message before each one
+    # ("start_after"), so a page read only downloads the segments that can hold
+    # it. Deleted message IDs are listed in the manifest. Manifest updates are
+    # conditional on its ETag and retried on conflict, so concurrent roll-overs
+    # and deletes never undo each other.
+    #
+    # Sessions written before the log existed keep one blob per message under
+    # messages/{session_id}/. The manifest's "legacy" flag tells readers to merge
+    # those in until `python -m app.maintenance compact-messages` folds them into
+    # the log.
+    
+    @staticmethod
+    def _manifest_path(session_id: str) -> str:
+        return f"message-log/{session_id}/manifest.json"
+    
+    @staticmethod
+    def _segment_path(session_id: str, segment: dict) -> str:
+        return f"message-log/{session_id}/{segment['name']}"
+    
+    async def _load_manifest(self, session_id: str) -> Optional[dict]:
+        """Retrieve the message log manifest, or None for sessions without a log"""
+        return await self.client.download_json(self._manifest_path(session_id))
+    
+    async def _create_manifest(self, session_id: str) -> dict:
+        """Start a message log for a session, flagging any legacy per-message blobs"""
+        legacy_paths = await self.client.list_blobs(f"messages/{session_id}/")
+        manifest = {
+            "session_id": session_id,
+            "segments": [{"name": "000000.jsonl", "start_after": None}],
+            "deleted": [],
+            "legacy": bool(legacy_paths)
+        }
+        try:
+            await self.client.upload_json(self._manifest_path(session_id), manifest, if_none_match="*")
+        except (ResourceModifiedError, ResourceExistsError):
+            # Another writer started the log first
+            return await self._load_manifest(session_id)
+        return manifest
+    
+    async def _update_manifest(self, session_id: str, change: Callable[[dict], bool]) -> Optional[dict]:
+        """
+        Read-modify-write a session's manifest, conditional on its ETag
+        
+        change edits the manifest in place and returns False when there is
+        nothing to write (another writer already made the change). On a conflict
+        the manifest is re-read and change applied again.
+        
+        Returns:
+            The manifest as stored afterwards, or None for sessions without a log
+        """
+        blob_path = self._manifest_path(session_id)
+        for attempt in range(MANIFEST_UPDATE_ATTEMPTS):
+            if attempt:
+                # Jittered backoff, so contending writers stop colliding
+                await asyncio.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+            result = await self.client.download_json_versioned(blob_path)
+            manifest = result.data
+            if manifest is None or not change(manifest):
+                return manifest
+            try:
+                await self.client.upload_json(blob_path, manifest, if_match=result.etag)
+                return manifest
+            except (ResourceModifiedError, ResourceExistsError):
+                logger.info(f"Manifest of session {session_id} changed concurrently, retrying update")
+        
+        raise ResourceModifiedError(f"Manifest of session {session_id} kept changing, update abandoned")
+    
+    async def _roll_over(self, session_id: str, manifest: dict, start_after: str) -> dict:
+        """Add a new segment to the manifest after the current one filled up"""
+        segments = len(manifest["segments"])
+        
+        def add_segment(latest: dict) -> bool:
+            # A concurrent writer may have rolled over already
+            if len(latest["segments"]) > segments:
+                return False
+            latest["segments"].append({
+                "name": f"{len(latest['segments']):06d}.jsonl",
+                "start_after": start_after
+            })
+            return True
+        
+        latest = await self._update_manifest(session_id, add_segment)
+        logger.info(f"Message log for session {session_id} rolled over to {latest['segments'][-1]['name']}")
+        return latest
+    
+    async def _unlogged(self, session_id: str, manifest: dict, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """
+        The messages that are not in the log yet
+        
+        Only the segments from the one that would hold the oldest of them are
+        read, which for a retried append is the newest segment (or two, if the
+        log rolled over after it).
+        """
+        start = self._segment_index_for(manifest, min(message_cursor(m) for m in messages))
+        logged = set(manifest.get("deleted", []))
+        for index in range(start, len(manifest["segments"])):
+            text = await self.client.download_text(self._segment_path(session_id, manifest["segments"][index]))
+            logged.update(m.message_id for m in parse_message_lines(text or ""))
+        return [m for m in messages if m.message_id not in logged]
+    
+    async def _append_messages(
+        self,
+        session_id: str,
+        messages: List[ChatMessage],
+        skip_logged: bool = False
+    ) -> List[ChatMessage]:
+        """Append messages to the session's log, one block per segment-sized chunk; returns those appended"""
+        manifest = await self._load_manifest(session_id) or await self._create_manifest(session_id)
+        if skip_logged and messages:
+            messages = await self._unlogged(session_id, manifest, messages)
+        
+        chunks = []
+        chunk, chunk_bytes = "", 0
+        for message in messages:
+            line = message.model_dump_json() + "\n"
+            line_bytes = len(line.encode("utf-8"))
+            if chunk and chunk_bytes + line_bytes > self.segment_max_bytes:
+                chunks.append((chunk, last_cursor))
+                chunk, chunk_bytes = "", 0
+            chunk += line
+            chunk_bytes += line_bytes
+            last_cursor = message_cursor(message)
+        if chunk:
+            chunks.append((chunk, last_cursor))
+        
+        for chunk, last_cursor in chunks:
+            segment_path = self._segment_path(session_id, manifest["segments"][-1])
+            size = await self.client.append_text(segment_path, chunk)
+            if size >= self.segment_max_bytes:
+                manifest = await self._roll_over(session_id, manifest, last_cursor)
+        
+        tail = self.message_tails.peek(session_id)
+        if tail is not None:
+            tail.extend(messages)
+        return messages
+    
+    @staticmethod
+    def _segment_index_for(manifest: dict, cursor: Optional[str]) -> int:
+        """Index of the segment that holds the message at the cursor"""
+        index = 0
+        for i, segment in enumerate(manifest["segments"]):
+            if cursor is not None and segment["start_after"] is not None and segment["start_after"] < cursor:
+                index = i
+        return index
+    
+    @staticmethod
+    def _parse_segment(manifest: dict, text: Optional[str]) -> List[ChatMessage]:
+        """
+        Parse the live messages of one log segment, in cursor order
+        
+        A message appended twice (a retried write whose first attempt landed)
+        is returned once.
+        """
+        if not text:
+            return []
+        
+        seen = set(manifest.get("deleted", []))
+        messages = []
+        for message in parse_message_lines(text):
+            if message.message_id not in seen:
+                seen.add(message.message_id)
+                messages.append(message)
+        messages.sort(key=message_cursor)
+        return messages
+    
+    async def _read_segment(self, session_id: str, manifest: dict, index: int) -> List[ChatMessage]:
+        """Read the live messages of one log segment, in cursor order"""
+        text = await self.client.download_text(self._segment_path(session_id, manifest["segments"][index]))
+        return self._parse_segment(manifest, text)
+    
+    async def _scan_forward(
+        self,
+        session_id: str,
+        manifest: dict,
+        start: int,
+        wanted: Optional[int],
+        after: Optional[str] = None
+    ) -> List[ChatMessage]:
+        """
+        Read segments from start onwards until wanted messages newer than after
+        are collected (all of them if wanted is None)
+        """
+        collected = []
+        if wanted is None:
+            # Everything is needed, so fetch all remaining segments in parallel
+            paths = [self._segment_path(session_id, segment) for segment in manifest["segments"][start:]]
+            results = await self.client.download_many(paths, as_text=True)
+            _raise_first_error(results)
+            for result in results:
+                messages = self._parse_segment(manifest, result.data)
+                collected.extend(m for m in messages if after is None or message_cursor(m) > after)
+            return collected
+        
+        for index in range(start, len(manifest["segments"])):
+            messages = await self._read_segment(session_id, manifest, index)
+            collected.extend(m for m in messages if after is None or message_cursor(m) > after)
+            if len(collected) >= wanted:
+                break
+        return collected
+    
+    async def _scan_backward(
+        self,
+        session_id: str,
+        manifest: dict,
+        before: str,
+        after: Optional[str],
+        wanted: int
+    ) -> List[ChatMessage]:
+        """Read segments backwards until wanted messages between after and before are collected"""
+        collected = []
+        for index in range(self._segment_index_for(manifest, before), -1, -1):
+            messages = await self._read_segment(session_id, manifest, index)
+            messages = [
+                m for m in messages
+                if message_cursor(m) < before and (after is None or message_cursor(m) > after)
+            ]
+            collected = messages + collected
+            if len(collected) >= wanted:
+                break
+            if after is not None and manifest["segments"][index]["start_after"] is not None \
+                    and manifest["segments"][index]["start_after"] <= after:
+                break
+        return collected
+    
+    async def _read_legacy_messages(self, session_id: str) -> List[ChatMessage]:
+        """Read per-message blobs written before the message log existed"""
+        blob_paths = await self.client.list_blobs(f"messages/{session_id}/")
+        
+        results = await self.client.download_many(blob_paths)
+        _raise_first_error(results)
+        return CHAT_MESSAGES.validate_python([result.data for result in results if result.data])
+    
+    async def _read_messages(self, session_id: str, manifest: Optional[dict] = None) -> List[ChatMessage]:
+        """Read all live messages of a session from the log and any legacy blobs, oldest first"""
+        if manifest is None:
+            manifest = await self._load_manifest(session_id)
+        
+        messages = {}
+        if not manifest or manifest.get("legacy"):
+            for message in await self._read_legacy_messages(session_id):
+                messages[message.message_id] = message
+        
+        if manifest:
+            logged = await self._scan_forward(session_id, manifest, 0, None)
+            for message in logged:
+                messages[message.message_id] = message
+            for message_id in manifest.get("deleted", []):
+                messages.pop(message_id, None)
+        
+        return sorted(messages.values(), key=message_cursor)
+    
+    async def compact_legacy_messages(self, session_id: str) -> int:
+        """
+        Fold a session's legacy per-message blobs into its message log
+        
+        Safe to re-run after an interruption: messages already present in the log
+        are not appended twice, and the legacy blobs are deleted only after the
+        manifest stops pointing readers at them.
+        
+        Returns:
+            Number of legacy blobs compacted
+        """
+        legacy_paths = await self.client.list_blobs(f"messages/{session_id}/")
+        if not legacy_paths:
+            return 0
+        
+        manifest = await self._load_manifest(session_id)
+        logged_ids = set()
+        if manifest:
+            logged = await self._scan_forward(session_id, manifest, 0, None)
+            logged_ids = {m.message_id for m in logged} | set(manifest.get("deleted", []))
+        
+        legacy_messages = await self._read_legacy_messages(session_id)
+        legacy_messages.sort(key=message_cursor)
+        await self._append_messages(
+            session_id,
+            [m for m in legacy_messages if m.message_id not in logged_ids]
+        )
+        
+        def clear_legacy(latest: dict) -> bool:
+            if not latest.get("legacy"):
+                return False
+            latest["legacy"] = False
+            return True
+        
+        await self._update_manifest(session_id, clear_legacy)
+        
+        _raise_first_error(await self.client.delete_many(legacy_paths))
+        
+        logger.info(f"Compacted {len(legacy_paths)} legacy messages for session: {session_id}")
+        return len(legacy_paths)
+    
     # ==================== Metadata Operations ====================
     
-    def update_metadata(
+    async def update_metadata(
         self,
         session_id: str,
         extension_version: Optional[str] = None,
         cluster_used: Optional[str] = None
     ) -> SessionMetadata:
-        """Update or create session metadata"""
-        metadata = SessionMetadata(
-            session_id=session_id,
-            extension_version=extension_version,
-            cluster_used=cluster_used
-        )
+        """
+        Update or create session metadata (deferred when write-behind is enabled)
         
-        # Convert to dict
-        metadata_dict = metadata.model_dump()
+        Only the fields given are changed; the message counters are kept.
+        """
+        fields = {"last_active": datetime.utcnow()}
+        if extension_version is not None:
+            fields["extension_version"] = extension_version
+        if cluster_used is not None:
+            fields["cluster_used"] = cluster_used
         
-        # Upload to blob storage
-        blob_path = f"metadata/{session_id}.json"
-        self.client.upload_json(blob_path, metadata_dict)
+        await self._update_metadata(session_id, MetadataUpdate(fields))
         logger.info(f"Updated metadata for session: {session_id}")
         
-        return metadata
+        return await self.get_metadata(session_id)
     
-    def get_metadata(self, session_id: str) -> Optional[SessionMetadata]:
-        """Retrieve session metadata"""
+    async def get_metadata(self, session_id: str) -> Optional[SessionMetadata]:
+        """Retrieve session metadata, including updates not yet flushed"""
         blob_path = f"metadata/{session_id}.json"
-        item = self.client.download_json(blob_path)
-        if item:
-            return SessionMetadata(**item)
-        return None
+        metadata = await self._get_cached(blob_path, SessionMetadata)
+        
+        if self.metadata_writes is not None:
+            pending = self.metadata_writes.get(session_id)
+            if pending is not None:
+                metadata = pending.apply(metadata or SessionMetadata(session_id=session_id))
+        
+        return metadata
+    
+    async def update_last_active(self, session_id: str):
+        """Update the last_active timestamp for a session (deferred when write-behind is enabled)"""
+        await self._update_metadata(session_id, MetadataUpdate({"last_active": datetime.utcnow()}))
+        logger.info(f"Updated last_active for session: {session_id}")
     
-    def update_last_active(self, session_id: str):
-        """Update the last_active timestamp for a session"""
-        metadata = self.get_metadata(session_id)
+    async def _update_metadata(self, session_id: str, update: MetadataUpdate):
+        """
+        Apply a metadata update now, or hand it to the write-behind buffer
         
-        if metadata:
-            metadata.last_active = datetime.utcnow()
-            metadata_dict = metadata.model_dump()
-            blob_path = f"metadata/{session_id}.json"
-            self.client.upload_json(blob_path, metadata_dict)
+        Counter changes are always written now: a known counter is never
+        recounted, so a delta lost with the buffer (crash, failed flush) would
+        leave it wrong for good. Only field updates (last_active, versions) are
+        deferred.
+        """
+        if self.metadata_writes is not None and not update.changes_counters:
+            await self.metadata_writes.put(session_id, update)
         else:
-            # Create new metadata if it doesn't exist
-            self.update_metadata(session_id)
+            await self._write_metadata(session_id, update)
+    
+    async def _write_metadata(self, session_id: str, update: MetadataUpdate) -> SessionMetadata:
+        """
+        Read-modify-write a session's metadata with optimistic concurrency
         
-        logger.info(f"Updated last_active for session: {session_id}")
+        The write is conditional on the ETag that was read (If-Match, or
+        If-None-Match: * when creating), so concurrent updates from other
+        replicas are never lost: on a conflict the metadata is re-read and the
+        update re-applied after a short jittered backoff. Writes from this process
+        take turns per session, so conflicts only come from other replicas.
+        Counters that are unknown (sessions from before they existed, or after a
+        delete) are recounted from the message log.
+        """
+        lock = self._metadata_locks.get(session_id)
+        if lock is None:
+            lock = self._metadata_locks[session_id] = asyncio.Lock()
+        async with lock:
+            return await self._write_metadata_locked(session_id, update)
+    
+    async def _write_metadata_locked(self, session_id: str, update: MetadataUpdate) -> SessionMetadata:
+        blob_path = f"metadata/{session_id}.json"
+        for attempt in range(METADATA_UPDATE_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+            # The cached ETag is tried first; a stale one just costs a retry
+            current, etag = await self._get_versioned(blob_path, SessionMetadata, revalidate=attempt > 0)
+            metadata = update.apply(current or SessionMetadata(session_id=session_id))
+            if metadata.message_count is None:
+                messages = await self._read_messages(session_id)
+                metadata.message_count = len(messages)
+                metadata.tokens_total = sum(m.tokens_used or 0 for m in messages)
+            
+            conditions = {"if_match": etag} if current else {"if_none_match": "*"}
+            try:
+                await self._put_cached(blob_path, metadata, **conditions)
+            except (ResourceModifiedError, ResourceExistsError):
+                logger.info(f"Metadata for session {session_id} changed concurrently, retrying update")
+                continue
+            
+            if current is None or metadata.last_active != current.last_active:
+                await self._index_session(session_id, metadata.last_active, current.last_active if current else None)
+            return metadata
+        
+        raise ResourceModifiedError(f"Metadata for session {session_id} kept changing, update abandoned")
+    
+    async def flush_metadata(self):
+        """Write deferred metadata updates now"""
+        if self.metadata_writes is not None:
+            await self.metadata_writes.flush()
     
     # ==================== Utility Operations ====================
     
-    def get_recent_sessions(self, limit: int = 10) -> List[UserSession]:
-        """Get most recent sessions"""
-        # List all session blobs
-        blob_paths = self.client.list_blobs("sessions/")
+    async def get_recent_sessions(self, limit: int = 10) -> List[UserSession]:
+        """
+        Get the most recently active sessions, newest first
         
-        # Download all sessions
+        Reads the recency index, so the cost is proportional to limit rather than
+        to the number of sessions ever created. Falls back to scanning every
+        session while the index is empty (before rebuild_session_index has run).
+        """
         sessions = []
-        for blob_path in blob_paths:
-            item = self.client.download_json(blob_path)
-            if item:
-                sessions.append(UserSession(**item))
+        seen = set()
+        batch = []
+        indexed = False
+        async for name in self.client.iter_blob_names(SESSION_INDEX_PREFIX, page_size=limit * 4):
+            indexed = True
+            session_id = self._index_session_id(name)
+            if session_id in seen:
+                continue
+            seen.add(session_id)
+            batch.append(session_id)
+            if len(sessions) + len(batch) >= limit:
+                sessions.extend(await self._download_sessions(batch))
+                batch = []
+                if len(sessions) >= limit:
+                    break
+        if batch:
+            sessions.extend(await self._download_sessions(batch))
         
-        # Sort by updated_at descending
-        sessions.sort(key=lambda s: s.updated_at, reverse=True)
+        if not indexed:
+            logger.warning("Session index is empty, scanning all sessions (run rebuild-session-index)")
+            sessions = await self._scan_recent_sessions(limit)
         
-        # Return top N
         sessions = sessions[:limit]
-        
         logger.info(f"Retrieved {len(sessions)} recent sessions")
         return sessions
     
-    def delete_session_data(self, session_id: str):
+    async def _download_sessions(self, session_ids: List[str]) -> List[UserSession]:
+        """Download sessions in order, skipping any that no longer exist"""
+        results = await self.client.download_many([f"sessions/{sid}.json" for sid in session_ids])
+        _raise_first_error(results)
+        return USER_SESSIONS.validate_python([result.data for result in results if result.data])
+    
+    async def _scan_recent_sessions(self, limit: int) -> List[UserSession]:
+        """Download every session and sort by updated_at (used when there is no index)"""
+        blob_paths = await self.client.list_blobs("sessions/")
+        results = await self.client.download_many(blob_paths)
+        _raise_first_error(results)
+        sessions = USER_SESSIONS.validate_python([result.data for result in results if result.data])
+        sessions.sort(key=lambda s: s.updated_at, reverse=True)
+        return sessions[:limit]
+    
+    # ==================== Session Recency Index ====================
+    #
+    # Every session update or activity writes an empty marker blob named
+    # session-index/{inverted timestamp}-{session_id}.json. Blob listings are in
+    # name order, so the newest entries come first and get_recent_sessions can
+    # stop listing once it has enough distinct sessions. The entry a write
+    # replaces is deleted when it is known (best effort); readers skip
+    # duplicates, and `python -m app.maintenance rebuild-session-index` rewrites
+    # the index from the session and metadata blobs.
+    
+    @staticmethod
+    def _index_entry(session_id: str, at: datetime) -> str:
+        """Index blob path for a session active at a (naive UTC) timestamp"""
+        millis = int(at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return f"{SESSION_INDEX_PREFIX}{SESSION_INDEX_MAX - millis:013d}-{session_id}.json"
+    
+    @staticmethod
+    def _index_session_id(blob_path: str) -> str:
+        return blob_path[len(SESSION_INDEX_PREFIX) + 14:-len(".json")]
+    
+    async def _index_session(self, session_id: str, at: datetime, previous: Optional[datetime] = None):
+        """Record session activity in the recency index; index failures never fail the write"""
+        try:
+            entry = self._index_entry(session_id, at)
+            await self.client.upload_json(entry, {})
+            if previous is not None and previous != at:
+                old_entry = self._index_entry(session_id, previous)
+                if old_entry != entry:
+                    await self.client.delete_blob(old_entry)
+        except Exception as e:
+            logger.error(f"Error updating session index for {session_id}: {e}")
+    
+    async def rebuild_session_index(self) -> int:
+        """
+        Rewrite the recency index from the session and metadata blobs
+        
+        New entries are written before stale ones are deleted, so readers never
+        see an empty index.
+        
+        Returns:
+            Number of sessions indexed
+        """
+        session_paths = await self.client.list_blobs("sessions/")
+        session_ids = [path[len("sessions/"):-len(".json")] for path in session_paths]
+        sessions = await self.client.download_many(session_paths)
+        metadata = await self.client.download_many([f"metadata/{sid}.json" for sid in session_ids])
+        
+        entries = set()
+        for session_id, session, meta in zip(session_ids, sessions, metadata):
+            if not session.ok or not session.data:
+                continue
+            at = UserSession(**session.data).updated_at
+            if meta.ok and meta.data:
+                at = max(at, SessionMetadata(**meta.data).last_active)
+            entries.add(self._index_entry(session_id, at))
+        
+        existing = set(await self.client.list_blobs(SESSION_INDEX_PREFIX))
+        semaphore = asyncio.Semaphore(get_config().blob_max_concurrency)
+        
+        async def write(entry: str):
+            async with semaphore:
+                await self.client.upload_json(entry, {})
+        
+        await asyncio.gather(*(write(entry) for entry in entries - existing))
+        _raise_first_error(await self.client.delete_many(sorted(existing - entries)))
+        
+        logger.info(f"Rebuilt session index: {len(entries)} sessions, {len(existing - entries)} stale entries removed")
+        return len(entries)
+    
+    async def delete_session_data(self, session_id: str):
         """Delete all data associated with a session"""
-        # Delete session
-        session_blob = f"sessions/{session_id}.json"
-        self.client.delete_blob(session_blob)
+        metadata = await self.get_metadata(session_id)
+        if self.metadata_writes is not None:
+            self.metadata_writes.discard(session_id)
         
-        # Delete all messages
-        message_prefix = f"messages/{session_id}/"
-        message_blobs = self.client.list_blobs(message_prefix)
-        for blob_path in message_blobs:
-            self.client.delete_blob(blob_path)
+        # Session and metadata blobs, and their recency index entries
+        blob_paths = [f"sessions/{session_id}.json", f"metadata/{session_id}.json"]
+        session = await self.get_session(session_id)
+        if session:
+            blob_paths.append(self._index_entry(session_id, session.updated_at))
+        if metadata:
+            blob_paths.append(self._index_entry(session_id, metadata.last_active))
         
-        # Delete metadata
-        metadata_blob = f"metadata/{session_id}.json"
-        self.client.delete_blob(metadata_blob)
+        # All messages, both the message log and any legacy per-message blobs
+        for message_prefix in (f"message-log/{session_id}/", f"messages/{session_id}/"):
+            blob_paths.extend(await self.client.list_blobs(message_prefix))
         
+        _raise_first_error(await self.client.delete_many(blob_paths))
+        self.message_tails.pop(session_id)
+        self.object_cache.pop(f"sessions/{session_id}.json")
+        self.object_cache.pop(f"metadata/{session_id}.json")
         logger.info(f"Deleted all data for session: {session_id}")
 
 
-# Singleton instance
+class DatabaseService:
+    """
+    Blocking facade over AsyncDatabaseService for scripts and the REPL.
+
+    Every coroutine method of the async service is exposed as a plain method that
+    runs to completion on a private event loop, so callers keep the original
+    synchronous API. Do not use this from inside a running event loop.
+    """
+    
+    def __init__(self, client: Optional[StorageBackend] = None):
+        self._runner = asyncio.Runner()
+        self._service = self._runner.run(self._create_service(client))
+    
+    @staticmethod
+    async def _create_service(client: Optional[StorageBackend]) -> AsyncDatabaseService:
+        if client is None:
+            client = create_storage_backend()
+            await client.initialize()
+        return AsyncDatabaseService(client)
+    
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        
+        @functools.wraps(attr)
+        def run_sync(*args, **kwargs):
+            return self._runner.run(attr(*args, **kwargs))
+        
+        return run_sync
+    
+    def close(self):
+        """Close the storage client and the private event loop"""
+        self._runner.run(self._service.close())
+        self._runner.close()
+
+
+# Singleton instances
 _db_service: Optional[DatabaseService] = None
+_async_db_service: Optional[AsyncDatabaseService] = None
 
 
 def get_database_service() -> DatabaseService:
-    """Get or create the database service singleton"""
+    """Get or create the synchronous database service singleton (for scripts)"""
     global _db_service
     if _db_service is None:
         _db_service = DatabaseService()
     return _db_service
+
+
+async def get_async_database_service() -> AsyncDatabaseService:
+    """Get or create the async database service singleton used by the API"""
+    global _async_db_service
+    if _async_db_service is None:
+        _async_db_service = AsyncDatabaseService(await get_storage_backend())
+    return _async_db_service
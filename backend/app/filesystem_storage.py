@@ -0,0 +1,168 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+from .storage import DEFAULT_BULK_CONCURRENCY, StorageBackend, VersionedJson
+
+logger = logging.getLogger(__name__)
+
+# Conditional writes to the same path are serialized by one of these locks
+LOCK_STRIPES = 64
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+class FilesystemStorage(StorageBackend):
+    """
+    Storage backend that keeps each object as a file under a root directory
+
+    Meant for local development without Azure: object paths map to relative file
+    paths, writes go through a temporary file and an atomic rename, and ETags are
+    content hashes so conditional writes behave as they do against Blob Storage
+    (conditions are only enforced between writers in this process).
+    """
+
+    def __init__(self, root: str, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            root: Directory holding the objects (created on initialize)
+            max_concurrency: Default concurrency limit for bulk operations
+        """
+        self.root = os.path.abspath(root)
+        self.max_concurrency = max_concurrency or DEFAULT_BULK_CONCURRENCY
+        self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _file(self, blob_path: str) -> str:
+        parts = blob_path.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid object path: {blob_path}")
+        return os.path.join(self.root, *parts)
+
+    def _lock(self, blob_path: str) -> asyncio.Lock:
+        return self._locks[hash(blob_path) % LOCK_STRIPES]
+
+    @staticmethod
+    def _read(file: str) -> Optional[bytes]:
+        try:
+            with open(file, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(file: str, data: bytes):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        temp = os.path.join(os.path.dirname(file), f".{os.path.basename(file)}.{uuid.uuid4().hex}.tmp")
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, file)
+
+    @staticmethod
+    def _append(file: str, data: bytes) -> int:
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "ab") as f:
+            f.write(data)
+            return f.tell()
+
+    async def initialize(self):
+        """Create the root directory if it doesn't exist"""
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+        logger.info(f"Filesystem storage at '{self.root}'")
+
+    async def upload_json(
+        self,
+        blob_path: str,
+        data: Dict[str, Any],
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Write data as JSON to the object's file
+
+        Raises:
+            ResourceModifiedError, ResourceExistsError: The condition was not met
+        """
+        file = self._file(blob_path)
+        body = json.dumps(data, default=str).encode("utf-8")
+        async with self._lock(blob_path):
+            if if_match or if_none_match:
+                current = await asyncio.to_thread(self._read, file)
+                if if_none_match == "*" and current is not None:
+                    logger.info(f"Conditional upload of {blob_path} did not match, not uploaded")
+                    raise ResourceExistsError(f"The specified blob already exists: {blob_path}")
+                if if_match and (current is None or _etag(current) != if_match):
+                    logger.info(f"Conditional upload of {blob_path} did not match, not uploaded")
+                    raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {blob_path}")
+            await asyncio.to_thread(self._write, file, body)
+        return _etag(body)
+
+    async def download_json(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        """The parsed JSON object, or None if it doesn't exist"""
+        data = await asyncio.to_thread(self._read, self._file(blob_path))
+        return json.loads(data) if data is not None else None
+
+    async def download_json_versioned(self, blob_path: str, if_none_match: Optional[str] = None) -> VersionedJson:
+        """The parsed JSON object and its ETag, or modified=False if it still has ETag if_none_match"""
+        data = await asyncio.to_thread(self._read, self._file(blob_path))
+        if data is None:
+            return VersionedJson(None)
+        etag = _etag(data)
+        if if_none_match and etag == if_none_match:
+            return VersionedJson(None, etag, modified=False)
+        return VersionedJson(json.loads(data), etag)
+
+    async def append_text(self, blob_path: str, text: str) -> int:
+        """Append text to the object's file; returns its size in bytes afterwards"""
+        file = self._file(blob_path)
+        async with self._lock(blob_path):
+            return await asyncio.to_thread(self._append, file, text.encode("utf-8"))
+
+    async def download_text(self, blob_path: str) -> Optional[str]:
+        """The object decoded as UTF-8, or None if it doesn't exist"""
+        data = await asyncio.to_thread(self._read, self._file(blob_path))
+        return data.decode("utf-8") if data is not None else None
+
+    async def delete_blob(self, blob_path: str, if_match: Optional[str] = None) -> None:
+        """
+        Delete the object's file; a missing object is a no-op
+
+        Raises:
+            ResourceModifiedError: The object no longer has ETag if_match
+        """
+        file = self._file(blob_path)
+        async with self._lock(blob_path):
+            if if_match:
+                current = await asyncio.to_thread(self._read, file)
+                if current is not None and _etag(current) != if_match:
+                    raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {blob_path}")
+            try:
+                await asyncio.to_thread(os.remove, file)
+            except FileNotFoundError:
+                logger.warning(f"Blob not found for deletion: {blob_path}")
+
+    def _list(self, prefix: str) -> List[str]:
+        directory = os.path.join(self.root, *prefix.split("/")[:-1])
+        names = []
+        for current, _, files in os.walk(directory):
+            relative = os.path.relpath(current, self.root).replace(os.sep, "/")
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = name if relative == "." else f"{relative}/{name}"
+                if path.startswith(prefix):
+                    names.append(path)
+        # Full-path order, as Blob Storage lists ('a/b' sorts after 'a-b')
+        return sorted(names)
+
+    async def iter_blob_names(self, prefix: str = "", page_size: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield paths starting with prefix in path order"""
+        for path in await asyncio.to_thread(self._list, prefix):
+            yield path
@@ -0,0 +1,623 @@
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+from .config import get_config
+from .metrics import counter, gauge, histogram
+from .models import GenerationJob
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+JOB_PREFIX = "jobs/"
+# Empty index entries the recovery scan lists instead of reading every job:
+# job-index/{job_id}/{due time in epoch millis}-{status}.json
+JOB_INDEX_PREFIX = "job-index/"
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+QUEUED = gauge("jobs_queued", "Jobs waiting for a worker on this replica")
+RUNNING = gauge("jobs_running", "Jobs generating on this replica")
+FINISHED = counter("jobs_finished_total", "Jobs finished on this replica by status (succeeded, failed, cancelled)", ["status"])
+RETRIED = counter("jobs_retried_total", "Job runs put back in the queue, by reason (busy, error, shutdown, recovered)", ["reason"])
+JOB_SECONDS = histogram(
+    "job_duration_seconds",
+    "Time from submission to completion of succeeded jobs",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
+
+# A job's runner: called with the job and a progress callback taking each new piece
+# of output; returns the job's result
+JobRunner = Callable[[GenerationJob, Callable[[str], None]], Awaitable[Dict[str, Any]]]
+# Called with a job once its success (and result) is stored
+JobHook = Callable[[GenerationJob], Awaitable[None]]
+
+
+class RetryLater(Exception):
+    """Raised by a runner when the job cannot run right now (e.g. Ollama is overloaded); it is requeued"""
+
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class JobFailed(Exception):
+    """Raised by a runner for a failure that retrying won't fix; status_code is the HTTP status it maps to"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobQueueFull(Exception):
+    """The replica already has max_queued jobs waiting"""
+
+
+class _Lost(Exception):
+    """The job was cancelled, or taken over by another replica, while it ran here"""
+
+
+class _RunningJob:
+    """A job generating on this replica: its state, the ETag of its stored copy and its task"""
+
+    def __init__(self, job: GenerationJob, etag: str):
+        self.job = job
+        self.etag = etag
+        self.task: Optional[asyncio.Task] = None
+        self.cancelled = False
+        # The job's index entry written by this replica, and when it falls due
+        self.index: Optional[str] = None
+        self.index_due = 0.0
+
+
+def _job_path(job_id: str) -> str:
+    return f"{JOB_PREFIX}{job_id}.json"
+
+
+def _index_path(job_id: str, status: str, due: float) -> str:
+    return f"{JOB_INDEX_PREFIX}{job_id}/{int(due * 1000):013d}-{status}.json"
+
+
+def _parse_index_path(path: str) -> Tuple[str, str, float]:
+    """The job id, status and due time (epoch seconds) of an index entry"""
+    job_id, name = path[len(JOB_INDEX_PREFIX):].split("/", 1)
+    millis, status = name[:-len(".json")].split("-", 1)
+    return job_id, status, int(millis) / 1000
+
+
+class JobManager:
+    """
+    Runs long generations as jobs, off the request path
+
+    A job's state (status, output so far, result or error) is a JSON object at
+    jobs/{job_id}.json in the storage backend, so any replica can answer for it
+    and none of it is lost when a pod restarts. Submitted jobs wait in a local
+    queue for one of `workers` worker tasks, so the number of jobs generating at
+    once is set apart from how many requests the replica serves.
+
+    Every write of a job is conditional on the ETag it last saw, so exactly one
+    replica claims each run. While a job runs, its output is checkpointed every
+    checkpoint_interval seconds, which also renews its lease; a job whose lease
+    has not been renewed for lease_seconds (its replica died) is picked up again
+    by the recovery scan, which runs at startup and every recovery_interval
+    seconds. A resumed job is generated again from the start.
+
+    So the scan need not read every job, each one also has an empty index entry
+    named for its status and the time it falls due: for an unfinished job, when
+    its lease (or, if queued, its submitter's head start) runs out, renewed
+    every half lease while it runs; for a finished one, when retention ends.
+    The scan lists the entries and reads only the unfinished jobs that are due.
+    A new entry is written before the old one is deleted, so a failure leaves
+    extra entries (a job read once too often), never a job without one.
+    """
+
+    def __init__(
+        self,
+        client: StorageBackend,
+        run: JobRunner,
+        workers: int = 2,
+        max_queued: int = 1000,
+        checkpoint_interval: float = 2.0,
+        lease_seconds: float = 30.0,
+        max_attempts: int = 3,
+        recovery_interval: float = 30.0,
+        retention_seconds: float = 86400.0,
+        owner: Optional[str] = None,
+        on_success: Optional[JobHook] = None
+    ):
+        """
+        Args:
+            client: Storage backend holding the job objects
+            run: Coroutine generating a job's result
+            workers: Jobs run at once on this replica
+            max_queued: Jobs waiting for a worker before submissions are refused
+            checkpoint_interval: Seconds between writes of a running job's output
+            lease_seconds: Seconds without a checkpoint after which a running job is taken over
+            max_attempts: Runs of a job that may fail before it is marked failed
+            recovery_interval: Seconds between scans for orphaned and expired jobs
+            retention_seconds: Seconds finished jobs are kept
+            owner: Name of this replica in job objects (default: host name and process id)
+            on_success: Coroutine run once a job's success is stored, e.g. to save
+                its answer; never run for a job cancelled or taken over first
+        """
+        self.client = client
+        self.run = run
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.checkpoint_interval = checkpoint_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.recovery_interval = recovery_interval
+        self.retention_seconds = retention_seconds
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.on_success = on_success
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._queued: Set[str] = set()
+        self._running: Dict[str, _RunningJob] = {}
+        # job id -> event set on the job's next change, for long-polling readers
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._timers: Set[asyncio.TimerHandle] = set()
+        # job id -> task storing its success, which close() lets finish
+        self._completing: Dict[str, asyncio.Task] = {}
+
+    # ---------- Storage ----------
+
+    async def _load(self, job_id: str) -> Tuple[Optional[GenerationJob], Optional[str]]:
+        """A job and its ETag as stored, or (None, None)"""
+        result = await self.client.download_json_versioned(_job_path(job_id))
+        if result.data is None:
+            return None, None
+        return GenerationJob(**result.data), result.etag
+
+    async def _store(self, job: GenerationJob, etag: Optional[str] = None) -> str:
+        """Write a job if it is unchanged since etag was read (or, without etag, if it is new); returns the new ETag"""
+        job.updated_at = datetime.utcnow()
+        conditions = {"if_match": etag} if etag else {"if_none_match": "*"}
+        return await self.client.upload_json(_job_path(job.job_id), job.model_dump(mode="json"), **conditions)
+
+    # ---------- Public API ----------
+
+    async def submit(self, session_id: str, request: Dict[str, Any], payload: Dict[str, Any]) -> GenerationJob:
+        """
+        Store a new job and queue it on this replica
+
+        Raises:
+            JobQueueFull: max_queued jobs are already waiting here
+        """
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already queued")
+
+        job = GenerationJob(session_id=session_id, request=request, payload=payload)
+        # Indexed first: a job stored without an entry would never be recovered
+        await self._index(job.job_id, "queued", time.time() + self.lease_seconds, known=[])
+        await self._store(job)
+        self._enqueue(job.job_id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[GenerationJob]:
+        """A job's current state (this replica's live copy while it runs here), or None"""
+        running = self._running.get(job_id)
+        if running is not None:
+            return running.job.model_copy()
+        job, _ = await self._load(job_id)
+        return job
+
+    async def wait(self, job_id: str, since: int = 0, timeout: float = 0.0, poll_interval: float = 1.0) -> Optional[GenerationJob]:
+        """
+        A job's state once it has more than `since` characters of output or has
+        finished, or after timeout seconds, whichever comes first (a long-poll)
+
+        Jobs running here wake the caller at once; others are re-read from
+        storage every poll_interval seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in FINISHED_STATUSES or len(job.partial_response) > since or remaining <= 0:
+                return job
+            changed = self._changed.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, poll_interval))
+            except asyncio.TimeoutError:
+                # Dropped so jobs running elsewhere (never notified here) don't pile up events
+                if self._changed.get(job_id) is changed:
+                    del self._changed[job_id]
+
+    async def cancel(self, job_id: str) -> Optional[GenerationJob]:
+        """Cancel a job unless it has finished; returns its state afterwards, or None if it doesn't exist"""
+        while True:
+            job, etag = await self._load(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return job
+
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            try:
+                await self._store(job, etag)
+            except (ResourceModifiedError, ResourceExistsError):
+                continue  # a checkpoint landed in between; read it and try again
+
+            FINISHED.inc(status="cancelled")
+            await self._reindex(job_id, "cancelled", time.time() + self.retention_seconds)
+            running = self._running.get(job_id)
+            if running is not None:
+                running.cancelled = True
+                running.job.status = job.status
+                running.job.finished_at = job.finished_at
+                running.task.cancel()
+            self._notify(job_id)
+            return job
+
+    # ---------- Workers ----------
+
+    def _busy(self, job_id: str) -> bool:
+        """True if the job is queued, running or storing its success on this replica"""
+        return job_id in self._queued or job_id in self._running or job_id in self._completing
+
+    def _enqueue(self, job_id: str):
+        if self._busy(job_id):
+            return
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+        QUEUED.set(self._queue.qsize())
+
+    def _enqueue_later(self, job_id: str, delay: float):
+        def fire():
+            self._timers.discard(handle)
+            self._enqueue(job_id)
+
+        handle = asyncio.get_running_loop().call_later(delay, fire)
+        self._timers.add(handle)
+
+    def _notify(self, job_id: str):
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            QUEUED.set(self._queue.qsize())
+            try:
+                await self._execute(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} could not be run: {e}")
+                RETRIED.inc(reason="error")
+                self._enqueue_later(job_id, self.checkpoint_interval)
+
+    async def _claim(self, job_id: str) -> Optional[_RunningJob]:
+        """Mark a job as running here, unless it finished or another replica holds a live lease on it"""
+        job, etag = await self._load(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return None
+        if job.status == "running" and not self._orphaned(job):
+            return None
+
+        now = datetime.utcnow()
+        job.status = "running"
+        job.owner = self.owner
+        job.heartbeat_at = now
+        job.started_at = now
+        job.attempts += 1
+        job.partial_response = ""
+        try:
+            etag = await self._store(job, etag)
+        except (ResourceModifiedError, ResourceExistsError):
+            return None  # claimed or cancelled by someone else meanwhile
+        running = _RunningJob(job, etag)
+        await self._renew(running)
+        return running
+
+    def _orphaned(self, job: GenerationJob) -> bool:
+        """True if a running job's lease has expired, or it was running here before a restart"""
+        if job.owner == self.owner and not self._busy(job.job_id):
+            return True
+        heartbeat = job.heartbeat_at or job.updated_at
+        return datetime.utcnow() - heartbeat > timedelta(seconds=self.lease_seconds)
+
+    async def _execute(self, job_id: str):
+        """Run a job here to completion, checkpointing it while the runner generates"""
+        running = await self._claim(job_id)
+        if running is None:
+            return
+        job = running.job
+        self._running[job_id] = running
+        RUNNING.set(len(self._running))
+
+        def progress(delta: str):
+            if delta:
+                job.partial_response += delta
+                self._notify(job_id)
+
+        running.task = asyncio.create_task(self.run(job.model_copy(), progress))
+        try:
+            while True:
+                done, _ = await asyncio.wait([running.task], timeout=self.checkpoint_interval)
+                if done:
+                    break
+                await self._checkpoint(running)
+
+            if running.cancelled:
+                return
+            result = running.task.result()
+        except _Lost:
+            logger.info(f"Job {job_id} was cancelled or taken over, stopping it here")
+            running.task.cancel()
+            await asyncio.gather(running.task, return_exceptions=True)
+            return
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so this or another replica runs it again
+            running.task.cancel()
+            await asyncio.gather(running.task, return_exceptions=True)
+            job.attempts -= 1  # not the job's fault
+            await self._release(running, "shutdown")
+            raise
+        except RetryLater as e:
+            job.attempts -= 1
+            await self._release(running, "busy", delay=e.retry_after)
+            return
+        except JobFailed as e:
+            await self._finish(running, "failed", error=str(e), error_status=e.status_code)
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} failed (attempt {job.attempts}/{self.max_attempts}): {e}")
+            if job.attempts >= self.max_attempts:
+                await self._finish(running, "failed", error=str(e) or type(e).__name__, error_status=500)
+            else:
+                await self._release(running, "error", delay=self.checkpoint_interval * 2 ** (job.attempts - 1))
+            return
+        finally:
+            self._running.pop(job_id, None)
+            RUNNING.set(len(self._running))
+            self._notify(job_id)
+
+        # Shielded, so shutting down cannot store the success without running the hook
+        completion = asyncio.ensure_future(self._succeed(running, result))
+        self._completing[job_id] = completion
+        completion.add_done_callback(lambda _: self._completing.pop(job_id, None))
+        await asyncio.shield(completion)
+
+    async def _succeed(self, running: _RunningJob, result: Dict[str, Any]):
+        """Store a job's result, then run the success hook"""
+        job = running.job
+        if not await self._finish(running, "succeeded", result=result):
+            return
+        JOB_SECONDS.observe((datetime.utcnow() - job.created_at).total_seconds())
+        if self.on_success is not None:
+            try:
+                await self.on_success(job.model_copy())
+            except Exception as e:
+                logger.error(f"Success hook of job {job.job_id} failed: {e}")
+
+    async def _write(self, running: _RunningJob):
+        """
+        Store a running job's state, renewing its lease
+
+        Raises:
+            _Lost: the job was cancelled or another replica has taken it over
+        """
+        job = running.job
+        job.heartbeat_at = datetime.utcnow()
+        while True:
+            try:
+                running.etag = await self._store(job, running.etag)
+                return
+            except (ResourceModifiedError, ResourceExistsError):
+                stored, etag = await self._load(job.job_id)
+                if stored is None or stored.status != "running" or stored.owner != self.owner or stored.attempts != job.attempts:
+                    raise _Lost()
+                running.etag = etag
+
+    async def _checkpoint(self, running: _RunningJob):
+        try:
+            await self._write(running)
+        except _Lost:
+            raise
+        except Exception as e:
+            # Storage hiccup: the output is still here, and the lease allows for a few misses
+            logger.warning(f"Checkpoint of job {running.job.job_id} failed: {e}")
+            return
+        if running.index_due - time.time() < self.lease_seconds / 2:
+            await self._renew(running)
+
+    async def _renew(self, running: _RunningJob):
+        """Move a running job's index entry a lease ahead"""
+        due = time.time() + self.lease_seconds
+        known = [running.index] if running.index else None
+        index = await self._reindex(running.job.job_id, "running", due, known)
+        if index is not None:
+            running.index, running.index_due = index, due
+
+    async def _finish(self, running: _RunningJob, status: str, **fields: Any) -> bool:
+        """
+        Store a job's outcome; False if the job was cancelled or taken over first
+
+        A failed write is retried (the outcome is kept in hand) until it lands
+        or the job turns out to be lost: the worker must not put the job back
+        in the queue, which would run a generation whose answer is already saved.
+        """
+        job = running.job
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.owner = None
+        for name, value in fields.items():
+            setattr(job, name, value)
+        delay = self.checkpoint_interval
+        while True:
+            try:
+                await self._write(running)
+                break
+            except _Lost:
+                return False
+            except Exception as e:
+                logger.warning(f"Could not store the outcome of job {job.job_id}, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.lease_seconds)
+        FINISHED.inc(status=status)
+        await self._reindex(job.job_id, status, time.time() + self.retention_seconds)
+        return True
+
+    async def _release(self, running: _RunningJob, reason: str, delay: float = 0.0):
+        """Put a job back in the queue, in storage and (after delay seconds) on this replica"""
+        job = running.job
+        job.status = "queued"
+        job.owner = None
+        job.partial_response = ""
+        try:
+            await self._write(running)
+        except _Lost:
+            return
+        except Exception as e:
+            # Still 'running' in storage: the recovery scan requeues it once the lease expires
+            logger.error(f"Could not release job {job.job_id}: {e}")
+            return
+        RETRIED.inc(reason=reason)
+        # Jobs handed back at shutdown are due at once; others wait for this replica's retry first
+        due = time.time() + (0.0 if reason == "shutdown" else delay + self.lease_seconds)
+        await self._reindex(job.job_id, "queued", due)
+        if reason != "shutdown":
+            self._enqueue_later(job.job_id, delay)
+
+    # ---------- Index ----------
+
+    async def _index(self, job_id: str, status: str, due: float, known: Optional[List[str]] = None) -> str:
+        """
+        Write a job's index entry and delete its others (known, or listed if not given)
+
+        Returns:
+            The new entry's path
+        """
+        path = _index_path(job_id, status, due)
+        await self.client.upload_json(path, {})
+        if known is None:
+            known = [name async for name in self.client.iter_blob_names(f"{JOB_INDEX_PREFIX}{job_id}/")]
+        stale = [name for name in known if name != path]
+        if stale:
+            await self.client.delete_many(stale)
+        return path
+
+    async def _reindex(self, job_id: str, status: str, due: float, known: Optional[List[str]] = None) -> Optional[str]:
+        """_index for a job whose current entry is already in place; failures only cost the scan a read"""
+        try:
+            return await self._index(job_id, status, due, known)
+        except Exception as e:
+            logger.warning(f"Could not index job {job_id} as {status}: {e}")
+            return None
+
+    # ---------- Recovery ----------
+
+    async def recover(self) -> int:
+        """
+        Queue the stored jobs nobody is running (queued ones, and running ones
+        whose lease has expired) and delete finished jobs past retention
+
+        Only the index is listed; jobs are read only if their entry is due and
+        they are not finished, and not queued or running here.
+
+        Returns:
+            The number of jobs queued
+        """
+        entries: Dict[str, List[str]] = {}
+        async for name in self.client.iter_blob_names(JOB_INDEX_PREFIX):
+            entries.setdefault(_parse_index_path(name)[0], []).append(name)
+
+        now = time.time()
+        expired, candidates = [], []
+        for job_id, names in entries.items():
+            parsed = [_parse_index_path(name) for name in names]
+            finished = [due for _, status, due in parsed if status in FINISHED_STATUSES]
+            if finished:
+                # A finished job never changes again, so its entry alone decides
+                if min(finished) <= now:
+                    expired.append(job_id)
+            elif not self._busy(job_id):
+                if any(due <= now for _, _, due in parsed):
+                    candidates.append(job_id)
+
+        queued = 0
+        results = await self.client.download_many([_job_path(job_id) for job_id in candidates])
+        for job_id, result in zip(candidates, results):
+            if not result.ok:
+                continue
+            if result.data is None:
+                # Indexed by a submission that failed to store the job
+                await self._unindex(entries[job_id])
+                continue
+            job = GenerationJob(**result.data)
+            if job.status in FINISHED_STATUSES:
+                # Finished, but its entry was not updated
+                await self._reindex(job_id, job.status, now + self.retention_seconds, entries[job_id])
+            elif job.status == "queued" or self._orphaned(job):
+                self._enqueue(job_id)
+                RETRIED.inc(reason="recovered")
+                queued += 1
+
+        if expired:
+            # Jobs before their entries, so a failed delete leaves no job unindexed
+            results = await self.client.delete_many([_job_path(job_id) for job_id in expired])
+            await self._unindex([name for job_id, result in zip(expired, results) if result.ok for name in entries[job_id]])
+        if queued or expired:
+            logger.info(f"Job recovery: queued {queued} jobs, deleted {len(expired)} expired ones")
+        return queued
+
+    async def _unindex(self, names: List[str]):
+        """Delete the index entries of jobs that no longer exist"""
+        if not names:
+            return
+        try:
+            await self.client.delete_many(names)
+        except Exception as e:
+            logger.warning(f"Could not delete {len(names)} job index entries: {e}")
+
+    async def _recovery_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Error recovering jobs: {e}")
+            await asyncio.sleep(self.recovery_interval)
+
+    def start(self):
+        """Start the workers, and the recovery scan now and every recovery_interval seconds"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recovery_loop()))
+
+    async def close(self):
+        """Stop the workers; jobs running here are put back in the queue for the next replica"""
+        for handle in self._timers:
+            handle.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._completing:
+            # A success not stored by then is left 'running' for the recovery scan to rerun
+            await asyncio.wait(list(self._completing.values()), timeout=self.lease_seconds)
+
+
+def create_job_manager(client: StorageBackend, run: JobRunner, on_success: Optional[JobHook] = None) -> JobManager:
+    """Create the job manager from configuration"""
+    config = get_config()
+    return JobManager(
+        client,
+        run,
+        workers=config.job_workers,
+        max_queued=config.job_max_queued,
+        checkpoint_interval=config.job_checkpoint_interval,
+        lease_seconds=config.job_lease_seconds,
+        max_attempts=config.job_max_attempts,
+        recovery_interval=config.job_recovery_interval,
+        retention_seconds=config.job_retention_seconds,
+        on_success=on_success
+    )
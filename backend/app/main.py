@@ -1,25 +1,170 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Literal, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import httpx
+import json
 import os
 import logging
+import time
 
 from fastapi.middleware.cors import CORSMiddleware
-from .database import get_database_service
+from .database import get_async_database_service
 from .models import (
     CreateSessionRequest, 
     CreateSessionResponse, 
     SaveMessageRequest,
     GetMessagesResponse,
-    SessionMetadata
+    SessionMetadata,
+    ChatMessage,
+    GenerationJob,
+    CHAT_MESSAGES,
+    USER_SESSIONS,
+    derived_message_id,
+    message_cursor
 )
 from .config import get_config
+from .ollama_client import create_ollama_client, record_generation
+from .ollama_router import NoEndpointsError
+from .response_cache import cache_key, create_response_cache
+from .context import ContextBuilder, create_context_builder
+from .singleflight import SingleFlight
+from .admission import AdmissionRejected, create_admission_controller
+from .outbox import create_outbox
+from .jobs import JobFailed, JobQueueFull, RetryLater, create_job_manager
+from .telemetry import RequestMetricsMiddleware, configure_telemetry, end_span, span, start_span
+from . import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Assistant Backend")
+# Coalesces concurrent identical generations onto one upstream call
+# (SINGLE_FLIGHT_ENABLED is applied once configuration has loaded)
+single_flight = SingleFlight()
+
+# Bounds concurrent generations per model (None when disabled), created at startup
+admission = None
+
+# Background, retried persistence of /query messages, created once configuration has loaded
+outbox = None
+
+# Runs /jobs generations on worker tasks, created once storage and Ollama are up
+jobs = None
+
+metrics.callback(
+    "storage_object_cache_lookups_total",
+    "Session/metadata cache lookups by result (hit, not_modified, miss)",
+    "counter",
+    lambda: {(result,): count for result, count in db_service.object_cache_lookups.items()} if db_service else {},
+    ["result"]
+)
+metrics.callback(
+    "storage_object_cache_evictions_total",
+    "Session/metadata cache entries evicted to stay within OBJECT_CACHE_MAX_ENTRIES",
+    "counter",
+    lambda: {(): db_service.object_cache.evictions} if db_service else {}
+)
+
+# Database service, pooled Ollama client, optional response cache and the
+# conversation context builder, initialized in the background at startup
+db_service = None
+ollama_client = None
+response_cache = None
+context_builder = ContextBuilder(None, 0, 0)
+startup_task: Optional[asyncio.Task] = None
+
+
+async def _with_retry(what: str, fn: Callable[[], Awaitable[Any]], initial_delay: float = 0.5, max_delay: float = 15.0):
+    """Await fn() until it succeeds, backing off exponentially between attempts"""
+    delay = initial_delay
+    attempt = 1
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            logger.error(f"Initializing {what} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        attempt += 1
+
+
+async def _initialize():
+    """
+    Load configuration, then bring up storage and the Ollama client concurrently
+    
+    Failed steps are retried with backoff; until storage is up, /ready reports
+    not ready and storage-backed endpoints answer 503.
+    """
+    global db_service, ollama_client, response_cache, context_builder, admission, outbox, jobs
+    # Key Vault reads block, so they run in a worker thread
+    config = await _with_retry("configuration", lambda: asyncio.to_thread(get_config))
+    single_flight.enabled = config.single_flight_enabled
+    admission = create_admission_controller()
+    
+    # Writes submitted before storage is up are retried, then spilled and replayed
+    outbox = create_outbox()
+    outbox.register("append_messages", _store_appended, _store_appended_again)
+    outbox.register("count_messages", _store_counts)
+    # Only found in spill files written before saves were split into the two steps above
+    outbox.register("save_messages", _store_messages, _store_messages_again)
+    outbox.register("update_metadata", _store_metadata)
+    outbox.register("update_last_active", _store_last_active)
+    
+    retry = {"initial_delay": config.startup_retry_initial_delay, "max_delay": config.startup_retry_max_delay}
+    
+    async def start_ollama():
+        global ollama_client
+        client = create_ollama_client()
+        try:
+            await client.start()
+        except Exception:
+            await client.close()
+            raise
+        ollama_client = client
+    
+    db, _ = await asyncio.gather(
+        _with_retry("database service", get_async_database_service, **retry),
+        _with_retry("Ollama client", start_ollama, **retry)
+    )
+    db_service = db
+    logger.info("Database service initialized successfully")
+    response_cache = create_response_cache(db_service.client)
+    context_builder = create_context_builder(db_service)
+    outbox.start()
+    jobs = create_job_manager(db_service.client, _run_job, on_success=_save_job_answer)
+    jobs.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start initialization in the background so the process serves /health at once,
+    and close the clients on shutdown
+    """
+    global startup_task
+    startup_task = asyncio.create_task(_initialize())
+    
+    yield
+    
+    if not startup_task.done():
+        startup_task.cancel()
+        await asyncio.gather(startup_task, return_exceptions=True)
+    # Jobs first: their answers are persisted through the outbox
+    if jobs:
+        await jobs.close()
+    if outbox:
+        await outbox.close(get_config().outbox_drain_timeout)
+    if ollama_client:
+        await ollama_client.close()
+    if db_service:
+        await db_service.close()
+
+
+app = FastAPI(title="AI Assistant Backend", lifespan=lifespan)
 
 # Enable CORS so VS Code webview can call the API
 app.add_middleware(
@@ -30,23 +175,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration from Key Vault or environment
-config = get_config()
-OLLAMA_URL = config.ollama_url
+# Request latency histograms, and spans for each request when OpenTelemetry is set up
+app.add_middleware(RequestMetricsMiddleware)
+configure_telemetry(app)
 
-# Initialize database service
-try:
-    db_service = get_database_service()
-    logger.info("Database service initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize database service: {e}")
-    db_service = None
+def _json_response(content: bytes) -> Response:
+    """
+    Response for JSON we serialized ourselves
+
+    Endpoints return already-validated models this way, so FastAPI does not
+    dump, re-validate and re-encode them through the response_model.
+    """
+    return Response(content, media_type="application/json")
 
-# Optional: Add /health endpoint to satisfy liveness/readiness probes
+# Liveness: answers as soon as the process is up, without touching dependencies
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "database": "connected" if db_service else "disconnected"}
 
+# Readiness: storage and at least one Ollama endpoint must be reachable
+@app.get("/ready")
+async def readiness_check():
+    """Report whether this replica can serve traffic (503 while starting or when a dependency is unreachable)"""
+    if db_service is None or ollama_client is None:
+        return JSONResponse({"status": "starting", "storage": False, "ollama": False}, status_code=503)
+    
+    timeout = get_config().ready_check_timeout
+    
+    async def storage_ok() -> bool:
+        try:
+            await asyncio.wait_for(db_service.client.ping(), timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Readiness check: storage unreachable: {e}")
+            return False
+    
+    storage, ollama = await asyncio.gather(storage_ok(), ollama_client.ping(timeout))
+    ready = storage and ollama
+    return JSONResponse(
+        {"status": "ready" if ready else "not_ready", "storage": storage, "ollama": ollama},
+        status_code=200 if ready else 503
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics (request latency, storage operations, Ollama timings, admission queue)"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 # ==================== Session Endpoints ====================
 
 @app.post("/sessions", response_model=CreateSessionResponse)
@@ -56,13 +231,13 @@ async def create_session(request: CreateSessionRequest):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        session = db_service.create_session(
+        session = await db_service.create_session(
             user_id=request.user_id,
             device_info=request.device_info
         )
         
         # Initialize metadata
-        db_service.update_metadata(session.session_id)
+        await db_service.update_metadata(session.session_id)
         
         return CreateSessionResponse(
             session_id=session.session_id,
@@ -79,10 +254,10 @@ async def get_session(session_id: str):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        session = db_service.get_session(session_id)
+        session = await db_service.get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return session
+        return _json_response(session.model_dump_json())
     except HTTPException:
         raise
     except Exception as e:
@@ -98,7 +273,7 @@ async def save_message(request: SaveMessageRequest):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        message = db_service.save_message(
+        message = await db_service.save_message(
             session_id=request.session_id,
             role=request.role,
             message_text=request.message_text,
@@ -107,7 +282,7 @@ async def save_message(request: SaveMessageRequest):
         )
         
         # Update last_active timestamp
-        db_service.update_last_active(request.session_id)
+        await db_service.update_last_active(request.session_id)
         
         return message
     except Exception as e:
@@ -115,20 +290,47 @@ async def save_message(request: SaveMessageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/sessions/{session_id}/messages", response_model=GetMessagesResponse)
-async def get_messages(session_id: str, limit: int = 100, offset: int = 0):
-    """Retrieve messages for a session"""
+async def get_messages(
+    session_id: str,
+    limit: int = 100,
+    offset: int = 0,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+):
+    """
+    Retrieve messages for a session
+    
+    Pass a `before` or `after` cursor (from a previous response's `next_cursor`)
+    for cursor pagination, which only downloads the requested page;
+    `before=latest` returns the newest page. Without a cursor, `offset`/`limit`
+    pagination is used, and `next_cursor` can be passed as `after` to continue
+    from there. Either way `total_count` is the session's message counter.
+    """
     if not db_service:
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        messages = db_service.get_messages(session_id, limit=limit, offset=offset)
-        total_count = db_service.get_message_count(session_id)
+        if before or after:
+            messages, next_cursor = await db_service.get_messages_page(
+                session_id, limit=limit, before=before, after=after
+            )
+            return _json_response(GetMessagesResponse.model_construct(
+                session_id=session_id,
+                messages=messages,
+                total_count=await db_service.get_message_count(session_id),
+                next_cursor=next_cursor
+            ).model_dump_json())
+        
+        messages = await db_service.get_messages(session_id, limit=limit, offset=offset)
+        total_count = await db_service.get_message_count(session_id)
         
-        return GetMessagesResponse(
+        # The messages were validated when loaded, so the envelope is built without re-validating them
+        return _json_response(GetMessagesResponse.model_construct(
             session_id=session_id,
             messages=messages,
-            total_count=total_count
-        )
+            total_count=total_count,
+            next_cursor=message_cursor(messages[-1]) if messages else None
+        ).model_dump_json())
     except Exception as e:
         logger.error(f"Error retrieving messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -142,7 +344,7 @@ async def update_metadata(session_id: str, extension_version: str = None, cluste
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        metadata = db_service.update_metadata(
+        metadata = await db_service.update_metadata(
             session_id=session_id,
             extension_version=extension_version,
             cluster_used=cluster_used
@@ -159,7 +361,7 @@ async def get_metadata(session_id: str):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        metadata = db_service.get_metadata(session_id)
+        metadata = await db_service.get_metadata(session_id)
         if not metadata:
             raise HTTPException(status_code=404, detail="Metadata not found")
         return metadata
@@ -177,75 +379,745 @@ class Query(BaseModel):
     question: str
     model: str = "qwen2.5:1.5b"
     extension_version: str = None
+    stream: bool = False  # Stream Ollama tokens back as NDJSON as they are generated
+    options: Optional[dict] = None  # Ollama generation options, e.g. {"temperature": 0}
+    cache: bool = False  # Allow a cached answer even though the request is not deterministic
+    priority: Literal["interactive", "background"] = "interactive"  # Admission queue lane
+    history: bool = True  # Send the session's recent conversation along with the question
+
+
+class BatchQuery(BaseModel):
+    session_id: str
+    questions: List[str]
+    model: str = "qwen2.5:1.5b"
+    extension_version: str = None
+    options: Optional[dict] = None  # Ollama generation options, applied to every question
+    cache: bool = False  # Allow cached answers even though the requests are not deterministic
+    priority: Literal["interactive", "background"] = "interactive"  # Admission queue lane
+    history: bool = False  # Send the session's recent conversation along with each question
+    max_parallel: Optional[int] = None  # Generations at once (capped at BATCH_MAX_PARALLEL)
+
+
+def _storage():
+    """The database service, or an error the outbox retries while storage is starting"""
+    if db_service is None:
+        raise RuntimeError("Database service unavailable")
+    return db_service
+
+
+async def _store_appended(session_id: str, messages: list):
+    await _storage().append_messages(session_id, CHAT_MESSAGES.validate_python(messages))
+
+
+async def _store_appended_again(session_id: str, messages: list):
+    await _storage().append_messages(session_id, CHAT_MESSAGES.validate_python(messages), skip_logged=True)
+
+
+async def _store_counts(session_id: str, message_count: int, tokens_total: int):
+    await _storage().count_messages(session_id, message_count, tokens_total)
+
+
+async def _store_messages(session_id: str, messages: list):
+    await _storage().save_messages(session_id, CHAT_MESSAGES.validate_python(messages))
+
+
+async def _store_messages_again(session_id: str, messages: list):
+    await _storage().save_messages(session_id, CHAT_MESSAGES.validate_python(messages), skip_logged=True)
+
+
+def _submit_messages(session_id: str, messages: List[ChatMessage]):
+    """
+    Persist messages in the background: appended to the log, then counted
+    
+    Two outbox writes, so a failed count is retried without appending the
+    messages again (and a retried append skips those that already landed).
+    """
+    outbox.submit(session_id, "append_messages", {
+        "session_id": session_id,
+        "messages": [message.model_dump(mode="json") for message in messages]
+    })
+    outbox.submit(session_id, "count_messages", {
+        "session_id": session_id,
+        "message_count": len(messages),
+        "tokens_total": sum(message.tokens_used or 0 for message in messages)
+    })
+
+
+async def _store_metadata(session_id: str, extension_version: Optional[str] = None, cluster_used: Optional[str] = None):
+    await _storage().update_metadata(session_id, extension_version=extension_version, cluster_used=cluster_used)
+
+
+async def _store_last_active(session_id: str):
+    await _storage().update_last_active(session_id)
+
+
+def _save_user_message(query: Query):
+    """Persist the user's question and update session metadata in the background"""
+    message = ChatMessage(
+        session_id=query.session_id,
+        role="user",
+        message_text=query.question,
+        model_version=query.model
+    )
+    _submit_messages(query.session_id, [message])
+    
+    # Update metadata
+    if query.extension_version:
+        outbox.submit(query.session_id, "update_metadata", {
+            "session_id": query.session_id,
+            "extension_version": query.extension_version,
+            "cluster_used": get_config().ollama_url
+        })
+
+
+def _save_model_response(
+    query: Query,
+    message_text: str,
+    eval_count: Optional[int],
+    context: Optional[list] = None
+):
+    """
+    Persist the model's answer and update the session's last_active timestamp in
+    the background, after the question
+    
+    context is the token array Ollama returned, remembered for the session's next turn.
+    """
+    message = ChatMessage(
+        session_id=query.session_id,
+        role="model",
+        message_text=message_text,
+        tokens_used=eval_count,
+        model_version=query.model
+    )
+    context_builder.remember(query.session_id, query.model, message, context)
+    _submit_messages(query.session_id, [message])
+    
+    # Update last_active
+    outbox.submit(query.session_id, "update_last_active", {"session_id": query.session_id})
+
+
+async def _replay_cached(cached: dict):
+    """Stream a cached answer as a single final NDJSON chunk"""
+    yield json.dumps(cached) + "\n"
+
+
+async def _admit(model: str, priority: str) -> Optional[float]:
+    """Wait for an Ollama slot, raising 429/503 with Retry-After when not admitted"""
+    if admission is None:
+        return None
+    
+    try:
+        with span("ollama.admission", {"ollama.model": model, "ollama.priority": priority}):
+            return await admission.acquire(model, priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Model {model} is overloaded ({e.reason}), retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _release(model: str, admitted_at: Optional[float]):
+    """Give back a slot taken by _admit()"""
+    if admission is not None:
+        admission.release(model, admitted_at)
+
+
+async def _generate(payload: dict, priority: str) -> dict:
+    """Call Ollama and return its JSON response, raising HTTPException on upstream errors"""
+    admitted_at = await _admit(payload["model"], priority)
+    started = time.perf_counter()
+    try:
+        response = await ollama_client.generate(payload)
+    finally:
+        _release(payload["model"], admitted_at)
+    
+    # Check if the request was successful
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Ollama Error: {response.text}")
+    
+    result = response.json()
+    record_generation(payload["model"], "full", result, time.perf_counter() - started)
+    return result
+
+
+def _unavailable_detail(exc: Exception) -> str:
+    """Error detail for a 503 caused by Ollama being unreachable"""
+    if isinstance(exc, NoEndpointsError):
+        return str(exc)
+    try:
+        return f"An error occurred while requesting {exc.request.url!r}."
+    except RuntimeError:
+        # Raised by httpx errors that were not attached to a request
+        return f"An error occurred while requesting Ollama: {exc}"
+
+
+def _final_chunk(line: Optional[str]) -> Optional[dict]:
+    """The stats-bearing last chunk of a stream (done: true), if line is one"""
+    try:
+        chunk = json.loads(line) if line else None
+    except ValueError:
+        return None
+    return chunk if isinstance(chunk, dict) and chunk.get("done") else None
+
+
+async def _iterate_lines(
+    response: httpx.Response,
+    model: str,
+    started: float,
+    stream_span: Any,
+    on_close: Callable[[], None]
+) -> AsyncIterator[str]:
+    """
+    Yield the non-empty lines of a streaming response, closing it when done or
+    cancelled, and record the generation's timings once it has finished
+    """
+    first_token = None
+    last_line = None
+    error = None
+    try:
+        async for line in response.aiter_lines():
+            if line:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                last_line = line
+                yield line
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        await response.aclose()
+        on_close()
+        
+        stats = _final_chunk(last_line)
+        if stats is not None:
+            record_generation(model, "stream", stats, time.perf_counter() - started, first_token)
+        end_span(
+            stream_span,
+            error,
+            **{"ollama.completed": stats is not None, "ollama.eval_count": (stats or {}).get("eval_count")}
+        )
+
+
+async def _open_generation_stream(payload: dict, priority: str, read_timeout: Optional[float] = None) -> AsyncIterator[str]:
+    """Start a streaming generation, raising HTTPException on upstream errors"""
+    admitted_at = await _admit(payload["model"], priority)
+    started = time.perf_counter()
+    # Covers the whole stream, which outlives this call
+    stream_span = start_span("ollama.stream", {"ollama.model": payload["model"]})
+    try:
+        response = await ollama_client.stream_generate(payload, read_timeout)
+        
+        if response.status_code != 200:
+            error_text = (await response.aread()).decode("utf-8", errors="replace")
+            await response.aclose()
+            raise HTTPException(status_code=response.status_code, detail=f"Ollama Error: {error_text}")
+    except BaseException as e:
+        _release(payload["model"], admitted_at)
+        end_span(stream_span, e)
+        raise
+    
+    # The slot is held until the stream finishes or is cancelled
+    return _iterate_lines(
+        response,
+        payload["model"],
+        started,
+        stream_span,
+        lambda: _release(payload["model"], admitted_at)
+    )
+
+
+async def _relay_generation(query: Query, lines: AsyncIterator[str], cache_payload: Optional[dict] = None):
+    """
+    Forward Ollama's NDJSON chunks to the caller as they arrive and persist the
+    full answer once the final chunk (done: true) has been relayed. When
+    cache_payload is given, the completed answer is also stored in the response
+    cache under it.
+    
+    If the caller disconnects, Starlette cancels this generator; once no other
+    coalesced request is following the same stream, the upstream response is
+    closed, which aborts the generation in Ollama.
+    """
+    parts = []
+    try:
+        async for line in lines:
+            chunk = json.loads(line)
+            parts.append(chunk.get("response", ""))
+            yield line + "\n"
+            
+            if chunk.get("done"):
+                _save_model_response(query, "".join(parts), chunk.get("eval_count"), chunk.get("context"))
+                if cache_payload is not None:
+                    outbox.track(response_cache.set(cache_payload, {**chunk, "response": "".join(parts)}))
+    except asyncio.CancelledError:
+        logger.info(f"Client disconnected from generation for session: {query.session_id}")
+        raise
+    finally:
+        await lines.aclose()
+
+
+def _flight_key(kind: str, payload: dict, priority: str) -> str:
+    """
+    Single-flight key of a generation
+    
+    The priority is part of it: a follower waits on its leader's admission, so
+    an interactive request must not join a background one still queued.
+    """
+    return f"{kind}:{priority}:{cache_key(payload)}"
+
+
+async def _query_payload(query: Query, stream: bool) -> dict:
+    """
+    The Ollama request for a query
+    
+    The conversation so far is assembled before this question joins it (once the
+    previous turn's background writes have landed, or after a short wait). History
+    is part of the prompt (or context), so it is also part of the cache and
+    single-flight keys.
+    """
+    if query.history:
+        with span("query.context", {"session.id": query.session_id}):
+            await outbox.wait(query.session_id, get_config().outbox_settle_timeout)
+            prompt_fields = await context_builder.build(query.session_id, query.model, query.question)
+    else:
+        prompt_fields = {"prompt": query.question}
+    
+    payload = {
+        "model": query.model,
+        **prompt_fields,
+        "stream": stream
+    }
+    if query.options:
+        payload["options"] = query.options
+    return payload
+
 
 @app.post("/query")
-async def handle_query(query: Query):
+async def handle_query(query: Query, api_response: Response):
     """
     Receives user queries, sends them to the AI model (Ollama), and returns the response.
     Now also persists messages and updates metadata.
+    
+    With `stream: true` the response is Ollama's NDJSON token stream, relayed as it
+    is generated; the last line carries `done: true` and the generation stats.
+    
+    When the response cache is enabled, the `X-Cache` header reports HIT, MISS or
+    BYPASS (request not cacheable: not temperature 0 and `cache` not set).
+    
+    Concurrent identical requests of the same `priority` share one upstream
+    generation (single-flight); followers get `X-Coalesced: true` but still persist their own messages.
+    
+    Unless `history` is false, the session's recent conversation (within a token
+    budget) is sent along with the question.
+    
+    Generations are admitted per model up to a concurrency limit; the overflow
+    waits in a bounded queue by `priority` and is rejected with 429 (queue full)
+    or 503 (wait timed out), each with a `Retry-After` header.
+    
+    The question is persisted while the answer is generated, and the answer after
+    the response has been sent; both are background writes that are retried and,
+    if storage stays unreachable, spilled to local disk and replayed later.
     """
+    if ollama_client is None:
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "1"})
+    
     try:
-        # Save user message to database
-        if db_service:
-            try:
-                db_service.save_message(
-                    session_id=query.session_id,
-                    role="user",
-                    message_text=query.question,
-                    model_version=query.model
+        payload = await _query_payload(query, query.stream)
+        
+        # Save user message to database, concurrently with the generation
+        _save_user_message(query)
+        
+        # Serve identical cacheable prompts from the response cache
+        cache_status = None
+        use_cache = response_cache is not None and response_cache.is_cacheable(payload, query.cache)
+        if response_cache is not None:
+            cache_status = "MISS" if use_cache else "BYPASS"
+        
+        if use_cache:
+            cached = await response_cache.get(payload)
+            if cached is not None:
+                _save_model_response(
+                    query,
+                    cached.get("response", ""),
+                    cached.get("eval_count"),
+                    cached.get("context")
                 )
-                
-                # Update metadata
-                if query.extension_version:
-                    db_service.update_metadata(
-                        session_id=query.session_id,
-                        extension_version=query.extension_version,
-                        cluster_used=OLLAMA_URL
+                if query.stream:
+                    return StreamingResponse(
+                        _replay_cached(cached),
+                        media_type="application/x-ndjson",
+                        headers={"X-Cache": "HIT"}
                     )
-            except Exception as e:
-                logger.error(f"Error saving user message: {e}")
-        
-        # Construct the payload for Ollama
-        payload = {
-            "model": query.model,
-            "prompt": query.question,
-            "stream": False
-        }
+                api_response.headers["X-Cache"] = "HIT"
+                return cached
         
-        # Call Ollama service
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=60.0)
-            
-            # Check if the request was successful
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=f"Ollama Error: {response.text}")
-            
-            # Get the response from Ollama
-            ollama_response = response.json()
+        if query.stream:
+            # Attach to an identical in-flight stream, or start one
+            stream, shared = single_flight.join_stream(
+                _flight_key("stream", payload, query.priority),
+                lambda: _open_generation_stream(payload, query.priority)
+            )
+            try:
+                await stream.opened()
+            except BaseException:
+                stream.leave()
+                raise
             
-            # Save model response to database
-            if db_service:
-                try:
-                    db_service.save_message(
-                        session_id=query.session_id,
-                        role="model",
-                        message_text=ollama_response.get("response", ""),
-                        tokens_used=ollama_response.get("eval_count"),
-                        model_version=query.model
-                    )
-                    
-                    # Update last_active
-                    db_service.update_last_active(query.session_id)
-                except Exception as e:
-                    logger.error(f"Error saving model response: {e}")
+            headers = {}
+            if cache_status:
+                headers["X-Cache"] = cache_status
+            if shared:
+                headers["X-Coalesced"] = "true"
             
-            # Return the JSON response from Ollama
-            return ollama_response
+            return StreamingResponse(
+                _relay_generation(query, stream.iterate(), payload if use_cache and not shared else None),
+                media_type="application/x-ndjson",
+                headers=headers or None
+            )
+        
+        # Call Ollama over the pooled client, sharing identical in-flight generations
+        ollama_response, shared = await single_flight.do(
+            _flight_key("generate", payload, query.priority),
+            lambda: _generate(payload, query.priority)
+        )
+        
+        # Save model response to database, after the response is sent
+        _save_model_response(
+            query,
+            ollama_response.get("response", ""),
+            ollama_response.get("eval_count"),
+            ollama_response.get("context")
+        )
+        
+        if use_cache and not shared:
+            outbox.track(response_cache.set(payload, ollama_response))
+        if cache_status:
+            api_response.headers["X-Cache"] = cache_status
+        if shared:
+            api_response.headers["X-Coalesced"] = "true"
+        
+        # Return the JSON response from Ollama
+        return ollama_response
             
-    except httpx.RequestError as exc:
-        raise HTTPException(status_code=503, detail=f"An error occurred while requesting {exc.request.url!r}.")
+    except HTTPException:
+        raise
+    except (httpx.RequestError, NoEndpointsError) as exc:
+        raise HTTPException(status_code=503, detail=_unavailable_detail(exc))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _save_batch(batch: BatchQuery, answers: List[Optional[dict]]):
+    """
+    Persist a batch's questions and answers with one bulk write, in the background
+    
+    Each question is followed by its answer (if it completed). Timestamps are
+    assigned in that order so the log stays in cursor order even though the
+    answers finished out of order.
+    """
+    now = datetime.utcnow()
+    messages = []
+    for question, answer in zip(batch.questions, answers):
+        messages.append(ChatMessage(
+            session_id=batch.session_id,
+            role="user",
+            message_text=question,
+            model_version=batch.model,
+            timestamp=now + timedelta(microseconds=len(messages))
+        ))
+        if answer is not None:
+            messages.append(ChatMessage(
+                session_id=batch.session_id,
+                role="model",
+                message_text=answer.get("response", ""),
+                tokens_used=answer.get("eval_count"),
+                model_version=batch.model,
+                timestamp=now + timedelta(microseconds=len(messages))
+            ))
+    
+    _submit_messages(batch.session_id, messages)
+    if batch.extension_version:
+        outbox.submit(batch.session_id, "update_metadata", {
+            "session_id": batch.session_id,
+            "extension_version": batch.extension_version,
+            "cluster_used": get_config().ollama_url
+        })
+    outbox.submit(batch.session_id, "update_last_active", {"session_id": batch.session_id})
+
+
+async def _answer_batch_item(batch: BatchQuery, question: str) -> Tuple[dict, Optional[str]]:
+    """Generate one answer of a batch through the response cache and single-flight; returns it and X-Cache status"""
+    # Built like /query's, so the same question gets the same history and keys either way
+    payload = await _query_payload(Query(
+        session_id=batch.session_id,
+        question=question,
+        model=batch.model,
+        options=batch.options,
+        history=batch.history
+    ), stream=False)
+    
+    use_cache = response_cache is not None and response_cache.is_cacheable(payload, batch.cache)
+    if use_cache:
+        cached = await response_cache.get(payload)
+        if cached is not None:
+            return cached, "HIT"
+    
+    result, shared = await single_flight.do(
+        _flight_key("generate", payload, batch.priority),
+        lambda: _generate(payload, batch.priority)
+    )
+    if use_cache and not shared:
+        outbox.track(response_cache.set(payload, result))
+    if response_cache is None:
+        return result, None
+    return result, "MISS" if use_cache else "BYPASS"
+
+
+async def _run_batch(batch: BatchQuery, parallel: int) -> AsyncIterator[str]:
+    """
+    Answer a batch's questions with at most `parallel` in flight, yielding one
+    NDJSON line per question as it completes, then a summary line
+    
+    If the caller disconnects, the outstanding generations are cancelled; the
+    questions and the answers completed so far are persisted either way.
+    """
+    semaphore = asyncio.Semaphore(parallel)
+    answers: List[Optional[dict]] = [None] * len(batch.questions)
+    
+    async def run(index: int, question: str) -> Tuple[int, dict]:
+        async with semaphore:
+            try:
+                result, cache_status = await _answer_batch_item(batch, question)
+            except HTTPException as e:
+                return index, {"index": index, "error": e.detail, "status_code": e.status_code}
+            except (httpx.RequestError, NoEndpointsError) as e:
+                return index, {"index": index, "error": _unavailable_detail(e), "status_code": 503}
+            except Exception as e:
+                logger.error(f"Batch question {index} for session {batch.session_id} failed: {e}")
+                return index, {"index": index, "error": str(e), "status_code": 500}
+        
+        answers[index] = result
+        # The context token array is left out; it is large and specific to one prompt
+        line = {"index": index, **{key: value for key, value in result.items() if key != "context"}}
+        if cache_status:
+            line["cache"] = cache_status
+        return index, line
+    
+    batch_span = start_span("query.batch", {"session.id": batch.session_id, "batch.size": len(batch.questions)})
+    tasks = [asyncio.create_task(run(index, question)) for index, question in enumerate(batch.questions)]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            _, line = await next_done
+            failed += "error" in line
+            yield json.dumps(line) + "\n"
+        yield json.dumps({"batch_done": True, "completed": len(tasks) - failed, "failed": failed}) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+        _save_batch(batch, answers)
+        end_span(batch_span, **{"batch.failed": failed})
+
+
+@app.post("/query/batch")
+async def handle_batch_query(batch: BatchQuery):
+    """
+    Answer several questions for one session in a single request
+    
+    The questions are sent to Ollama with bounded parallelism (`max_parallel`,
+    capped at BATCH_MAX_PARALLEL; admission control still applies per
+    generation). Answers stream back as NDJSON in completion order, one line per
+    question tagged with its `index` in `questions`: Ollama's response, or
+    `error` and `status_code` if that question failed. A final line carries
+    `batch_done: true` with the completed and failed counts.
+    
+    All questions and answers are persisted with one bulk write once the batch
+    is done (in the background, like /query).
+    """
+    if ollama_client is None:
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "1"})
+    
+    config = get_config()
+    if not batch.questions:
+        raise HTTPException(status_code=422, detail="questions must not be empty")
+    if len(batch.questions) > config.batch_max_questions:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {config.batch_max_questions} questions per batch (got {len(batch.questions)})"
+        )
+    
+    parallel = min(batch.max_parallel or config.batch_max_parallel, config.batch_max_parallel)
+    return StreamingResponse(_run_batch(batch, max(1, parallel)), media_type="application/x-ndjson")
+
+# ==================== Job Endpoints ====================
+
+def _job_answer_id(job: GenerationJob) -> str:
+    """The message ID of a job's answer, the same on every run and replica"""
+    return derived_message_id(job.job_id, job.created_at)
+
+
+async def _run_job(job: GenerationJob, progress: Callable[[str], None]) -> dict:
+    """
+    Generate a job's answer, reporting each token through progress
+    
+    The answer is persisted by _save_job_answer once the job's success is stored,
+    so a job cancelled or taken over meanwhile leaves none in the chat log. The job's Ollama stream gets JOB_READ_TIMEOUT rather than the client's read
+    timeout, which is sized for interactive requests. Overload (429/503 from
+    admission) or no Ollama endpoint raises RetryLater, other upstream HTTP errors
+    JobFailed; network errors propagate, so the job is retried.
+    """
+    query = Query(**job.request)
+    try:
+        lines = await _open_generation_stream(job.payload, query.priority, get_config().job_read_timeout)
+    except HTTPException as e:
+        if e.status_code in (429, 503):
+            raise RetryLater(e.detail, float((e.headers or {}).get("Retry-After", 1)))
+        raise JobFailed(e.detail, e.status_code)
+    except NoEndpointsError as e:
+        # Waits for discovery to find a replica, without using up the job's attempts
+        raise RetryLater(str(e), get_config().ollama_refresh_interval)
+    
+    parts = []
+    final = None
+    try:
+        async for line in lines:
+            chunk = json.loads(line)
+            parts.append(chunk.get("response", ""))
+            progress(chunk.get("response", ""))
+            if chunk.get("done"):
+                final = chunk
+    finally:
+        await lines.aclose()
+    
+    if final is None:
+        raise RuntimeError("Ollama closed the stream before the answer was complete")
+    
+    answer = "".join(parts)
+    # Only used if the session's newest message turns out to be this answer
+    placeholder = ChatMessage(message_id=_job_answer_id(job), session_id=query.session_id, role="model", message_text=answer)
+    context_builder.remember(query.session_id, query.model, placeholder, final.get("context"))
+    # The context token array stays out of the stored job; it is large and specific to one prompt
+    return {**{key: value for key, value in final.items() if key != "context"}, "response": answer}
+
+
+async def _save_job_answer(job: GenerationJob):
+    """
+    Persist a succeeded job's answer, under an ID derived from the job so that a
+    replayed write of it is recognised and skipped
+    """
+    query = Query(**job.request)
+    message = ChatMessage(
+        message_id=_job_answer_id(job),
+        session_id=job.session_id,
+        role="model",
+        message_text=job.result.get("response", ""),
+        timestamp=job.finished_at,
+        tokens_used=job.result.get("eval_count"),
+        model_version=query.model
+    )
+    _submit_messages(job.session_id, [message])
+    outbox.submit(job.session_id, "update_last_active", {"session_id": job.session_id})
+
+
+def _job_response(job: GenerationJob, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """A job's state as JSON, without its (large) Ollama request"""
+    return Response(
+        job.model_dump_json(exclude={"payload"}),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers
+    )
+
+
+def _require_jobs():
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Service is starting", headers={"Retry-After": "1"})
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(query: Query):
+    """
+    Queue a /query request as an asynchronous job and return its id at once
+    
+    For generations that may outlast the client's (or a proxy's) request timeout.
+    The job runs on one of JOB_WORKERS worker tasks; poll GET /jobs/{job_id} for
+    its status and output so far, then fetch GET /jobs/{job_id}/result. `stream`
+    is ignored. Job state is kept in storage, so a job survives a restart of the
+    replica running it (it is generated again from the start).
+    
+    The question is persisted now and the answer once the job succeeds, as for /query.
+    """
+    _require_jobs()
+    try:
+        payload = await _query_payload(query, stream=True)
+        job = await jobs.submit(query.session_id, query.model_dump(exclude_none=True), payload)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Too many queued jobs ({e}), retry later", headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Error submitting job for session {query.session_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    _save_user_message(query)
+    return _job_response(job, 202, {"Location": f"/jobs/{job.job_id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, since: int = 0):
+    """
+    Get a job's status and output so far (`partial_response`)
+    
+    With `wait`, this is a long-poll: the response is held (up to `wait` seconds,
+    capped at JOB_MAX_WAIT) until the job has more than `since` characters of
+    output or has finished. Pass the length of the output already seen as `since`.
+    """
+    _require_jobs()
+    try:
+        job = await jobs.wait(job_id, since, max(0.0, min(wait, get_config().job_max_wait)))
+    except Exception as e:
+        logger.error(f"Error retrieving job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Get a finished job's result: Ollama's response, as /query returns it
+    
+    Answers 202 with a `Retry-After` header while the job is queued or running,
+    the job's error status if it failed, and 409 if it was cancelled.
+    """
+    _require_jobs()
+    try:
+        job = await jobs.get(job_id)
+    except Exception as e:
+        logger.error(f"Error retrieving job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status == "succeeded":
+        return job.result
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+    return _job_response(job, 202, {"Retry-After": "1"})
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (a finished job is left as it is)"""
+    _require_jobs()
+    try:
+        job = await jobs.cancel(job_id)
     except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
 
 # ==================== Utility Endpoints ====================
 
@@ -256,8 +1128,8 @@ async def get_recent_sessions(limit: int = 10):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        sessions = db_service.get_recent_sessions(limit=limit)
-        return sessions
+        sessions = await db_service.get_recent_sessions(limit=limit)
+        return _json_response(USER_SESSIONS.dump_json(sessions))
     except Exception as e:
         logger.error(f"Error retrieving recent sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -269,7 +1141,7 @@ async def delete_session(session_id: str):
         raise HTTPException(status_code=503, detail="Database service unavailable")
     
     try:
-        db_service.delete_session_data(session_id)
+        await db_service.delete_session_data(session_id)
         return {"message": "Session deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting session: {e}")
@@ -0,0 +1,80 @@
+"""
+Maintenance commands for the backend's blob storage.
+
+Usage (from backend/):
+    python -m app.maintenance compact-messages [--session-id ID]
+    python -m app.maintenance rebuild-session-index
+"""
+import argparse
+import asyncio
+import logging
+
+from .database import get_async_database_service
+
+logger = logging.getLogger(__name__)
+
+
+async def compact_messages(session_id: str = None) -> int:
+    """
+    Compact legacy per-message blobs into the segmented message log
+
+    Args:
+        session_id: Only compact this session; defaults to every session that
+            still has blobs under messages/
+
+    Returns:
+        Total number of legacy blobs compacted
+    """
+    db_service = await get_async_database_service()
+    try:
+        if session_id:
+            session_ids = [session_id]
+        else:
+            # Legacy paths look like messages/{session_id}/{message_id}.json
+            legacy_paths = await db_service.client.list_blobs("messages/")
+            session_ids = sorted({path.split("/")[1] for path in legacy_paths})
+
+        total = 0
+        for sid in session_ids:
+            total += await db_service.compact_legacy_messages(sid)
+
+        logger.info(f"Compacted {total} legacy messages across {len(session_ids)} sessions")
+        return total
+    finally:
+        await db_service.close()
+
+
+async def rebuild_session_index() -> int:
+    """
+    Rebuild the recency index used by GET /sessions from the session blobs
+    
+    Returns:
+        Number of sessions indexed
+    """
+    db_service = await get_async_database_service()
+    try:
+        return await db_service.rebuild_session_index()
+    finally:
+        await db_service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend storage maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact = subparsers.add_parser("compact-messages", help="Fold legacy per-message blobs into the message log")
+    compact.add_argument("--session-id", help="Only compact this session")
+    
+    subparsers.add_parser("rebuild-session-index", help="Rewrite the recent-sessions index from the session blobs")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "compact-messages":
+        asyncio.run(compact_messages(args.session_id))
+    elif args.command == "rebuild-session-index":
+        asyncio.run(rebuild_session_index())
+
+
+if __name__ == "__main__":
+    main()
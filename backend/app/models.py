@@ -1,7 +1,37 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional
 from datetime import datetime
 from uuid import uuid4
+import calendar
+import hashlib
+import os
+import time
+
+_CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def _ulid(millis: int, entropy: bytes) -> str:
+    value = (millis << 80) | int.from_bytes(entropy[:10], "big")
+    return "".join(_CROCKFORD_BASE32[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def new_message_id() -> str:
+    """
+    Generate a ULID: a 48-bit millisecond timestamp followed by 80 random bits,
+    encoded as 26 Crockford base32 characters. IDs sort lexicographically in
+    creation order.
+    """
+    return _ulid(int(time.time() * 1000), os.urandom(10))
+
+
+def derived_message_id(seed: str, at: datetime) -> str:
+    """
+    A ULID for the time `at` (naive UTC) whose random bits are a hash of seed,
+    so the same message (e.g. a job's answer) gets the same ID however often it
+    is built
+    """
+    millis = calendar.timegm(at.utctimetuple()) * 1000 + at.microsecond // 1000
+    return _ulid(millis, hashlib.sha256(seed.encode("utf-8")).digest())
 
 
 class UserSession(BaseModel):
@@ -20,7 +50,7 @@ class UserSession(BaseModel):
 
 class ChatMessage(BaseModel):
     """Model for chat message data"""
-    message_id: str = Field(default_factory=lambda: str(uuid4()))
+    message_id: str = Field(default_factory=new_message_id)
     session_id: str
     role: str  # "user", "model", or "system"
     message_text: str
@@ -34,12 +64,65 @@ class ChatMessage(BaseModel):
         }
 
 
+# Sorts after every message cursor, so before=LATEST_CURSOR reads the newest page
+LATEST_CURSOR = "latest"
+
+
+def message_cursor(message: ChatMessage) -> str:
+    """
+    Opaque pagination cursor for a message. Orders by timestamp, then ID, so it
+    also covers legacy messages whose IDs are random UUIDs.
+    """
+    return f"{message.timestamp:%Y%m%d%H%M%S%f}-{message.message_id}"
+
+
+# Bulk validators for stored data: a whole page is validated in one call, straight
+# from JSON text where possible, instead of one model construction per item
+CHAT_MESSAGES = TypeAdapter(List[ChatMessage])
+USER_SESSIONS = TypeAdapter(List[UserSession])
+
+
+def parse_message_lines(text: str) -> List[ChatMessage]:
+    """Validate the messages of a JSON Lines log segment in a single pass"""
+    return CHAT_MESSAGES.validate_json("[" + ",".join(line for line in text.splitlines() if line) + "]")
+
+
 class SessionMetadata(BaseModel):
     """Model for session metadata"""
     session_id: str
     last_active: datetime = Field(default_factory=datetime.utcnow)
     extension_version: Optional[str] = None
     cluster_used: Optional[str] = None
+    # Maintained on every message save/delete; None until first counted (sessions
+    # from before the counters existed are counted on their next write)
+    message_count: Optional[int] = None
+    tokens_total: Optional[int] = None
+    
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+
+class GenerationJob(BaseModel):
+    """Model for an asynchronous /query job, stored at jobs/{job_id}.json"""
+    job_id: str = Field(default_factory=lambda: str(uuid4()))
+    session_id: str
+    status: str = "queued"  # "queued", "running", "succeeded", "failed" or "cancelled"
+    request: dict  # The /query body
+    payload: dict  # Ollama /api/generate request, built (with history) at submission
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    attempts: int = 0
+    # Replica running the job and when it last renewed its lease
+    owner: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    partial_response: str = ""  # Output so far, checkpointed while running
+    result: Optional[dict] = None  # Ollama's final response (without the context array)
+    error: Optional[str] = None
+    error_status: Optional[int] = None  # HTTP status the error maps to
     
     class Config:
         json_encoders = {
@@ -73,4 +156,5 @@ class GetMessagesResponse(BaseModel):
     """Response model for retrieving messages"""
     session_id: str
     messages: list[ChatMessage]
-    total_count: int
+    total_count: int  # Taken from the session's message counter, for either kind of pagination
+    next_cursor: Optional[str] = None  # Pass as the same before/after parameter to continue
@@ -0,0 +1,268 @@
+import asyncio
+import httpx
+import logging
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from .config import get_config
+from .metrics import histogram
+from .ollama_router import EndpointRouter, OllamaEndpoint
+from .telemetry import span
+
+logger = logging.getLogger(__name__)
+
+GENERATION_SECONDS = histogram(
+    "ollama_generation_seconds",
+    "Time from sending a generation to its last token (excluding the admission queue), by model and mode",
+    ["model", "mode"]
+)
+FIRST_TOKEN_SECONDS = histogram(
+    "ollama_time_to_first_token_seconds",
+    "Time from sending a generation to its first token (streams: first chunk; otherwise Ollama's load + prompt eval time)",
+    ["model", "mode"]
+)
+TOKENS_PER_SECOND = histogram(
+    "ollama_tokens_per_second",
+    "Generation speed reported by Ollama (eval_count / eval_duration)",
+    ["model"],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+)
+
+
+def record_generation(model: str, mode: str, stats: Dict[str, Any], seconds: float, first_token: Optional[float] = None):
+    """
+    Observe a finished generation in the Ollama histograms
+
+    Args:
+        model: Model that generated
+        mode: 'stream' or 'full'
+        stats: The final response (or chunk) with Ollama's eval_count/eval_duration etc.
+        seconds: Time from sending the request to the last token
+        first_token: Time to the first token, if measured; otherwise derived from
+            Ollama's load_duration + prompt_eval_duration
+    """
+    GENERATION_SECONDS.observe(seconds, model=model, mode=mode)
+    if first_token is None and "prompt_eval_duration" in stats:
+        first_token = (stats.get("load_duration", 0) + stats["prompt_eval_duration"]) / 1e9
+    if first_token is not None:
+        FIRST_TOKEN_SECONDS.observe(first_token, model=model, mode=mode)
+    if stats.get("eval_count") and stats.get("eval_duration"):
+        TOKENS_PER_SECOND.observe(stats["eval_count"] / (stats["eval_duration"] / 1e9), model=model)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body stream that reports when it is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class OllamaClient:
+    """
+    Application-scoped client for the Ollama API
+
+    Wraps one long-lived httpx.AsyncClient so requests reuse pooled keep-alive
+    connections instead of paying TCP (and TLS) setup on every /query. Create it
+    in the FastAPI lifespan handler, start() it and close it on shutdown.
+
+    With several Ollama replicas, each request goes to the least-loaded healthy
+    one (see EndpointRouter); start() runs the background refresh that discovers
+    replicas, tracks their loaded models and reprobes ejected ones.
+    """
+
+    def __init__(
+        self,
+        base_url: Union[str, List[str]],
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        http2: bool = False,
+        discovery_url: Optional[str] = None,
+        refresh_interval: float = 10.0,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0
+    ):
+        """
+        Args:
+            base_url: Ollama server URL (e.g. 'http://ollama-service:11434'), or a
+                list of replica URLs to balance across
+            max_connections: Maximum concurrent connections in the pool
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept open
+            connect_timeout: Seconds to wait for a connection to be established
+            read_timeout: Seconds to wait between bytes of the response
+            http2: Negotiate HTTP/2 where the server supports it (needs the h2 package)
+            discovery_url: Headless service URL whose DNS name resolves to every
+                replica (e.g. 'http://ollama-headless:11434'); overrides base_url
+            refresh_interval: Seconds between endpoint discovery and health probes
+            eject_after: Consecutive failures before a replica is taken out of rotation
+            eject_seconds: Seconds before an ejected replica is reprobed
+        """
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("OLLAMA_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.base_url = urls[0] if urls else discovery_url
+        self.router = EndpointRouter(
+            [] if discovery_url else urls,
+            discovery_url=discovery_url,
+            eject_after=eject_after,
+            eject_seconds=eject_seconds
+        )
+        self.refresh_interval = refresh_interval
+        self.connect_timeout = connect_timeout
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            http2=http2
+        )
+        logger.info(
+            f"Ollama client for {discovery_url or ', '.join(urls)}: max_connections={max_connections}, "
+            f"keepalive={max_keepalive_connections}, http2={http2}"
+        )
+
+    async def start(self):
+        """Resolve endpoints and start the background refresh (only needed for several replicas)"""
+        if self.router.discovery_url or len(self.router.endpoints) > 1:
+            await self.router.refresh(self.http_client)
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.router.refresh(self.http_client)
+            except Exception as e:
+                logger.error(f"Error refreshing Ollama endpoints: {e}")
+
+    def _finish(self, endpoint: OllamaEndpoint, started: float, model: Optional[str], status_code: Optional[int]):
+        ok = status_code is not None and status_code < 500
+        self.router.finish(endpoint, time.monotonic() - started, ok, model if status_code == 200 else None)
+
+    async def _send(self, payload: Dict[str, Any], stream: bool, read_timeout: Optional[float] = None) -> httpx.Response:
+        """
+        POST /api/generate to the least-loaded replica
+
+        A replica that refuses the connection is marked failed and the request is
+        retried on the next one; nothing was sent, so the retry is safe.
+        read_timeout overrides the client's read timeout for this request.
+        """
+        model = payload.get("model")
+        timeout = httpx.Timeout(read_timeout, connect=self.connect_timeout) if read_timeout else httpx.USE_CLIENT_DEFAULT
+        attempts = max(1, len(self.router.endpoints))
+        for attempt in range(attempts):
+            endpoint = self.router.choose(model)
+            started = time.monotonic()
+            try:
+                request = self.http_client.build_request("POST", f"{endpoint.url}/api/generate", json=payload, timeout=timeout)
+                attributes = {"ollama.model": model, "ollama.endpoint": endpoint.url, "ollama.stream": stream}
+                with span("ollama.generate", attributes) as current:
+                    response = await self.http_client.send(request, stream=stream)
+                    if current is not None:
+                        current.set_attribute("http.status_code", response.status_code)
+            except httpx.ConnectError:
+                self._finish(endpoint, started, model, None)
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"Could not connect to Ollama endpoint {endpoint.url}, trying another")
+                continue
+            except BaseException:
+                self._finish(endpoint, started, model, None)
+                raise
+
+            if not stream:
+                self._finish(endpoint, started, model, response.status_code)
+                return response
+
+            # The replica counts the request as in flight until the body is closed
+            response.stream = _TrackedStream(
+                response.stream,
+                lambda: self._finish(endpoint, started, model, response.status_code)
+            )
+            return response
+
+    async def generate(self, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        Call /api/generate and wait for the full response
+
+        Args:
+            payload: Ollama generate request body
+
+        Returns:
+            The HTTP response (status is not checked)
+        """
+        return await self._send(payload, stream=False)
+
+    async def stream_generate(self, payload: Dict[str, Any], read_timeout: Optional[float] = None) -> httpx.Response:
+        """
+        Call /api/generate and return as soon as the response headers arrive
+
+        The caller must iterate the body and close the response with aclose().
+
+        Args:
+            payload: Ollama generate request body
+            read_timeout: Seconds to wait between bytes, instead of the client's default
+
+        Returns:
+            The streaming HTTP response (status is not checked)
+        """
+        return await self._send(payload, stream=True, read_timeout=read_timeout)
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        """True if at least one Ollama endpoint answers"""
+        async def probe(url: str) -> bool:
+            try:
+                response = await self.http_client.get(f"{url}/api/version", timeout=timeout)
+                return response.status_code < 500
+            except httpx.HTTPError:
+                return False
+
+        results = await asyncio.gather(*(probe(endpoint.url) for endpoint in list(self.router.endpoints.values())))
+        return any(results)
+
+    async def close(self):
+        """Stop the background refresh and close pooled connections"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+        await self.http_client.aclose()
+
+
+def create_ollama_client(base_url: Optional[str] = None) -> OllamaClient:
+    """Create an Ollama client from configuration"""
+    config = get_config()
+    urls = [url.strip() for url in config.ollama_urls.split(",") if url.strip()]
+    return OllamaClient(
+        base_url or urls or config.ollama_url,
+        max_connections=config.ollama_max_connections,
+        max_keepalive_connections=config.ollama_max_keepalive_connections,
+        keepalive_expiry=config.ollama_keepalive_expiry,
+        connect_timeout=config.ollama_connect_timeout,
+        read_timeout=config.ollama_read_timeout,
+        http2=config.ollama_http2,
+        discovery_url=None if base_url else config.ollama_discovery_url,
+        refresh_interval=config.ollama_refresh_interval,
+        eject_after=config.ollama_eject_after,
+        eject_seconds=config.ollama_eject_seconds
+    )
@@ -0,0 +1,190 @@
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import socket
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class NoEndpointsError(Exception):
+    """There is no Ollama endpoint to send a request to (e.g. discovery resolved none)"""
+
+
+class OllamaEndpoint:
+    """Routing state for one Ollama replica"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        # Moving average of request duration in seconds (None until the first request)
+        self.latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.loaded_models: Set[str] = set()
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "ejected": self.ejected,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
+class EndpointRouter:
+    """
+    Picks the Ollama replica for each request
+
+    Routes to the healthy endpoint with the fewest requests in flight, breaking
+    ties on recent latency, and prefers endpoints that already have the model
+    loaded unless they are more than affinity_slack requests busier. Endpoints
+    are ejected after eject_after consecutive failures and reprobed once
+    eject_seconds have passed.
+
+    Endpoints come from a static URL list, or from resolving a headless service's
+    DNS name (discovery_url, e.g. 'http://ollama-headless:11434') on every refresh.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        discovery_url: Optional[str] = None,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        affinity_slack: int = 2,
+        latency_decay: float = 0.3
+    ):
+        """
+        Args:
+            urls: Static endpoint URLs
+            discovery_url: URL whose host resolves to one address per replica
+            eject_after: Consecutive failures before an endpoint is ejected
+            eject_seconds: Seconds an ejected endpoint is skipped before reprobing
+            affinity_slack: Extra in-flight requests tolerated to reach a replica
+                that already has the model loaded
+            latency_decay: Weight of the newest sample in the latency average
+        """
+        self.discovery_url = discovery_url
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.affinity_slack = affinity_slack
+        self.latency_decay = latency_decay
+        self.endpoints: Dict[str, OllamaEndpoint] = {url.rstrip("/"): OllamaEndpoint(url) for url in urls}
+
+    def _candidates(self) -> List[OllamaEndpoint]:
+        endpoints = list(self.endpoints.values())
+        healthy = [endpoint for endpoint in endpoints if not endpoint.ejected]
+        # With every replica ejected, fail open rather than refusing all traffic
+        return healthy or endpoints
+
+    def choose(self, model: Optional[str] = None) -> OllamaEndpoint:
+        """
+        Pick the endpoint for a request and count it as in flight; pair with finish()
+
+        Raises:
+            NoEndpointsError: No endpoint is configured or discovered
+        """
+        candidates = self._candidates()
+        if not candidates:
+            raise NoEndpointsError("No Ollama endpoints available")
+
+        def load(endpoint: OllamaEndpoint):
+            return (endpoint.in_flight, endpoint.latency or 0.0)
+
+        best = min(candidates, key=load)
+        if model:
+            warm = [endpoint for endpoint in candidates if model in endpoint.loaded_models]
+            if warm:
+                best_warm = min(warm, key=load)
+                if best_warm.in_flight <= best.in_flight + self.affinity_slack:
+                    best = best_warm
+
+        best.in_flight += 1
+        return best
+
+    def finish(
+        self,
+        endpoint: OllamaEndpoint,
+        duration: float,
+        ok: bool,
+        model: Optional[str] = None
+    ):
+        """Record the outcome of a request started with choose()"""
+        endpoint.in_flight -= 1
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+            if endpoint.latency is None:
+                endpoint.latency = duration
+            else:
+                endpoint.latency += self.latency_decay * (duration - endpoint.latency)
+            if model:
+                endpoint.loaded_models.add(model)
+            return
+
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.eject_after and not endpoint.ejected:
+            logger.warning(
+                f"Ejecting Ollama endpoint {endpoint.url} for {self.eject_seconds}s "
+                f"after {endpoint.consecutive_failures} consecutive failures"
+            )
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def _discover(self):
+        """Replace the endpoint set with the addresses the discovery host resolves to"""
+        parts = urlsplit(self.discovery_url)
+        port = parts.port or 11434
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        urls = set()
+        for family, _, _, _, sockaddr in infos:
+            host = f"[{sockaddr[0]}]" if family == socket.AF_INET6 else sockaddr[0]
+            urls.add(f"{parts.scheme}://{host}:{port}")
+        if not urls:
+            return
+
+        for url in urls - self.endpoints.keys():
+            logger.info(f"Discovered Ollama endpoint {url}")
+            self.endpoints[url] = OllamaEndpoint(url)
+        for url in self.endpoints.keys() - urls:
+            # Keep endpoints that still have requests in flight until they drain
+            if self.endpoints[url].in_flight == 0:
+                logger.info(f"Ollama endpoint {url} is gone")
+                del self.endpoints[url]
+
+    async def _probe(self, http_client: httpx.AsyncClient, endpoint: OllamaEndpoint):
+        """Refresh the endpoint's loaded models; reinstates an ejected endpoint on success"""
+        try:
+            response = await http_client.get(f"{endpoint.url}/api/ps")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            if endpoint.ejected_until:
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            logger.debug(f"Probe of Ollama endpoint {endpoint.url} failed: {e}")
+            return
+
+        endpoint.loaded_models = {model["name"] for model in response.json().get("models", [])}
+        if endpoint.ejected_until:
+            logger.info(f"Ollama endpoint {endpoint.url} is healthy again")
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+
+    async def refresh(self, http_client: httpx.AsyncClient):
+        """Re-resolve endpoints (if discovering) and probe every endpoint"""
+        if self.discovery_url:
+            try:
+                await self._discover()
+            except OSError as e:
+                logger.error(f"Error resolving Ollama endpoints from {self.discovery_url}: {e}")
+        await asyncio.gather(*(self._probe(http_client, endpoint) for endpoint in list(self.endpoints.values())))
+
+    def stats(self) -> dict:
+        """Per-endpoint routing state"""
+        return {url: endpoint.stats() for url, endpoint in self.endpoints.items()}
@@ -0,0 +1,270 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+
+from .config import get_config
+from .metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT = gauge("outbox_in_flight", "Background writes running or waiting to be retried")
+WRITES = counter("outbox_writes_total", "Background writes by outcome (ok, retried, spilled, replayed)", ["outcome"])
+
+
+class Outbox:
+    """
+    Runs persistence off the request path
+
+    Each write is a named operation with JSON-serializable arguments, run as a
+    tracked background task. Writes sharing a key (a session) run in submission
+    order, so a session's answer is never stored before its question. A failed
+    write is retried with backoff; once its attempts are used up (or it is still
+    pending at shutdown) it is appended to a spill file on local disk, which is
+    replayed every replay_interval seconds and at startup, so writes made while
+    storage is down are applied once it is back. Spilled writes are only as
+    durable as that disk: they are replayed by the next process to use the same
+    path, and lost if the disk goes away with the pod.
+
+    Delivery is at-least-once: a write whose storage call landed but whose
+    reply was lost is run again. An operation that is not safe to repeat
+    registers a retry handler, which is called instead of the handler on every
+    later attempt and for replayed writes, and must skip whatever already
+    landed. Writes that are several storage calls should be submitted as one
+    operation per call, so a retry repeats only the step that failed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        attempts: int = 3,
+        initial_delay: float = 0.5,
+        max_delay: float = 5.0,
+        replay_interval: float = 30.0
+    ):
+        """
+        Args:
+            path: Spill file for writes that could not be applied
+            attempts: Tries per write before it is spilled
+            initial_delay: Seconds before the first retry, doubled per retry
+            max_delay: Cap on the delay between retries
+            replay_interval: Seconds between replays of the spill file
+        """
+        self.path = os.path.abspath(path)
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.replay_interval = replay_interval
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._retry_handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # key -> newest write submitted for it, which later writes wait for
+        self._latest: Dict[str, asyncio.Task] = {}
+        self._file_lock = asyncio.Lock()
+        self._replay_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def register(
+        self,
+        operation: str,
+        handler: Callable[..., Awaitable[Any]],
+        retry_handler: Optional[Callable[..., Awaitable[Any]]] = None
+    ):
+        """
+        Name the coroutine that applies an operation; it is called with the submitted arguments
+
+        Args:
+            retry_handler: Called instead of handler when the write may already
+                have been applied (after a failed attempt, and on replay)
+        """
+        self._handlers[operation] = handler
+        self._retry_handlers[operation] = retry_handler or handler
+
+    def submit(self, key: str, operation: str, arguments: Dict[str, Any], retry: bool = False) -> asyncio.Task:
+        """Start a write in the background, after any earlier write with the same key"""
+        if operation not in self._handlers:
+            raise ValueError(f"Unknown outbox operation '{operation}'")
+
+        record = {"key": key, "operation": operation, "arguments": arguments}
+        if retry:
+            record["retry"] = True
+        task = self._spawn(self._run(self._latest.get(key), record))
+        self._latest[key] = task
+        task.add_done_callback(lambda done: self._latest.get(key) is done and self._latest.pop(key))
+        return task
+
+    def track(self, coro: Awaitable[Any]) -> asyncio.Task:
+        """Run a best-effort coroutine in the background (waited for on close, never spilled)"""
+        return self._spawn(self._run_tracked(coro))
+
+    def _spawn(self, coro: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        IN_FLIGHT.set(len(self._tasks))
+
+        def forget(done: asyncio.Task):
+            self._tasks.discard(done)
+            IN_FLIGHT.set(len(self._tasks))
+
+        task.add_done_callback(forget)
+        return task
+
+    async def wait(self, key: str, timeout: Optional[float] = None) -> bool:
+        """Wait for the writes submitted so far for key; False if they are still running after timeout"""
+        task = self._latest.get(key)
+        if task is None:
+            return True
+        done, _ = await asyncio.wait([task], timeout=timeout)
+        return bool(done)
+
+    @staticmethod
+    async def _run_tracked(coro: Awaitable[Any]):
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"Background task failed: {e}")
+
+    async def _run(self, previous: Optional[asyncio.Task], record: Dict[str, Any]):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+
+            delay = self.initial_delay
+            for attempt in range(1, self.attempts + 1):
+                handlers = self._retry_handlers if attempt > 1 or record.get("retry") else self._handlers
+                try:
+                    await handlers[record["operation"]](**record["arguments"])
+                    WRITES.inc(outcome="ok")
+                    return
+                except Exception as e:
+                    logger.warning(
+                        f"Outbox {record['operation']} for {record['key']} failed "
+                        f"(attempt {attempt}/{self.attempts}): {e}"
+                    )
+                if attempt < self.attempts:
+                    WRITES.inc(outcome="retried")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_delay)
+        except asyncio.CancelledError:
+            # Spilled after the write it was waiting for, to keep the key's order
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            await self._spill([record])
+            raise
+
+        await self._spill([record])
+
+    async def _spill(self, records: List[Dict[str, Any]]):
+        """Append writes to the spill file so they survive until storage is back"""
+        # Replayed with the retry handler: the write may have landed before it failed
+        lines = "".join(json.dumps({**record, "retry": True}, default=str) + "\n" for record in records)
+        async with self._file_lock:
+            await asyncio.to_thread(self._append, self.path, lines)
+        WRITES.inc(len(records), outcome="spilled")
+        logger.error(f"Spilled {len(records)} outbox writes to {self.path}")
+
+    @staticmethod
+    def _append(path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _take_spilled(self) -> List[Dict[str, Any]]:
+        """
+        Move the spill file aside for replay and return its writes
+
+        A replay file left over from a crash mid-replay is picked up first, so
+        its writes keep their order ahead of newer ones.
+        """
+        replay_path = self.path + ".replay"
+        records = []
+        for path in (replay_path, self.path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash while spilling
+                    logger.error(f"Skipping unreadable outbox record in {path}")
+        if not records:
+            return []
+
+        temp = replay_path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, replay_path)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return records
+
+    async def replay(self) -> int:
+        """Re-submit spilled writes and wait for them; those that fail again are spilled again"""
+        async with self._file_lock:
+            records = await asyncio.to_thread(self._take_spilled)
+        if not records:
+            return 0
+
+        logger.info(f"Replaying {len(records)} spilled outbox writes")
+        tasks = []
+        for record in records:
+            if record.get("operation") not in self._handlers:
+                logger.error(f"Dropping spilled write with unknown operation: {record.get('operation')}")
+                continue
+            tasks.append(self.submit(record["key"], record["operation"], record["arguments"], retry=True))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        async with self._file_lock:
+            await asyncio.to_thread(os.remove, self.path + ".replay")
+        WRITES.inc(len(tasks), outcome="replayed")
+        return len(tasks)
+
+    def start(self):
+        """Replay the spill file now and every replay_interval seconds"""
+        if self._replay_task is None:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    async def _replay_loop(self):
+        while True:
+            try:
+                await self.replay()
+            except Exception as e:
+                logger.error(f"Error replaying outbox: {e}")
+            await asyncio.sleep(self.replay_interval)
+
+    async def close(self, timeout: Optional[float] = None):
+        """Stop replaying and wait up to timeout for background writes; unfinished ones are spilled"""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(list(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} outbox writes still running at shutdown, spilling them")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def create_outbox() -> Outbox:
+    """Create the outbox from configuration"""
+    config = get_config()
+    return Outbox(
+        config.outbox_path,
+        attempts=config.outbox_attempts,
+        initial_delay=config.outbox_retry_initial_delay,
+        max_delay=config.outbox_retry_max_delay,
+        replay_interval=config.outbox_replay_interval
+    )
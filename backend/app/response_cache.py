@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import logging
+import time
+
+from .storage import StorageBackend
+from .config import get_config
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Write markers of shared cache entries: response-cache-index/{epoch millis}-{key}.json
+CACHE_INDEX_PREFIX = "response-cache-index/"
+
+# Request fields that do not affect the generated text
+_IGNORED_PAYLOAD_FIELDS = {"stream", "keep_alive"}
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Cache key for an Ollama generate payload
+
+    The model name is lower-cased, whitespace in the prompt is collapsed and
+    generation options are serialized with sorted keys, so trivially different
+    requests for the same generation share a key.
+    """
+    normalized = {}
+    for field, value in payload.items():
+        if field in _IGNORED_PAYLOAD_FIELDS or value is None:
+            continue
+        if field == "model":
+            value = value.strip().lower()
+        elif field == "prompt":
+            value = " ".join(value.split())
+        normalized[field] = value
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(payload: Dict[str, Any]) -> bool:
+    """A generation is deterministic when it runs at temperature 0"""
+    options = payload.get("options") or {}
+    return options.get("temperature") == 0
+
+
+class CacheBackend:
+    """Storage interface for cached responses"""
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process LRU cache with TTL"""
+
+    def __init__(self, max_entries: int):
+        self.cache = TTLCache(max_entries)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        self.cache.set(key, value, ttl=ttl)
+
+
+class BlobCacheBackend(CacheBackend):
+    """
+    Cache shared by all backend replicas, stored under response-cache/ in blob storage
+
+    Expiry is checked on read. Every write also leaves an empty marker named
+    response-cache-index/{write time in millis}-{key}.json; listings are in name
+    order, so the markers list entries oldest first. Every prune_every writes the
+    replica lists the markers and deletes expired entries, and the oldest ones
+    beyond max_entries, along with markers superseded by a rewrite of their key.
+    Replicas prune independently, so the bound can be overshot by up to
+    prune_every writes per replica between prunes.
+    """
+
+    def __init__(self, client: StorageBackend, max_entries: int, ttl: float, prune_every: Optional[int] = None):
+        """
+        Args:
+            client: Storage backend holding the entries
+            max_entries: Entries kept; the oldest are deleted beyond that
+            ttl: Seconds entries live, for deleting expired ones
+            prune_every: Writes between prunes (default: a tenth of max_entries)
+        """
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_every = prune_every or max(1, max_entries // 10)
+        self._writes = 0
+
+    @staticmethod
+    def _entry_path(key: str) -> str:
+        return f"response-cache/{key}.json"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = await self.client.download_json(self._entry_path(key))
+        if not item or datetime.fromisoformat(item["expires_at"]) <= datetime.utcnow():
+            return None
+        return item["value"]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        item = {
+            "expires_at": (datetime.utcnow() + timedelta(seconds=ttl)).isoformat(),
+            "value": value
+        }
+        await self.client.upload_json(self._entry_path(key), item)
+        await self.client.upload_json(f"{CACHE_INDEX_PREFIX}{int(time.time() * 1000):013d}-{key}.json", {})
+
+        self._writes += 1
+        if self._writes >= self.prune_every:
+            self._writes = 0
+            await self.prune()
+
+    async def prune(self) -> int:
+        """
+        Delete expired entries and the oldest beyond max_entries
+
+        Returns:
+            The number of entries deleted
+        """
+        # key -> its markers, oldest first
+        markers: Dict[str, List[str]] = {}
+        async for name in self.client.iter_blob_names(CACHE_INDEX_PREFIX):
+            markers.setdefault(name[len(CACHE_INDEX_PREFIX) + 14:-len(".json")], []).append(name)
+
+        # Keys ordered by their latest write, oldest first
+        newest = sorted(markers, key=lambda key: markers[key][-1])
+        expired_before = f"{CACHE_INDEX_PREFIX}{int((time.time() - self.ttl) * 1000):013d}"
+        excess = max(0, len(newest) - self.max_entries)
+        evicted = [key for i, key in enumerate(newest) if i < excess or markers[key][-1] < expired_before]
+
+        superseded = [name for key in markers for name in markers[key][:-1]]
+        if evicted or superseded:
+            # Entries go before their markers, so a failed prune leaves no entry unindexed
+            await self.client.delete_many([self._entry_path(key) for key in evicted])
+            await self.client.delete_many([markers[key][-1] for key in evicted] + superseded)
+            logger.info(f"Pruned {len(evicted)} response cache entries and {len(superseded)} superseded markers")
+        return len(evicted)
+
+
+class ResponseCache:
+    """
+    Opt-in cache of Ollama responses keyed on normalized (model, prompt, options)
+
+    Deterministic (temperature 0) requests are cacheable by default; other
+    requests only when the caller explicitly allows it. Cache failures never
+    fail a query.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_cacheable(payload: Dict[str, Any], allow_nondeterministic: bool = False) -> bool:
+        return allow_nondeterministic or is_deterministic(payload)
+
+    async def get(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached Ollama response for payload, if any"""
+        try:
+            value = await self.backend.get(cache_key(payload))
+        except Exception as e:
+            logger.error(f"Error reading response cache: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, payload: Dict[str, Any], ollama_response: Dict[str, Any]):
+        """Cache a completed Ollama response for payload"""
+        try:
+            await self.backend.set(cache_key(payload), ollama_response, self.ttl)
+        except Exception as e:
+            logger.error(f"Error writing response cache: {e}")
+
+
+def create_response_cache(client: Optional[StorageBackend] = None) -> Optional[ResponseCache]:
+    """
+    Create the response cache from configuration
+
+    Returns:
+        The cache, or None when RESPONSE_CACHE_ENABLED is off (or the blob backend
+        is selected but storage is unavailable)
+    """
+    config = get_config()
+    if not config.response_cache_enabled:
+        return None
+
+    if config.response_cache_backend == "blob":
+        if client is None:
+            logger.error("Blob response cache selected but blob storage is unavailable; cache disabled")
+            return None
+        backend = BlobCacheBackend(client, config.response_cache_max_entries, config.response_cache_ttl)
+    else:
+        backend = InMemoryCacheBackend(config.response_cache_max_entries)
+
+    logger.info(f"Response cache enabled: backend={config.response_cache_backend}, ttl={config.response_cache_ttl}s")
+    return ResponseCache(backend, config.response_cache_ttl)
@@ -0,0 +1,182 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStream:
+    """
+    One upstream stream fanned out to any number of subscribers
+
+    A background task opens the upstream and buffers every chunk; each subscriber
+    replays the buffer from the start and then follows new chunks, so late joiners
+    see the whole stream. The upstream is cancelled when the last subscriber
+    leaves before it finishes.
+    """
+
+    def __init__(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterator[str]]],
+        on_finished: Optional[Callable[["SharedStream"], None]] = None
+    ):
+        """
+        Args:
+            open_stream: Coroutine factory that starts the upstream request (raising
+                if it fails) and returns an async iterator over its chunks
+            on_finished: Called once the upstream is finished or cancelled
+        """
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_finished = on_finished
+        self._changed = asyncio.Condition()
+        self._opened = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(open_stream))
+
+    async def _run(self, open_stream: Callable[[], Awaitable[AsyncIterator[str]]]):
+        chunks = None
+        try:
+            chunks = await open_stream()
+            self._opened.set_result(None)
+            async for chunk in chunks:
+                self.chunks.append(chunk)
+                async with self._changed:
+                    self._changed.notify_all()
+        except asyncio.CancelledError as e:
+            self.error = e
+            if not self._opened.done():
+                self._opened.cancel()
+        except Exception as e:
+            self.error = e
+            if not self._opened.done():
+                self._opened.set_exception(e)
+                self._opened.exception()  # Mark retrieved; subscribers re-raise it from opened()
+        finally:
+            if chunks is not None and hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            self.done = True
+            async with self._changed:
+                self._changed.notify_all()
+            if self._on_finished:
+                self._on_finished(self)
+
+    def join(self):
+        """Register a subscriber; pair with iterate() or leave()"""
+        self.subscribers += 1
+
+    def leave(self):
+        """Unregister a subscriber, cancelling the upstream if nobody is left"""
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            logger.info("Last subscriber left, cancelling upstream stream")
+            if self._on_finished:
+                self._on_finished(self)
+            self._task.cancel()
+
+    async def opened(self):
+        """Wait until the upstream has started streaming; re-raises its opening error"""
+        await asyncio.shield(self._opened)
+
+    async def iterate(self) -> AsyncIterator[str]:
+        """Yield every chunk from the start of the stream, then leave"""
+        index = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                        raise self.error
+                    return
+        finally:
+            self.leave()
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls onto one in-flight execution
+
+    Callers with the same key while a call is in flight wait for, and share, its
+    result (or exception). A caller that is cancelled does not cancel the shared
+    call unless it was the last one waiting.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, SharedStream] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn, or join an in-flight run with the same key
+
+        Returns:
+            The result and whether it was shared with an earlier caller
+        """
+        if not self.enabled:
+            return await fn(), False
+
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget_call(key, call))
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                self._forget_call(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget_call(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def join_stream(
+        self,
+        key: str,
+        open_stream: Callable[[], Awaitable[AsyncIterator[str]]]
+    ) -> Tuple[SharedStream, bool]:
+        """
+        Subscribe to the in-flight stream with this key, starting it if needed
+
+        The caller must either iterate() the returned stream or call leave().
+
+        Returns:
+            The shared stream and whether it was already in flight
+        """
+        stream = self._streams.get(key) if self.enabled else None
+        shared = stream is not None
+        if stream is None:
+            stream = SharedStream(open_stream, lambda s: self._forget_stream(key, s))
+            if self.enabled:
+                self._streams[key] = stream
+        else:
+            self.coalesced += 1
+
+        stream.join()
+        return stream, shared
+
+    def _forget_stream(self, key: str, stream: SharedStream):
+        if self._streams.get(key) is stream:
+            del self._streams[key]
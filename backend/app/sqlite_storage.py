@@ -0,0 +1,292 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import uuid
+
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+from .storage import DEFAULT_BULK_CONCURRENCY, BulkResult, StorageBackend, VersionedJson
+
+logger = logging.getLogger(__name__)
+
+# Names read per listing query when no page size is given
+DEFAULT_PAGE_SIZE = 1000
+
+# Bound parameters per IN (...) query of the bulk operations
+BULK_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    path TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    etag TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS appends (
+    path TEXT NOT NULL,
+    end_offset INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (path, end_offset)
+) WITHOUT ROWID;
+"""
+
+
+def _new_etag() -> str:
+    return f'"{uuid.uuid4().hex}"'
+
+
+def _prefix_end(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with prefix"""
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _chunks(items: List[str]):
+    for start in range(0, len(items), BULK_CHUNK):
+        chunk = items[start:start + BULK_CHUNK]
+        yield chunk, ",".join("?" * len(chunk))
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Storage backend that keeps objects as rows of a SQLite table
+
+    The blobs table is clustered on the object path, and the paths encode what the
+    database service queries by: the session id, then a time-ordered key (message
+    log segment number, ULID message id, or the inverted timestamp of a
+    session-index entry). Listing a prefix is therefore an index range scan, so
+    message pagination and the recent-sessions query read only the rows they
+    return, and iter_blob_names pages through with keyset queries.
+
+    Appended blocks (the message log) are rows of their own in the appends
+    table, keyed by path and the object's size after the block, so an append
+    inserts one row instead of rewriting the object; the object's row in blobs
+    holds its ETag (and any content it had before its first append). Reads
+    concatenate the blocks in order.
+
+    One connection is used from a single worker thread, which serializes all
+    statements and makes conditional writes atomic.
+    """
+
+    def __init__(self, database: str, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            database: Path of the SQLite database file (':memory:' for a throwaway store)
+            max_concurrency: Default concurrency limit for bulk operations
+        """
+        self.database = database
+        self.max_concurrency = max_concurrency or DEFAULT_BULK_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-storage")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self.database != ":memory:":
+            directory = os.path.dirname(os.path.abspath(self.database))
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.database, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self._connection = connection
+
+    async def initialize(self):
+        """Open the database and create the schema if needed"""
+        if self._connection is None:
+            await self._run(self._connect)
+            logger.info(f"SQLite storage at '{self.database}'")
+
+    async def close(self):
+        """Close the connection and the worker thread"""
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    def _transaction(self, fn: Callable[..., Any], *args) -> Any:
+        self._connection.execute("BEGIN")
+        try:
+            result = fn(*args)
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return result
+
+    def _get(self, blob_path: str) -> Optional[tuple]:
+        """The object's (content, etag), with any appended blocks, or None"""
+        row = self._connection.execute(
+            "SELECT data, etag FROM blobs WHERE path = ?", (blob_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        blocks = [block for block, in self._connection.execute(
+            "SELECT data FROM appends WHERE path = ? ORDER BY end_offset", (blob_path,)
+        )]
+        return (bytes(row[0]) + b"".join(blocks), row[1]) if blocks else row
+
+    def _put(self, blob_path: str, body: bytes, if_match: Optional[str], if_none_match: Optional[str]) -> str:
+        if if_match or if_none_match:
+            row = self._connection.execute("SELECT etag FROM blobs WHERE path = ?", (blob_path,)).fetchone()
+            if if_none_match == "*" and row is not None:
+                raise ResourceExistsError(f"The specified blob already exists: {blob_path}")
+            if if_match and (row is None or row[0] != if_match):
+                raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {blob_path}")
+        etag = _new_etag()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO blobs (path, data, etag) VALUES (?, ?, ?)", (blob_path, body, etag)
+        )
+        self._connection.execute("DELETE FROM appends WHERE path = ?", (blob_path,))
+        return etag
+
+    def _append(self, blob_path: str, data: bytes) -> int:
+        """Add one block after the object's content (creating it empty first); returns the new size"""
+        size, = self._connection.execute(
+            "SELECT MAX(end_offset) FROM appends WHERE path = ?", (blob_path,)
+        ).fetchone()
+        if size is None:
+            row = self._connection.execute("SELECT length(data) FROM blobs WHERE path = ?", (blob_path,)).fetchone()
+            size = row[0] if row else 0
+            if row is None:
+                self._connection.execute(
+                    "INSERT INTO blobs (path, data, etag) VALUES (?, ?, ?)", (blob_path, b"", _new_etag())
+                )
+        size += len(data)
+        self._connection.execute(
+            "INSERT INTO appends (path, end_offset, data) VALUES (?, ?, ?)", (blob_path, size, data)
+        )
+        self._connection.execute("UPDATE blobs SET etag = ? WHERE path = ?", (_new_etag(), blob_path))
+        return size
+
+    def _delete(self, blob_path: str, if_match: Optional[str]) -> int:
+        if if_match:
+            row = self._connection.execute("SELECT etag FROM blobs WHERE path = ?", (blob_path,)).fetchone()
+            if row is not None and row[0] != if_match:
+                raise ResourceModifiedError(f"The condition specified using HTTP conditional header(s) is not met: {blob_path}")
+        self._connection.execute("DELETE FROM appends WHERE path = ?", (blob_path,))
+        return self._connection.execute("DELETE FROM blobs WHERE path = ?", (blob_path,)).rowcount
+
+    def _names(self, prefix: str, after: Optional[str], limit: int) -> List[str]:
+        clauses, params = ["path >= ?"], [prefix]
+        end = _prefix_end(prefix)
+        if end is not None:
+            clauses.append("path < ?")
+            params.append(end)
+        if after is not None:
+            clauses.append("path > ?")
+            params.append(after)
+        query = f"SELECT path FROM blobs WHERE {' AND '.join(clauses)} ORDER BY path LIMIT ?"
+        return [row[0] for row in self._connection.execute(query, (*params, limit))]
+
+    def _get_many(self, blob_paths: List[str]) -> Dict[str, bytes]:
+        found = {}
+        for chunk, placeholders in _chunks(blob_paths):
+            for path, data in self._connection.execute(
+                f"SELECT path, data FROM blobs WHERE path IN ({placeholders})", chunk
+            ):
+                found[path] = bytes(data)
+            for path, data in self._connection.execute(
+                f"SELECT path, data FROM appends WHERE path IN ({placeholders}) ORDER BY path, end_offset", chunk
+            ):
+                if path in found:
+                    found[path] += data
+        return found
+
+    def _delete_many(self, blob_paths: List[str]):
+        for chunk, placeholders in _chunks(blob_paths):
+            self._connection.execute(f"DELETE FROM appends WHERE path IN ({placeholders})", chunk)
+            self._connection.execute(f"DELETE FROM blobs WHERE path IN ({placeholders})", chunk)
+
+    async def upload_json(
+        self,
+        blob_path: str,
+        data: Dict[str, Any],
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Store data as JSON
+
+        Raises:
+            ResourceModifiedError, ResourceExistsError: The condition was not met
+        """
+        body = json.dumps(data, default=str).encode("utf-8")
+        try:
+            return await self._run(self._transaction, self._put, blob_path, body, if_match, if_none_match)
+        except (ResourceModifiedError, ResourceExistsError):
+            logger.info(f"Conditional upload of {blob_path} did not match, not uploaded")
+            raise
+
+    async def download_json(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        """The parsed JSON object, or None if it doesn't exist"""
+        row = await self._run(self._get, blob_path)
+        return json.loads(row[0]) if row else None
+
+    async def download_json_versioned(self, blob_path: str, if_none_match: Optional[str] = None) -> VersionedJson:
+        """The parsed JSON object and its ETag, or modified=False if it still has ETag if_none_match"""
+        row = await self._run(self._get, blob_path)
+        if row is None:
+            return VersionedJson(None)
+        if if_none_match and row[1] == if_none_match:
+            return VersionedJson(None, row[1], modified=False)
+        return VersionedJson(json.loads(row[0]), row[1])
+
+    async def append_text(self, blob_path: str, text: str) -> int:
+        """Append text to an object, creating it if needed; returns its size in bytes afterwards"""
+        return await self._run(self._transaction, self._append, blob_path, text.encode("utf-8"))
+
+    async def download_text(self, blob_path: str) -> Optional[str]:
+        """The object decoded as UTF-8, or None if it doesn't exist"""
+        row = await self._run(self._get, blob_path)
+        return bytes(row[0]).decode("utf-8") if row else None
+
+    async def delete_blob(self, blob_path: str, if_match: Optional[str] = None) -> None:
+        """
+        Delete an object; a missing object is a no-op
+
+        Raises:
+            ResourceModifiedError: The object no longer has ETag if_match
+        """
+        if not await self._run(self._transaction, self._delete, blob_path, if_match):
+            logger.warning(f"Blob not found for deletion: {blob_path}")
+
+    async def iter_blob_names(self, prefix: str = "", page_size: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield paths starting with prefix in path order, one keyset page at a time"""
+        limit = page_size or DEFAULT_PAGE_SIZE
+        after = None
+        while True:
+            names = await self._run(self._names, prefix, after, limit)
+            for name in names:
+                yield name
+            if len(names) < limit:
+                return
+            after = names[-1]
+
+    async def download_many(self, blob_paths: List[str], concurrency: Optional[int] = None,
+                            as_text: bool = False) -> List[BulkResult]:
+        """Download many JSON (or text) objects in a few IN (...) queries; data is None for missing objects"""
+        found = await self._run(self._get_many, list(blob_paths))
+        results = []
+        for path in blob_paths:
+            data = found.get(path)
+            try:
+                if data is not None:
+                    data = bytes(data).decode("utf-8") if as_text else json.loads(data)
+                results.append(BulkResult(path, data=data))
+            except Exception as e:
+                results.append(BulkResult(path, error=e))
+        return results
+
+    async def delete_many(self, blob_paths: List[str], concurrency: Optional[int] = None) -> List[BulkResult]:
+        """Delete many objects in one transaction; missing objects are a no-op"""
+        try:
+            await self._run(self._transaction, self._delete_many, list(blob_paths))
+        except Exception as e:
+            return [BulkResult(path, error=e) for path in blob_paths]
+        return [BulkResult(path) for path in blob_paths]
@@ -0,0 +1,257 @@
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import functools
+import inspect
+import logging
+import time
+
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+from .config import get_config
+from .metrics import histogram
+from .telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent requests issued by the bulk operations
+DEFAULT_BULK_CONCURRENCY = 16
+
+STORAGE_BACKENDS = ("azure", "filesystem", "sqlite")
+
+# Operations timed and traced on every backend (iter_blob_names is timed through list_blobs)
+STORAGE_OPERATIONS = (
+    "upload_json", "download_json", "download_json_versioned", "append_text", "download_text",
+    "delete_blob", "list_blobs", "download_many", "delete_many", "blob_exists"
+)
+
+OPERATION_SECONDS = histogram(
+    "storage_operation_seconds",
+    "Storage calls by operation, top-level path prefix and outcome (ok, conflict, error)",
+    ["operation", "prefix", "outcome"]
+)
+
+
+def _path_prefix(args: tuple, kwargs: dict) -> str:
+    """Top-level prefix of the path (or first of the paths) an operation works on, e.g. 'message-log'"""
+    target = args[0] if args else next(
+        (kwargs[name] for name in ("blob_path", "blob_paths", "prefix") if name in kwargs), ""
+    )
+    if isinstance(target, (list, tuple)):
+        target = target[0] if target else ""
+    return str(target).split("/", 1)[0]
+
+
+def _outcome(error: Optional[BaseException]) -> str:
+    if error is None:
+        return "ok"
+    return "conflict" if isinstance(error, (ResourceModifiedError, ResourceExistsError)) else "error"
+
+
+def _instrument(operation: str, fn: Callable) -> Callable:
+    """Wrap a storage method (sync or async) in a span and the storage_operation_seconds histogram"""
+    def record(prefix: str, started: float, error: Optional[BaseException]):
+        OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, prefix=prefix, outcome=_outcome(error))
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            prefix = _path_prefix(args, kwargs)
+            started = time.perf_counter()
+            with span(f"storage.{operation}", {"storage.operation": operation, "storage.prefix": prefix}):
+                try:
+                    result = await fn(self, *args, **kwargs)
+                except BaseException as e:
+                    record(prefix, started, e)
+                    raise
+            record(prefix, started, None)
+            return result
+    else:
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            prefix = _path_prefix(args, kwargs)
+            started = time.perf_counter()
+            with span(f"storage.{operation}", {"storage.operation": operation, "storage.prefix": prefix}):
+                try:
+                    result = fn(self, *args, **kwargs)
+                except BaseException as e:
+                    record(prefix, started, e)
+                    raise
+            record(prefix, started, None)
+            return result
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_storage_operations(cls):
+    """Time and trace the STORAGE_OPERATIONS that cls defines itself (class decorator)"""
+    for operation in STORAGE_OPERATIONS:
+        fn = cls.__dict__.get(operation)
+        if fn is not None and not getattr(fn, "instrumented", False):
+            setattr(cls, operation, _instrument(operation, fn))
+    return cls
+
+
+@dataclass
+class BulkResult:
+    """Outcome of one item of a bulk operation, in the same order as the input paths"""
+    path: str
+    data: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class VersionedJson:
+    """A JSON blob together with its ETag"""
+    data: Optional[Dict[str, Any]]  # None when the blob does not exist (or was not modified)
+    etag: Optional[str] = None
+    modified: bool = True  # False when a conditional download found the blob unchanged
+
+
+class StorageBackend:
+    """
+    Object store used by the database service and the response cache
+
+    Objects are addressed by '/'-separated paths (e.g. 'sessions/{id}.json') and
+    listed in path order. Writes can be made conditional on the object's ETag with
+    Azure Blob semantics: a failed condition raises
+    azure.core.exceptions.ResourceModifiedError (or ResourceExistsError), whatever
+    the backend, so callers handle conflicts the same way everywhere.
+
+    Implementations: AsyncBlobStorageClient (Azure Blob Storage), FilesystemStorage
+    and SqliteStorage (local development and benchmarks). Their STORAGE_OPERATIONS
+    are timed and traced automatically.
+    """
+
+    max_concurrency = DEFAULT_BULK_CONCURRENCY
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_storage_operations(cls)
+
+    async def initialize(self):
+        """Prepare the store (create the container, directory or schema)"""
+
+    async def close(self):
+        """Release connections and other resources"""
+
+    async def ping(self):
+        """Check that the store is reachable with one cheap request; raises if it is not"""
+        async for _ in self.iter_blob_names("sessions/", page_size=1):
+            break
+
+    async def upload_json(
+        self,
+        blob_path: str,
+        data: Dict[str, Any],
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Optional[str]:
+        """Store data as JSON, optionally only if the ETag matches or the object is missing; returns the new ETag"""
+        raise NotImplementedError
+
+    async def download_json(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        """The parsed JSON object, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    async def download_json_versioned(self, blob_path: str, if_none_match: Optional[str] = None) -> VersionedJson:
+        """The parsed JSON object and its ETag, or modified=False if it still has ETag if_none_match"""
+        raise NotImplementedError
+
+    async def append_text(self, blob_path: str, text: str) -> int:
+        """Append text to an object, creating it if needed; returns its size in bytes afterwards"""
+        raise NotImplementedError
+
+    async def download_text(self, blob_path: str) -> Optional[str]:
+        """The object decoded as UTF-8, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    async def delete_blob(self, blob_path: str, if_match: Optional[str] = None) -> None:
+        """Delete an object, optionally only if the ETag matches; a missing object is a no-op"""
+        raise NotImplementedError
+
+    async def list_blobs(self, prefix: str = "") -> List[str]:
+        """All paths starting with prefix, in path order"""
+        return [path async for path in self.iter_blob_names(prefix)]
+
+    def iter_blob_names(self, prefix: str = "", page_size: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield paths starting with prefix in path order, reading page_size names at a time"""
+        raise NotImplementedError
+
+    async def download_many(self, blob_paths: List[str], concurrency: Optional[int] = None,
+                            as_text: bool = False) -> List[BulkResult]:
+        """Download many JSON (or text) objects; one BulkResult per path, in input order"""
+        download = self.download_text if as_text else self.download_json
+        return await self._run_bulk(blob_paths, download, concurrency)
+
+    async def delete_many(self, blob_paths: List[str], concurrency: Optional[int] = None) -> List[BulkResult]:
+        """Delete many objects; one BulkResult per path, in input order"""
+        return await self._run_bulk(blob_paths, self.delete_blob, concurrency)
+
+    async def blob_exists(self, blob_path: str) -> bool:
+        """Check if an object exists"""
+        return await self.download_text(blob_path) is not None
+
+    async def _run_bulk(self, blob_paths: List[str], operation: Callable[[str], Awaitable[Any]],
+                        concurrency: Optional[int]) -> List[BulkResult]:
+        """Run operation over blob_paths with at most `concurrency` in flight, collecting per-item errors"""
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+
+        async def run(path: str) -> BulkResult:
+            async with semaphore:
+                try:
+                    return BulkResult(path, data=await operation(path))
+                except Exception as e:
+                    return BulkResult(path, error=e)
+
+        return list(await asyncio.gather(*(run(path) for path in blob_paths)))
+
+
+instrument_storage_operations(StorageBackend)
+
+
+def create_storage_backend(max_concurrency: Optional[int] = None) -> StorageBackend:
+    """
+    Create the storage backend selected by STORAGE_BACKEND (not yet initialized)
+
+    Args:
+        max_concurrency: Default concurrency limit for bulk operations
+    """
+    config = get_config()
+    backend = config.storage_backend
+    logger.info(f"Storage backend: {backend}")
+
+    if backend == "azure":
+        from .blob_client import AsyncBlobStorageClient
+        return AsyncBlobStorageClient(max_concurrency=max_concurrency)
+    if backend == "filesystem":
+        from .filesystem_storage import FilesystemStorage
+        return FilesystemStorage(config.storage_path, max_concurrency=max_concurrency or config.blob_max_concurrency)
+    if backend == "sqlite":
+        from .sqlite_storage import SqliteStorage
+        return SqliteStorage(config.sqlite_path, max_concurrency=max_concurrency or config.blob_max_concurrency)
+
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of: {', '.join(STORAGE_BACKENDS)}")
+
+
+# Singleton instance
+_storage_backend: Optional[StorageBackend] = None
+
+
+async def get_storage_backend() -> StorageBackend:
+    """Get or create the storage backend singleton used by the API"""
+    global _storage_backend
+    if _storage_backend is None:
+        backend = create_storage_backend()
+        try:
+            await backend.initialize()
+        except BaseException:
+            await backend.close()
+            raise
+        _storage_backend = backend
+    return _storage_backend
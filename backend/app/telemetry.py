@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import logging
+import os
+import time
+
+from .metrics import histogram
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional: spans are skipped without the OpenTelemetry API
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("ai-assistant-backend") if trace is not None else None
+
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "API request latency (until the response body is complete) by method, route and status",
+    ["method", "route", "status"]
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing every HTTP request in http_request_duration_seconds
+
+    Requests are labeled with their route template ('/sessions/{session_id}'),
+    not the raw path, so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status)
+            )
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """
+    Run the block in a span that is a child of the current one (the /query request, say)
+
+    Yields the span, or None when OpenTelemetry is not installed. Exceptions
+    raised in the block are recorded on the span and re-raised.
+    """
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Start a child of the current span without making it current; the caller ends it
+
+    For work that outlives the block it starts in, such as a relayed token stream.
+    Returns None when OpenTelemetry is not installed.
+    """
+    if tracer is None:
+        return None
+    return tracer.start_span(name, attributes=attributes)
+
+
+def end_span(current: Any, error: Optional[BaseException] = None, **attributes: Any):
+    """End a span from start_span(), recording error and extra attributes on it"""
+    if current is None:
+        return
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+    current.end()
+
+
+def configure_telemetry(app) -> bool:
+    """
+    Export traces to Azure Monitor and trace every request of app
+
+    Runs at import time, before the app starts (request middleware cannot be
+    added later), so it reads APPLICATIONINSIGHTS_CONNECTION_STRING from the
+    environment rather than from Key Vault. Without it, or without the
+    azure-monitor-opentelemetry package, spans stay no-ops unless a tracer
+    provider is configured some other way (e.g. opentelemetry-instrument).
+
+    Returns:
+        True if the Azure Monitor exporter was configured
+    """
+    exporting = False
+    connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+    if connection_string:
+        try:
+            from azure.monitor.opentelemetry import configure_azure_monitor
+            configure_azure_monitor(connection_string=connection_string)
+            exporting = True
+            logger.info("Exporting traces to Azure Monitor")
+        except ImportError:
+            logger.warning("APPLICATIONINSIGHTS_CONNECTION_STRING is set but azure-monitor-opentelemetry is not installed")
+
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="health,ready,metrics")
+    except ImportError:
+        if exporting:
+            logger.warning("opentelemetry-instrumentation-fastapi is not installed, requests are not traced")
+    return exporting
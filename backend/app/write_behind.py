@@ -0,0 +1,147 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from .metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+PENDING = gauge("write_behind_pending", "Deferred writes waiting to be flushed")
+COALESCED = counter("write_behind_coalesced_total", "Deferred writes replaced by a newer value before being flushed")
+FLUSHED = counter("write_behind_flushed_total", "Deferred writes flushed to storage, by outcome", ["outcome"])
+FLUSH_LAG = histogram(
+    "write_behind_flush_lag_seconds",
+    "Time from the first deferred write of a key to its flush",
+    buckets=(0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+
+class WriteBehindBuffer:
+    """
+    Defers writes that do not need per-request durability and coalesces them per key
+
+    Only the latest value of each key is kept (or, given a merge function, the
+    values are merged, e.g. to sum counter deltas); the buffer is flushed every
+    flush_interval seconds, as soon as it holds max_pending keys (the caller that
+    fills it waits for that flush), and on close(). A failed write is put back
+    and retried on the next flush; a newer value for the key that arrived
+    meanwhile supersedes it, or is merged with it when merge is given.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Hashable, Any], Awaitable[None]],
+        flush_interval: float = 2.0,
+        max_pending: int = 1000,
+        concurrency: int = 16,
+        merge: Optional[Callable[[Any, Any], Any]] = None
+    ):
+        """
+        Args:
+            write: Coroutine that persists one key's value
+            flush_interval: Seconds between background flushes
+            max_pending: Keys buffered before a write has to wait for a flush
+            concurrency: Writes issued at once during a flush
+            merge: Combines a buffered value with a newer one (default: keep the newer)
+        """
+        self._write = write
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self._merge = merge
+        # key -> (value, time the key was first buffered)
+        self._pending: Dict[Hashable, Tuple[Any, float]] = {}
+        self._flushing: Dict[Hashable, Tuple[Any, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._background_flush: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def get(self, key: Hashable) -> Any:
+        """The value not yet flushed for key (including one being written), or None"""
+        values = [entry[0] for entry in (self._flushing.get(key), self._pending.get(key)) if entry]
+        if not values:
+            return None
+        return self._combine(*values) if len(values) > 1 else values[0]
+
+    def _combine(self, older: Any, newer: Any) -> Any:
+        return self._merge(older, newer) if self._merge else newer
+
+    async def put(self, key: Hashable, value: Any):
+        """Buffer the latest value for key"""
+        entry = self._pending.get(key)
+        if entry is not None:
+            COALESCED.inc()
+            self._pending[key] = (self._combine(entry[0], value), entry[1])
+            return
+
+        if len(self._pending) >= self.max_pending:
+            logger.warning(f"Write-behind buffer full ({self.max_pending} keys), flushing in the request path")
+            await self.flush()
+
+        self._pending[key] = (value, time.monotonic())
+        PENDING.set(len(self._pending))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def discard(self, key: Hashable):
+        """Drop a buffered value, e.g. because the object was deleted"""
+        self._pending.pop(key, None)
+        PENDING.set(len(self._pending))
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # Shielded so that close() cancelling this loop does not abort writes in progress
+                self._background_flush = asyncio.ensure_future(self.flush())
+                await asyncio.shield(self._background_flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing write-behind buffer: {e}")
+
+    async def flush(self):
+        """Write every buffered value now"""
+        batch, self._pending = self._pending, {}
+        PENDING.set(0)
+        if not batch:
+            return
+
+        self._flushing.update(batch)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def write_one(key: Hashable, value: Any, buffered_at: float):
+            async with semaphore:
+                try:
+                    await self._write(key, value)
+                except Exception as e:
+                    logger.error(f"Deferred write of {key} failed, will retry: {e}")
+                    FLUSHED.inc(outcome="error")
+                    newer = self._pending.get(key)
+                    if newer is None:
+                        self._pending[key] = (value, buffered_at)
+                    elif self._merge:
+                        self._pending[key] = (self._merge(value, newer[0]), buffered_at)
+                    return
+                finally:
+                    if self._flushing.get(key, (None,))[0] is value:
+                        del self._flushing[key]
+            FLUSHED.inc(outcome="ok")
+            FLUSH_LAG.observe(time.monotonic() - buffered_at)
+
+        await asyncio.gather(*(write_one(key, value, at) for key, (value, at) in batch.items()))
+        PENDING.set(len(self._pending))
+
+    async def close(self):
+        """Stop the background flush and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._background_flush is not None and not self._background_flush.done():
+            await asyncio.gather(self._background_flush, return_exceptions=True)
+        await self.flush()
+        if self._pending:
+            logger.error(f"{len(self._pending)} deferred writes could not be flushed on shutdown")
@@ -0,0 +1,143 @@
+"""
+Concurrent-request latency with blocking vs. non-blocking storage calls.
+
+Boots the FastAPI app in-process against the in-memory blob stand-in (with
+injected per-request latency) and fires a burst of heavy
+GET /sessions/{id}/messages requests alongside light GET /sessions/{id}
+requests. With the old blocking client every storage round trip stalls the
+event loop, so the light requests queue behind the heavy ones; with the async
+client they interleave.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_storage --latency 0.01 --messages 20 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("BLOB_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+import httpx
+
+from app import main
+from app.blob_client import AsyncBlobStorageClient, BlobStorageClient, BulkResult
+from app.storage import StorageBackend
+from app.database import AsyncDatabaseService
+from .fake_storage import FakeAsyncContainerClient, FakeContainerClient, InMemoryBlobStore
+
+
+class BlockingClientAdapter(StorageBackend):
+    """Exposes the sync BlobStorageClient through the async interface without
+    offloading, reproducing the behaviour before the async storage layer."""
+
+    def __init__(self, client: BlobStorageClient):
+        self.client = client
+
+    async def upload_json(self, blob_path, data, if_match=None, if_none_match=None):
+        return self.client.upload_json(blob_path, data, if_match=if_match, if_none_match=if_none_match)
+
+    async def download_json(self, blob_path):
+        return self.client.download_json(blob_path)
+
+    async def download_json_versioned(self, blob_path, if_none_match=None):
+        return self.client.download_json_versioned(blob_path, if_none_match)
+
+    async def append_text(self, blob_path, text):
+        return self.client.append_text(blob_path, text)
+
+    async def download_text(self, blob_path):
+        return self.client.download_text(blob_path)
+
+    async def delete_blob(self, blob_path, if_match=None):
+        return self.client.delete_blob(blob_path, if_match)
+
+    async def download_many(self, blob_paths, concurrency=None, as_text=False):
+        download = self.client.download_text if as_text else self.client.download_json
+        return [BulkResult(path, data=download(path)) for path in blob_paths]
+
+    async def delete_many(self, blob_paths, concurrency=None):
+        return [BulkResult(path, data=self.client.delete_blob(path)) for path in blob_paths]
+
+    async def list_blobs(self, prefix=""):
+        return self.client.list_blobs(prefix)
+
+    async def iter_blob_names(self, prefix="", page_size=None):
+        for name in self.client.iter_blob_names(prefix, page_size):
+            yield name
+
+    async def blob_exists(self, blob_path):
+        return self.client.blob_exists(blob_path)
+
+    async def close(self):
+        pass
+
+
+async def seed(store: InMemoryBlobStore, messages: int) -> str:
+    latency, store.latency = store.latency, 0.0
+    service = AsyncDatabaseService(AsyncBlobStorageClient(FakeAsyncContainerClient(store)))
+    session = await service.create_session(user_id="bench")
+    for i in range(messages):
+        await service.save_message(session.session_id, "user", f"message {i}")
+    store.latency = latency
+    return session.session_id
+
+
+async def timed_get(client: httpx.AsyncClient, url: str, start: float) -> float:
+    """Latency from the shared burst start, so time spent queued behind other requests counts"""
+    response = await client.get(url)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run_scenario(name: str, service: AsyncDatabaseService, session_id: str, concurrency: int) -> dict:
+    main.db_service = service
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        heavy = [timed_get(client, f"/sessions/{session_id}/messages", start) for _ in range(concurrency)]
+        light = [timed_get(client, f"/sessions/{session_id}", start) for _ in range(concurrency)]
+        results = await asyncio.gather(*heavy, *light)
+        wall = time.perf_counter() - start
+
+    light_latencies = results[concurrency:]
+    return {
+        "scenario": name,
+        "wall_s": wall,
+        "light_p50_ms": statistics.median(light_latencies) * 1000,
+        "light_max_ms": max(light_latencies) * 1000,
+    }
+
+
+async def main_async(args):
+    store = InMemoryBlobStore(latency=args.latency)
+    session_id = await seed(store, args.messages)
+
+    blocking = AsyncDatabaseService(BlockingClientAdapter(BlobStorageClient(FakeContainerClient(store))))
+    non_blocking = AsyncDatabaseService(AsyncBlobStorageClient(FakeAsyncContainerClient(store)))
+
+    rows = [
+        await run_scenario("blocking (sync client)", blocking, session_id, args.concurrency),
+        await run_scenario("async client", non_blocking, session_id, args.concurrency),
+    ]
+
+    print(f"latency/request={args.latency * 1000:.1f}ms messages={args.messages} concurrency={args.concurrency}")
+    print(f"{'scenario':<24}{'wall (s)':>10}{'light p50 (ms)':>16}{'light max (ms)':>16}")
+    for row in rows:
+        print(f"{row['scenario']:<24}{row['wall_s']:>10.2f}{row['light_p50_ms']:>16.1f}{row['light_max_ms']:>16.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.01, help="Injected seconds per storage request")
+    parser.add_argument("--messages", type=int, default=20, help="Messages in the benchmark session")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent heavy and light requests")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,78 @@
+"""
+Sequential vs. bounded-concurrency bulk blob operations.
+
+Compares a loop of single download_json/delete_blob calls (the old
+DatabaseService access pattern) with AsyncBlobStorageClient.download_many and
+delete_many against the in-memory stand-in with injected per-request latency.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk_storage --latency 0.01 --sizes 10 100 1000 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BLOB_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+from app.blob_client import AsyncBlobStorageClient
+from .fake_storage import FakeAsyncContainerClient, InMemoryBlobStore
+
+
+def seed(store: InMemoryBlobStore, count: int) -> list:
+    paths = [f"bench/{i:06d}.json" for i in range(count)]
+    for path in paths:
+        store.blobs[path] = b'{"value": 1}'
+    return paths
+
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def sequential_downloads(client: AsyncBlobStorageClient, paths: list):
+    for path in paths:
+        await client.download_json(path)
+
+
+async def sequential_deletes(client: AsyncBlobStorageClient, paths: list):
+    for path in paths:
+        await client.delete_blob(path)
+
+
+async def main_async(args):
+    print(f"latency/request={args.latency * 1000:.1f}ms concurrency={args.concurrency}")
+    print(f"{'blobs':>6}{'seq get (s)':>13}{'many get (s)':>14}{'speedup':>9}"
+          f"{'seq del (s)':>13}{'many del (s)':>14}{'speedup':>9}")
+
+    for size in args.sizes:
+        store = InMemoryBlobStore(latency=args.latency)
+        client = AsyncBlobStorageClient(FakeAsyncContainerClient(store), max_concurrency=args.concurrency)
+
+        paths = seed(store, size)
+        seq_get = await timed(sequential_downloads(client, paths))
+        many_get = await timed(client.download_many(paths))
+
+        seq_del = await timed(sequential_deletes(client, paths))
+        paths = seed(store, size)
+        many_del = await timed(client.delete_many(paths))
+
+        print(f"{size:>6}{seq_get:>13.2f}{many_get:>14.2f}{seq_get / many_get:>8.1f}x"
+              f"{seq_del:>13.2f}{many_del:>14.2f}{seq_del / many_del:>8.1f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.01, help="Injected seconds per storage request")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Blob counts to test")
+    parser.add_argument("--concurrency", type=int, default=16, help="Bulk operation concurrency limit")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(parse_args()))
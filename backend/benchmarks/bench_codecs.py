@@ -0,0 +1,125 @@
+"""
+Encode/decode time and stored bytes of the blob codecs.
+
+Serializes realistic documents (a short question, a typical answer, a long
+answer with code, and a response cache entry carrying Ollama's context token
+array) with every serializer/compression combination whose packages are
+installed, and reports bytes on the wire, encode and decode time, and decode
+plus ChatMessage validation time.
+
+Usage (from backend/):
+    python -m benchmarks.bench_codecs --iterations 2000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("BLOB_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+from app.codecs import COMPRESSIONS, SERIALIZERS, BlobCodec
+from app.models import ChatMessage, new_message_id
+
+WORDS = (
+    "the function returns a list of values from the request and the session cache "
+    "when it is called with an empty argument we raise an error so that callers can "
+    "retry the operation later this keeps the handler simple and avoids blocking"
+).split()
+
+CODE = '''def {name}(items, limit=None):
+    """Return the first limit items that pass the filter"""
+    result = []
+    for item in items:
+        if item.get("{key}") is not None:
+            result.append(item)
+        if limit is not None and len(result) >= limit:
+            break
+    return result
+'''
+
+
+def prose(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def long_answer(rng: random.Random) -> str:
+    parts = []
+    for i in range(12):
+        parts.append(prose(rng, 60))
+        parts.append("```python\n" + CODE.format(name=f"select_{i}", key=rng.choice(WORDS)) + "```")
+    return "\n\n".join(parts)
+
+
+def message(role: str, text: str, tokens: int = None) -> dict:
+    return ChatMessage(
+        message_id=new_message_id(),
+        session_id="3f1c7a52-8d0e-4f3b-9a51-2c6d7e8f9a0b",
+        role=role,
+        message_text=text,
+        timestamp=datetime.now(timezone.utc),
+        model_version="codellama" if role == "model" else None,
+        tokens_used=tokens
+    ).model_dump()
+
+
+def documents() -> dict:
+    rng = random.Random(0)
+    answer = prose(rng, 300)
+    return {
+        "question (~0.5 KB)": message("user", prose(rng, 40)),
+        "answer (~2 KB)": message("model", answer, 420),
+        "long answer with code (~8 KB)": message("model", long_answer(rng), 3900),
+        "cache entry + 2048-token context": {
+            "model": "codellama",
+            "response": answer,
+            "done": True,
+            "eval_count": 420,
+            "context": [rng.randrange(32000) for _ in range(2048)]
+        },
+    }
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def available_codecs():
+    for serializer, (_, _, module) in SERIALIZERS.items():
+        for compression, (_, _, compression_module) in COMPRESSIONS.items():
+            if module is not None and compression_module is not None:
+                yield BlobCodec(serializer, compression, min_compress_bytes=0)
+
+
+def main(args):
+    codecs = list(available_codecs())
+    missing = sorted({name for name, spec in {**SERIALIZERS, **COMPRESSIONS}.items() if spec[2] is None})
+    if missing:
+        print(f"not installed (skipped): {', '.join(missing)}")
+
+    for label, document in documents().items():
+        baseline = None
+        print(f"\n{label}")
+        print(f"{'codec':<18}{'bytes':>9}{'ratio':>8}{'encode (us)':>13}{'decode (us)':>13}{'+validate (us)':>16}")
+        for codec in codecs:
+            body, metadata = codec.encode(document)
+            baseline = baseline or len(body)
+            encode = per_call_us(lambda: codec.encode(document), args.iterations)
+            decode = per_call_us(lambda: codec.decode(body, metadata), args.iterations)
+            validate = ""
+            if "message_id" in document:
+                validate = f"{per_call_us(lambda: ChatMessage(**codec.decode(body, metadata)), args.iterations):.1f}"
+            print(f"{codec.name:<18}{len(body):>9}{baseline / len(body):>7.1f}x{encode:>13.1f}{decode:>13.1f}{validate:>16}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls timed per measurement")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
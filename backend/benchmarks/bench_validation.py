@@ -0,0 +1,94 @@
+"""
+Per-message CPU cost of loading a message page and serializing the response.
+
+"before" parses a log segment line by line with json.loads + ChatMessage(**item)
+and returns a GetMessagesResponse through FastAPI's response_model handling
+(dump, re-validate, encode). "after" validates the whole segment in one
+TypeAdapter.validate_json call and serializes a model_construct-ed envelope
+directly with model_dump_json, as the API does now.
+
+Usage (from backend/):
+    python -m benchmarks.bench_validation --sizes 10 100 1000 --iterations 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("BLOB_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models import ChatMessage, GetMessagesResponse, message_cursor, parse_message_lines
+
+SESSION_ID = "3f1c7a52-8d0e-4f3b-9a51-2c6d7e8f9a0b"
+RESPONSE_FIELD = create_response_field("Response_get_messages", GetMessagesResponse)
+
+
+def segment(size: int) -> str:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    lines = []
+    for i in range(size):
+        message = ChatMessage(
+            session_id=SESSION_ID,
+            role="model" if i % 2 else "user",
+            message_text=("Here is how the handler works. " * 20) if i % 2 else "How does the handler work?",
+            timestamp=start + timedelta(seconds=i),
+            tokens_used=160 if i % 2 else None
+        )
+        lines.append(message.model_dump_json())
+    return "\n".join(lines) + "\n"
+
+
+async def before(text: str) -> bytes:
+    messages = [ChatMessage(**json.loads(line)) for line in text.splitlines() if line]
+    response = GetMessagesResponse(
+        session_id=SESSION_ID,
+        messages=messages,
+        total_count=len(messages),
+        next_cursor=message_cursor(messages[-1])
+    )
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=response)
+    return JSONResponse(content).body
+
+
+async def after(text: str) -> bytes:
+    messages = parse_message_lines(text)
+    return GetMessagesResponse.model_construct(
+        session_id=SESSION_ID,
+        messages=messages,
+        total_count=len(messages),
+        next_cursor=message_cursor(messages[-1])
+    ).model_dump_json().encode("utf-8")
+
+
+async def per_message_us(fn, text: str, size: int, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn(text)
+    return (time.perf_counter() - start) / iterations / size * 1e6
+
+
+async def main_async(args):
+    print(f"{'messages':>9}{'before (us/msg)':>17}{'after (us/msg)':>16}{'speedup':>9}")
+    for size in args.sizes:
+        text = segment(size)
+        assert json.loads(await before(text)) == json.loads(await after(text))
+        slow = await per_message_us(before, text, size, args.iterations)
+        fast = await per_message_us(after, text, size, args.iterations)
+        print(f"{size:>9}{slow:>17.2f}{fast:>16.2f}{slow / fast:>8.1f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Messages per page")
+    parser.add_argument("--iterations", type=int, default=50, help="Pages processed per measurement")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,88 @@
+"""
+Storage requests issued per blob client operation.
+
+Runs each read/delete of BlobStorageClient and AsyncBlobStorageClient against the
+in-memory stand-in, on a present and a missing blob, and checks that every one
+costs exactly one storage request (no exists() probe first). Conditional
+variants are checked to fail on a stale ETag without a second request. Exits
+non-zero if any count is off.
+
+Usage (from backend/):
+    python -m benchmarks.check_request_counts
+"""
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("BLOB_CONNECTION_STRING", "UseDevelopmentStorage=true")
+
+from azure.core.exceptions import ResourceModifiedError
+
+from app.blob_client import AsyncBlobStorageClient, BlobStorageClient
+from app.storage import VersionedJson
+from .fake_storage import FakeAsyncContainerClient, FakeContainerClient, InMemoryBlobStore
+
+PRESENT = "check/present.json"
+MISSING = "check/missing.json"
+
+
+async def maybe_await(value):
+    return await value if asyncio.iscoroutine(value) else value
+
+
+def operations(client):
+    """(name, call, expected result) for each single-request operation"""
+    return [
+        ("download_json", lambda: client.download_json(PRESENT), {"value": 1}),
+        ("download_json (missing)", lambda: client.download_json(MISSING), None),
+        ("download_text", lambda: client.download_text(PRESENT), '{"value": 1}'),
+        ("download_text (missing)", lambda: client.download_text(MISSING), None),
+        ("download_json_versioned (missing)", lambda: client.download_json_versioned(MISSING), VersionedJson(None)),
+        ("delete_blob (missing)", lambda: client.delete_blob(MISSING), None),
+        ("delete_blob", lambda: client.delete_blob(PRESENT), None),
+    ]
+
+
+async def check(label: str, store: InMemoryBlobStore, client) -> bool:
+    ok = True
+    for name, call, expected in operations(client):
+        store.blobs[PRESENT] = b'{"value": 1}'
+        store._new_etag(PRESENT)
+        store.reset_calls()
+        result = await maybe_await(call())
+        passed = store.total_calls == 1 and result == expected
+        ok &= passed
+        print(f"{label:<7}{name:<36}{store.total_calls:>9}{'ok' if passed else 'FAIL':>6}")
+
+    store.blobs[PRESENT] = b'{"value": 1}'
+    etag = store._new_etag(PRESENT)
+    store._new_etag(PRESENT)
+    for name, call in [
+        ("upload_json (stale If-Match)", lambda: client.upload_json(PRESENT, {"value": 2}, if_match=etag)),
+        ("delete_blob (stale If-Match)", lambda: client.delete_blob(PRESENT, if_match=etag)),
+    ]:
+        store.reset_calls()
+        try:
+            await maybe_await(call())
+            passed = False
+        except ResourceModifiedError:
+            passed = store.total_calls == 1 and PRESENT in store.blobs
+        ok &= passed
+        print(f"{label:<7}{name:<36}{store.total_calls:>9}{'ok' if passed else 'FAIL':>6}")
+    return ok
+
+
+async def main_async() -> bool:
+    print(f"{'client':<7}{'operation':<36}{'requests':>9}{'':>6}")
+    store = InMemoryBlobStore()
+    sync_ok = await check("sync", store, BlobStorageClient(FakeContainerClient(store)))
+    store = InMemoryBlobStore()
+    async_ok = await check("async", store, AsyncBlobStorageClient(FakeAsyncContainerClient(store)))
+    return sync_ok and async_ok
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.WARNING)
+    sys.exit(0 if asyncio.run(main_async()) else 1)
@@ -0,0 +1,127 @@
+"""
+Fake Ollama server for benchmarks and load tests.
+
+Serves /api/generate (streaming and not), /api/ps and /api/version. Each
+generation waits `ttft` seconds (model load + prompt evaluation), then produces
+`tokens` tokens at `tokens_per_second`, and reports eval_count, eval_duration
+and the other timing fields the way Ollama does, so the backend's generation
+metrics see realistic values.
+
+Usage (from backend/):
+    python -m benchmarks.fake_ollama --port 11434 --ttft 0.2 --tokens-per-second 40 --tokens 64
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+WORDS = "the handler reads the session log and returns the newest messages first".split()
+
+
+def create_app(ttft: float = 0.1, tokens_per_second: float = 50.0, tokens: int = 32) -> FastAPI:
+    """Fake Ollama API with the given first-token latency, token rate and answer length"""
+    app = FastAPI()
+    token_interval = 1.0 / tokens_per_second
+
+    def stats(payload: dict, started: float) -> dict:
+        prompt = payload.get("prompt", "")
+        return {
+            "model": payload.get("model"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "context": list(range(min(len(prompt) // 4 + tokens, 4096))),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": int(ttft * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(tokens * token_interval * 1e9),
+        }
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        started = time.perf_counter()
+
+        if not payload.get("stream", True):
+            await asyncio.sleep(ttft + tokens * token_interval)
+            answer = " ".join(WORDS[i % len(WORDS)] for i in range(tokens))
+            return {**stats(payload, started), "response": answer}
+
+        async def chunks():
+            await asyncio.sleep(ttft)
+            for i in range(tokens):
+                if i:
+                    await asyncio.sleep(token_interval)
+                yield json.dumps({"model": payload.get("model"), "response": WORDS[i % len(WORDS)] + " ", "done": False}) + "\n"
+            yield json.dumps({**stats(payload, started), "response": ""}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/api/ps")
+    async def running_models():
+        return {"models": []}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    return app
+
+
+class FakeOllamaServer:
+    """
+    Runs the fake Ollama API with uvicorn on a background thread (its own event loop)
+
+    Usage:
+        with FakeOllamaServer(ttft=0.2) as server:
+            os.environ["OLLAMA_URL"] = server.url
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **app_options):
+        self.config = uvicorn.Config(create_app(**app_options), host=host, port=port, log_level="warning")
+        self.server = uvicorn.Server(self.config)
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeOllamaServer":
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Fake Ollama server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self._thread.join()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.1, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed after the first token")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per answer")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(
+        create_app(args.ttft, args.tokens_per_second, args.tokens),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
@@ -0,0 +1,257 @@
+"""
+In-memory stand-in for an Azure Blob Storage container.
+
+Mimics the subset of the azure.storage.blob ContainerClient / BlobClient API that
+BlobStorageClient and AsyncBlobStorageClient use, with optional per-request
+latency injection and per-operation call counters. Sync and async views share
+one InMemoryBlobStore so data written by one is visible to the other.
+"""
+import asyncio
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError, ResourceNotModifiedError
+
+
+class InMemoryBlobStore:
+    """Shared blob state, latency and request counters"""
+
+    def __init__(self, latency: float = 0.0):
+        self.blobs: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        self.metadata: Dict[str, Dict[str, str]] = {}
+        self._version = 0
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    def record(self, op: str):
+        self.calls[op] += 1
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def _get(self, path: str) -> bytes:
+        if path not in self.blobs:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {path}")
+        return self.blobs[path]
+
+    def _new_etag(self, path: str) -> str:
+        self._version += 1
+        self.etags[path] = f'"0x{self._version:016X}"'
+        return self.etags[path]
+
+    def _check(self, path: str, etag: Optional[str] = None, match_condition=None):
+        """Evaluate If-Match / If-None-Match like the service does"""
+        current = self.etags.get(path)
+        if match_condition == MatchConditions.IfNotModified and current != etag:
+            raise ResourceModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+        if match_condition == MatchConditions.IfModified and current is not None and current == etag:
+            raise ResourceNotModifiedError("Not modified")
+        if match_condition == MatchConditions.IfMissing and current is not None:
+            raise ResourceModifiedError("The specified blob already exists.")
+
+    def _put(self, path: str, data, metadata: Optional[Dict[str, str]] = None) -> dict:
+        self.blobs[path] = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        self.metadata[path] = dict(metadata or {})
+        return {"etag": self._new_etag(path)}
+
+    def _append(self, path: str, data: bytes) -> dict:
+        current = self._get(path)
+        self.blobs[path] = current + data
+        return {"etag": self._new_etag(path), "blob_append_offset": str(len(current)), "blob_committed_block_count": 1}
+
+    def _delete(self, path: str):
+        self._get(path)
+        del self.blobs[path]
+        self.etags.pop(path, None)
+        self.metadata.pop(path, None)
+
+    def _delete_batch(self, paths) -> list:
+        statuses = []
+        for path in paths:
+            self.etags.pop(path, None)
+            self.metadata.pop(path, None)
+            statuses.append(SimpleNamespace(status_code=202 if self.blobs.pop(path, None) is not None else 404))
+        return statuses
+
+    def _list(self, prefix: str):
+        return [SimpleNamespace(name=name) for name in sorted(self.blobs) if name.startswith(prefix)]
+
+
+class _Downloader:
+    def __init__(self, data: bytes, etag: Optional[str] = None, metadata: Optional[Dict[str, str]] = None):
+        self._data = data
+        self.properties = SimpleNamespace(etag=etag, metadata=metadata or {})
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class _AsyncDownloader:
+    def __init__(self, data: bytes, etag: Optional[str] = None, metadata: Optional[Dict[str, str]] = None):
+        self._data = data
+        self.properties = SimpleNamespace(etag=etag, metadata=metadata or {})
+
+    async def readall(self) -> bytes:
+        return self._data
+
+
+class FakeBlobClient:
+    """Blocking blob client; latency is injected with time.sleep"""
+
+    def __init__(self, store: InMemoryBlobStore, path: str):
+        self.store = store
+        self.blob_name = path
+
+    def _request(self, op: str):
+        self.store.record(op)
+        if self.store.latency:
+            time.sleep(self.store.latency)
+
+    def exists(self) -> bool:
+        self._request("exists")
+        return self.blob_name in self.store.blobs
+
+    def upload_blob(self, data, overwrite: bool = False, etag=None, match_condition=None, metadata=None, **kwargs) -> dict:
+        self._request("upload")
+        self.store._check(self.blob_name, etag, match_condition)
+        return self.store._put(self.blob_name, data, metadata)
+
+    def download_blob(self, etag=None, match_condition=None, **kwargs) -> _Downloader:
+        self._request("download")
+        data = self.store._get(self.blob_name)
+        self.store._check(self.blob_name, etag, match_condition)
+        return _Downloader(data, self.store.etags.get(self.blob_name), self.store.metadata.get(self.blob_name))
+
+    def create_append_blob(self, etag=None, match_condition=None, **kwargs):
+        self._request("create_append")
+        self.store._check(self.blob_name, etag, match_condition)
+        self.store._put(self.blob_name, b"")
+
+    def append_block(self, data, **kwargs) -> dict:
+        self._request("append")
+        return self.store._append(self.blob_name, data)
+
+    def delete_blob(self, etag=None, match_condition=None, **kwargs):
+        self._request("delete")
+        self.store._get(self.blob_name)
+        self.store._check(self.blob_name, etag, match_condition)
+        self.store._delete(self.blob_name)
+
+
+class FakeAsyncBlobClient:
+    """Non-blocking blob client; latency is injected with asyncio.sleep"""
+
+    def __init__(self, store: InMemoryBlobStore, path: str):
+        self.store = store
+        self.blob_name = path
+
+    async def _request(self, op: str):
+        self.store.record(op)
+        if self.store.latency:
+            await asyncio.sleep(self.store.latency)
+
+    async def exists(self) -> bool:
+        await self._request("exists")
+        return self.blob_name in self.store.blobs
+
+    async def upload_blob(self, data, overwrite: bool = False, etag=None, match_condition=None, metadata=None,
+                          **kwargs) -> dict:
+        await self._request("upload")
+        self.store._check(self.blob_name, etag, match_condition)
+        return self.store._put(self.blob_name, data, metadata)
+
+    async def download_blob(self, etag=None, match_condition=None, **kwargs) -> _AsyncDownloader:
+        await self._request("download")
+        data = self.store._get(self.blob_name)
+        self.store._check(self.blob_name, etag, match_condition)
+        return _AsyncDownloader(data, self.store.etags.get(self.blob_name), self.store.metadata.get(self.blob_name))
+
+    async def create_append_blob(self, etag=None, match_condition=None, **kwargs):
+        await self._request("create_append")
+        self.store._check(self.blob_name, etag, match_condition)
+        self.store._put(self.blob_name, b"")
+
+    async def append_block(self, data, **kwargs) -> dict:
+        await self._request("append")
+        return self.store._append(self.blob_name, data)
+
+    async def delete_blob(self, etag=None, match_condition=None, **kwargs):
+        await self._request("delete")
+        self.store._get(self.blob_name)
+        self.store._check(self.blob_name, etag, match_condition)
+        self.store._delete(self.blob_name)
+
+
+class FakeContainerClient:
+    """Blocking container client over an InMemoryBlobStore"""
+
+    def __init__(self, store: Optional[InMemoryBlobStore] = None, container_name: str = "benchmark"):
+        self.store = store or InMemoryBlobStore()
+        self.container_name = container_name
+
+    def exists(self) -> bool:
+        return True
+
+    def create_container(self):
+        pass
+
+    def get_blob_client(self, path: str) -> FakeBlobClient:
+        return FakeBlobClient(self.store, path)
+
+    def list_blobs(self, name_starts_with: str = "", **kwargs):
+        self.store.record("list")
+        if self.store.latency:
+            time.sleep(self.store.latency)
+        return iter(self.store._list(name_starts_with))
+
+    def delete_blobs(self, *paths, **kwargs):
+        """Blob batch delete: one request for up to 256 sub-requests"""
+        self.store.record("batch_delete")
+        if self.store.latency:
+            time.sleep(self.store.latency)
+        return iter(self.store._delete_batch(paths))
+
+
+class FakeAsyncContainerClient:
+    """Non-blocking container client over an InMemoryBlobStore"""
+
+    def __init__(self, store: Optional[InMemoryBlobStore] = None, container_name: str = "benchmark"):
+        self.store = store or InMemoryBlobStore()
+        self.container_name = container_name
+
+    async def exists(self) -> bool:
+        return True
+
+    async def create_container(self):
+        pass
+
+    def get_blob_client(self, path: str) -> FakeAsyncBlobClient:
+        return FakeAsyncBlobClient(self.store, path)
+
+    async def list_blobs(self, name_starts_with: str = "", **kwargs):
+        self.store.record("list")
+        if self.store.latency:
+            await asyncio.sleep(self.store.latency)
+        for blob in self.store._list(name_starts_with):
+            yield blob
+
+    async def delete_blobs(self, *paths, **kwargs):
+        """Blob batch delete: one request for up to 256 sub-requests"""
+        self.store.record("batch_delete")
+        if self.store.latency:
+            await asyncio.sleep(self.store.latency)
+        responses = self.store._delete_batch(paths)
+
+        async def iterate():
+            for response in responses:
+                yield response
+
+        return iterate()
@@ -0,0 +1,298 @@
+"""
+Reproducible load test of the API against in-process fakes.
+
+Boots the FastAPI app (startup and shutdown included) with the Azure storage
+client over the in-memory blob stand-in, which injects a fixed latency per
+storage request, and with a fake Ollama server (configurable time to first
+token and token rate). After seeding sessions with messages and a warm-up, it
+drives a weighted mix of POST /query (plain and streamed), POST /messages,
+GET /sessions/{id}/messages and GET /sessions from `concurrency` workers for
+`duration` seconds (add query_batch to the mix to include POST /query/batch).
+
+The report is JSON. It has per-endpoint p50/p95/p99 latency, throughput and
+error counts. It also has the storage requests issued by operation, counted
+once the background writes of the measured requests have drained. Runs are
+seeded, so the same arguments drive the same request sequence. --compare
+prints the change of every figure against an earlier report.
+
+The load generator shares the event loop with the app, so absolute latencies
+include some client overhead; compare runs made on the same machine.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --concurrency 32 --duration 20 --output baseline.json
+    python -m benchmarks.load_test --storage-latency 0.02 --ttft 0.3 --tokens-per-second 30 \\
+        --mix query=4,query_stream=1,save_message=2,get_messages=3,list_sessions=1 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+DEFAULT_MIX = "query=3,query_stream=1,save_message=2,get_messages=3,list_sessions=1"
+QUESTIONS = [
+    "How do I paginate the messages endpoint?",
+    "Why does the metadata update retry on a conflict?",
+    "Explain the write-behind buffer in two sentences.",
+    "What does the readiness probe check?",
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / seconds, 2),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class LoadTest:
+    """Seeds sessions through the API and replays a weighted request mix against it"""
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.session_ids: List[str] = []
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    async def seed(self):
+        for i in range(self.args.sessions):
+            response = await self.client.post("/sessions", json={"user_id": f"load-{i}"})
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+            self.session_ids.append(session_id)
+            for j in range(self.args.seed_messages):
+                response = await self.client.post("/messages", json={
+                    "session_id": session_id,
+                    "role": "model" if j % 2 else "user",
+                    "message_text": f"Seeded message {j} " + "lorem ipsum " * 20,
+                    "tokens_used": 60 if j % 2 else None
+                })
+                response.raise_for_status()
+
+    def _query(self, rng: random.Random, stream: bool):
+        return self.client.post("/query", json={
+            "session_id": rng.choice(self.session_ids),
+            "question": rng.choice(QUESTIONS),
+            "stream": stream,
+            "history": rng.random() < self.args.history_fraction
+        })
+
+    def request(self, name: str, rng: random.Random):
+        session_id = rng.choice(self.session_ids)
+        if name == "query":
+            return self._query(rng, stream=False)
+        if name == "query_stream":
+            return self._query(rng, stream=True)
+        if name == "query_batch":
+            return self.client.post("/query/batch", json={
+                "session_id": session_id,
+                "questions": [rng.choice(QUESTIONS) + f" ({i})" for i in range(self.args.batch_size)]
+            })
+        if name == "save_message":
+            return self.client.post("/messages", json={
+                "session_id": session_id,
+                "role": "user",
+                "message_text": rng.choice(QUESTIONS)
+            })
+        if name == "get_messages":
+            params = {"limit": 50}
+            if rng.random() < 0.5:
+                params["before"] = "latest"
+            return self.client.get(f"/sessions/{session_id}/messages", params=params)
+        if name == "list_sessions":
+            return self.client.get("/sessions", params={"limit": 10})
+        raise ValueError(f"Unknown request type '{name}'")
+
+    async def worker(self, index: int, mix: Dict[str, float], deadline: float):
+        rng = random.Random(self.args.seed * 1000 + index)
+        names, weights = list(mix), list(mix.values())
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await self.request(name, rng)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if not self.recording:
+                continue
+            if ok:
+                self.latencies[name].append(elapsed)
+            else:
+                self.errors[name] += 1
+
+    async def run(self, mix: Dict[str, float], seconds: float, record: bool) -> float:
+        self.recording = record
+        started = time.monotonic()
+        deadline = started + seconds
+        await asyncio.gather(*(self.worker(i, mix, deadline) for i in range(self.args.concurrency)))
+        return time.monotonic() - started
+
+
+async def wait_until_ready(main, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while main.db_service is None or main.ollama_client is None:
+        if main.startup_task.done() and main.startup_task.exception():
+            raise main.startup_task.exception()
+        if time.monotonic() > deadline:
+            raise TimeoutError("App did not finish starting")
+        await asyncio.sleep(0.01)
+
+
+async def wait_for_background_writes(main, timeout: float = 60.0):
+    """Let the outbox and write-behind buffer finish the measured requests' writes"""
+    deadline = time.monotonic() + timeout
+    while main.outbox is not None and len(main.outbox) and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await main.db_service.flush_metadata()
+
+
+async def main_async(args) -> dict:
+    # Imported here so the environment set up in main() is what the app's config sees
+    import httpx
+
+    from app import main, storage
+    from app.blob_client import AsyncBlobStorageClient
+    from app.codecs import BlobCodec
+    from .fake_storage import FakeAsyncContainerClient, InMemoryBlobStore
+
+    store = InMemoryBlobStore(latency=args.storage_latency)
+    backend = AsyncBlobStorageClient(FakeAsyncContainerClient(store), codec=BlobCodec())
+    await backend.initialize()
+    storage._storage_backend = backend
+
+    mix = parse_mix(args.mix)
+    async with main.lifespan(main.app):
+        await wait_until_ready(main)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as client:
+            test = LoadTest(client, args)
+            await test.seed()
+            await test.run(mix, args.warmup, record=False)
+            await wait_for_background_writes(main)
+
+            store.reset_calls()
+            seconds = await test.run(mix, args.duration, record=True)
+            await wait_for_background_writes(main)
+            storage_calls = dict(store.calls)
+
+    completed = sum(len(values) for values in test.latencies.values())
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "duration_s": round(seconds, 2),
+        "requests": completed,
+        "errors": sum(test.errors.values()),
+        "throughput_rps": round(completed / seconds, 2),
+        "endpoints": {
+            name: summarize(test.latencies[name], test.errors[name], seconds)
+            for name in mix
+        },
+        "storage": {
+            "requests": sum(storage_calls.values()),
+            "per_api_request": round(sum(storage_calls.values()) / max(completed, 1), 2),
+            "by_operation": dict(sorted(storage_calls.items())),
+        },
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """Print the change of each latency and throughput figure relative to baseline"""
+    def delta(now: float, before: float) -> str:
+        return f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+
+    print(f"{'endpoint':<15}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+    for name, figures in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            print(f"{name:<15}{metric:<16}{before[metric]:>12}{figures[metric]:>12}{delta(figures[metric], before[metric]):>10}",
+                  file=sys.stderr)
+    before = baseline.get("storage", {}).get("per_api_request", 0)
+    now = current["storage"]["per_api_request"]
+    print(f"{'storage':<15}{'per_api_request':<16}{before:>12}{now:>12}{delta(now, before):>10}", file=sys.stderr)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds measured")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted request types (default: {DEFAULT_MIX})")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions seeded before the run")
+    parser.add_argument("--seed-messages", type=int, default=20, help="Messages seeded per session")
+    parser.add_argument("--history-fraction", type=float, default=0.5, help="Share of queries sending history")
+    parser.add_argument("--batch-size", type=int, default=8, help="Questions per query_batch request")
+    parser.add_argument("--storage-latency", type=float, default=0.01, help="Seconds added to every storage request")
+    parser.add_argument("--ttft", type=float, default=0.1, help="Fake Ollama seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake Ollama token rate")
+    parser.add_argument("--tokens", type=int, default=32, help="Fake Ollama tokens per answer")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the request sequence")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    from .fake_ollama import FakeOllamaServer
+
+    with tempfile.TemporaryDirectory() as scratch, FakeOllamaServer(
+        ttft=args.ttft, tokens_per_second=args.tokens_per_second, tokens=args.tokens
+    ) as ollama:
+        os.environ.pop("KEY_VAULT_NAME", None)
+        os.environ.update({
+            "STORAGE_BACKEND": "azure",
+            "BLOB_CONNECTION_STRING": "UseDevelopmentStorage=true",
+            "OLLAMA_URL": ollama.url,
+            "OLLAMA_URLS": "",
+            "OLLAMA_DISCOVERY_URL": "",
+            "OUTBOX_PATH": os.path.join(scratch, "outbox.jsonl"),
+        })
+        logging.disable(logging.WARNING)
+        report = asyncio.run(main_async(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
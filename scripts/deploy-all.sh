@@ -54,6 +54,8 @@ echo "🚀 Deploying FastAPI Backend..."
 kubectl apply -f kubernetes/backend/configmap.yaml
 # Note: Apply secrets if you have them
 # kubectl apply -f kubernetes/backend/secrets.yaml
+# The backend used to be a Deployment; remove it so it does not serve alongside the StatefulSet
+kubectl delete deployment fastapi-backend -n ai-assistant --ignore-not-found
 kubectl apply -f kubernetes/backend/deployment.yaml
 kubectl apply -f kubernetes/backend/service.yaml
 echo ""
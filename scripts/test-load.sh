@@ -1,6 +1,8 @@
 #!/bin/bash
 
 # Simple load testing script to test HPA
+# (for a reproducible baseline without a cluster, run from backend/:
+#  python -m benchmarks.load_test --output baseline.json)
 
 echo "🧪 Load Testing Ollama HPA..."
 echo "This will generate load to trigger autoscaling"
@@ -19,14 +21,24 @@ PORT_FORWARD_PID=$!
 
 sleep 3
 
+# /query persists messages to a session, so create one for the run
+SESSION_ID=$(curl -s -X POST http://localhost:8000/sessions \
+    -H "Content-Type: application/json" \
+    -d '{"user_id":"load-test"}' | python3 -c 'import json, sys; print(json.load(sys.stdin)["session_id"])')
+if [ -z "$SESSION_ID" ]; then
+    echo "❌ Could not create a session (is the backend ready?)"
+    kill $PORT_FORWARD_PID 2>/dev/null
+    exit 1
+fi
+
 echo "Generating load..."
-echo "Sending 1000 requests with 50 concurrent workers..."
+echo "Sending 1000 requests with 50 concurrent workers (session $SESSION_ID)..."
 echo ""
 
 hey -n 1000 -c 50 -m POST \
     -H "Content-Type: application/json" \
-    -d '{"query":"What is Kubernetes?"}' \
-    http://localhost:8000/api/v1/chat
+    -d "{\"session_id\":\"$SESSION_ID\",\"question\":\"What is Kubernetes?\",\"history\":false}" \
+    http://localhost:8000/query
 
 echo ""
 echo "Watch HPA scaling:"